@@ -1,31 +1,225 @@
-from flask import Flask, request, jsonify, render_template
-from converter import convert_braille_to_pinyin
+from flask import Flask, Response, abort, g, request, jsonify, render_template, stream_with_context
+import os
+import time
+
+from conversion_service import ConversionRejected, ConversionService
+from converter import dialect_map, enable_profiling, get_profiler
 from flask import send_from_directory
+from live_sessions import DocumentTooLarge, LiveSessions, RevisionMismatch, SessionNotFound
+from metrics import LatencyHistogram, render_metrics
+from table_bundle import choose_encoding, get_bundle
+from result_cache import FileResultCache, ResultCache
 
 app = Flask(__name__)
 
+# 轉換結果快取；設定 RESULT_CACHE_DIR 時多個 worker 共用同一個目錄
+_shared_cache_dir = os.environ.get('RESULT_CACHE_DIR')
+result_cache = ResultCache(
+    max_entries=int(os.environ.get('RESULT_CACHE_ENTRIES', 1024)),
+    max_bytes=int(os.environ.get('RESULT_CACHE_BYTES', 16 * 1024 * 1024)),
+    shared=FileResultCache(_shared_cache_dir) if _shared_cache_dir else None,
+)
+
+# JSON、批次、串流、即時編輯等入口共用的轉換服務：驗證、大小限制、結果快取與各入口的耗時統計。
+# 建立時載入各腔調點字表（有預先編譯檔時直接讀取）；gunicorn --preload 時 worker 共用這份記憶體
+service = ConversionService(result_cache)
+
+# 即時編輯的增量轉換工作階段（行程內，不跨 worker 共用）
+live_sessions = LiveSessions(
+    max_sessions=int(os.environ.get('LIVE_MAX_SESSIONS', 256)),
+    idle_seconds=float(os.environ.get('LIVE_IDLE_SECONDS', 30 * 60)),
+)
+
+# 串流上傳轉換的上限：上傳位元組數與整個請求（讀取加轉換）的秒數
+STREAM_MAX_BYTES = int(os.environ.get('STREAM_MAX_BYTES', 256 * 1024 * 1024))
+STREAM_TIMEOUT = float(os.environ.get('STREAM_TIMEOUT', 300))
+STREAM_READ_BYTES = 64 * 1024
+
+# 請求延遲直方圖；CONVERTER_PROFILE=1 時另外記錄轉換器各階段與各規則的剖析資料
+request_latency = LatencyHistogram()
+if os.environ.get('CONVERTER_PROFILE') == '1':
+    enable_profiling()
+
+@app.before_request
+def _start_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def _record_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        request_latency.observe(request.endpoint or 'unknown', response.status_code,
+                                time.perf_counter() - started)
+    return response
+
+@app.errorhandler(ConversionRejected)
+def _conversion_rejected(e):
+    return jsonify({'error': str(e)}), e.status
+
+@app.errorhandler(DocumentTooLarge)
+def _document_too_large(e):
+    return jsonify({'error': f'⚠️ {e}'}), 413
+
 @app.route('/braille_data/<path:filename>')
 def serve_braille_data(filename):
+    # 只公開點字表 JSON；其他檔案（例如舊版放在這裡的預先編譯檔）不對外提供
+    if not filename.endswith('.json'):
+        abort(404)
     return send_from_directory('braille_data', filename)
 
-# 首頁：表單介面
-@app.route("/", methods=["GET", "POST"])
+def _bundle_response(bundle, cache_control):
+    encoding = choose_encoding(request.headers.get('Accept-Encoding'), bundle.bodies)
+    etag = bundle.etag(encoding)
+    if request.if_none_match.contains(etag):
+        response = Response(status=304)
+    else:
+        response = Response(bundle.bodies[encoding], mimetype='application/json')
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = cache_control
+    response.headers['Vary'] = 'Accept-Encoding'
+    return response
+
+# 所有點字表打包成一份；網址帶內容雜湊，可長期快取
+@app.route('/braille_data/bundle.<digest>.json')
+def serve_braille_bundle(digest):
+    bundle = get_bundle()
+    if digest != bundle.digest:
+        return jsonify({'error': '⚠️ 點字表已更新', 'url': bundle.url}), 404
+    return _bundle_response(bundle, 'public, max-age=31536000, immutable')
+
+# 不帶雜湊的網址：每次都向伺服器確認（內容沒變時回 304）
+@app.route('/braille_data/bundle.json')
+def serve_braille_bundle_latest():
+    return _bundle_response(get_bundle(), 'no-cache')
+
+# 首頁：轉換在瀏覽器內完成（static/braille_engine.js），必要時才呼叫 /api/convert
+@app.route("/")
 def index():
-    result = ""
-    if request.method == "POST":
-        braille_input = request.form.get("braille", "")
-        dialect = request.form.get("dialect", "siian2")
-        result = convert_braille(braille_input, dialect)
-    return render_template("index.html", result=result)
+    return render_template("index.html", braille_bundle_url=get_bundle().url, dialects=dialect_map)
 
 # API 路由：給前端或第三方系統呼叫
+# diagnostics 為 true 時另外回傳每個輸出音節/標點的輸入位置、規則與無法匹配的字元（不經快取）
 @app.route('/api/convert', methods=['POST'])
 def convert():
-    data = request.get_json()
+    data = service.check_payload(request.get_json(silent=True))
     braille = data.get('braille', '')
     dialect = data.get('dialect', '')
-    result = convert_braille_to_pinyin(braille, dialect)
-    return jsonify({'result': result})
+    if data.get('diagnostics'):
+        return jsonify(service.diagnose(braille, dialect).to_dict())
+    return jsonify({'result': service.convert(braille, dialect)})
+
+class _UploadLimitExceeded(Exception):
+    pass
+
+class _LimitedReader:
+    """
+    包住上傳內容的檔案物件：讀取超過 max_bytes 或超過 deadline（time.monotonic）時拋出
+    _UploadLimitExceeded。沒有 Content-Length（chunked 上傳）時靠這裡限制大小。
+    """
+
+    def __init__(self, f, max_bytes, deadline):
+        self._f = f
+        self._remaining = max_bytes
+        self._deadline = deadline
+
+    def read(self, size=STREAM_READ_BYTES):
+        if time.monotonic() > self._deadline:
+            raise _UploadLimitExceeded('⚠️ 轉換逾時，已中止')
+        block = self._f.read(min(size, self._remaining + 1))
+        self._remaining -= len(block)
+        if self._remaining < 0:
+            raise _UploadLimitExceeded('⚠️ 上傳內容超過大小上限，已中止')
+        return block
+
+# 串流 API：上傳點字檔（原始內容或 multipart 的 file 欄位），邊讀邊轉、邊回傳拼音。
+# 伺服器只保留未轉換的尾段，記憶體不隨檔案大小成長；腔調由 ?dialect= 或表單的 dialect 欄位指定
+@app.route('/api/convert/stream', methods=['POST'])
+def convert_stream_upload():
+    if request.content_length is not None and request.content_length > STREAM_MAX_BYTES:
+        return jsonify({'error': '⚠️ 內容太大'}), 413
+    if request.mimetype == 'multipart/form-data':
+        # werkzeug 把上傳檔案暫存在磁碟（小檔在記憶體），這裡再以檔案串流讀取
+        upload = request.files.get('file')
+        if upload is None:
+            return jsonify({'error': '⚠️ 缺少 file 欄位'}), 400
+        source = upload.stream
+        dialect = request.form.get('dialect') or request.args.get('dialect', '')
+    else:
+        source = request.stream
+        dialect = request.args.get('dialect', '')
+
+    reader = _LimitedReader(source, STREAM_MAX_BYTES, time.monotonic() + STREAM_TIMEOUT)
+    # 腔調在這裡就檢查（不合規定時回 400），轉換途中的錯誤只能附在內容最後
+    pieces = service.convert_stream(reader, dialect)
+
+    def generate():
+        try:
+            yield from pieces
+        except (_UploadLimitExceeded, ConversionRejected) as e:
+            # 回應已經開始送出，狀態碼無法再改，只能在內容最後附上錯誤訊息
+            yield f'\n{e}\n'
+        except UnicodeDecodeError:
+            yield '\n⚠️ 上傳內容不是有效的 UTF-8，已中止\n'
+
+    response = Response(stream_with_context(generate()), mimetype='text/plain')
+    # 請反向代理（nginx）不要緩衝，讓用戶端立刻收到前面的結果
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+# 多腔調 API：同一段點字一次轉成多個腔調（dialects 省略時為全部腔調）
+@app.route('/api/convert/all', methods=['POST'])
+def convert_all():
+    data = service.check_payload(request.get_json(silent=True))
+    return jsonify({'results': service.convert_all(data.get('braille', ''), data.get('dialects'))})
+
+# 反向 API：拼音轉點字
+@app.route('/api/convert/reverse', methods=['POST'])
+def convert_reverse():
+    data = service.check_payload(request.get_json(silent=True))
+    return jsonify({'result': service.convert_reverse(data.get('pinyin', ''), data.get('dialect', ''))})
+
+# 批次 API：一次送多段點字，依序回傳每段結果（單段錯誤不影響整批）
+@app.route('/api/convert/batch', methods=['POST'])
+def convert_batch():
+    data = service.check_payload(request.get_json(silent=True))
+    return jsonify({'results': service.convert_batch(data.get('items'), data.get('dialect', ''))})
+
+# 即時編輯：開啟文件，回傳文件 ID 與完整轉換結果
+@app.route('/api/live/open', methods=['POST'])
+def live_open():
+    data = service.check_payload(request.get_json(silent=True))
+    doc_id, document = service.open_live(live_sessions, data.get('braille', ''), data.get('dialect'))
+    return jsonify({'doc_id': doc_id, 'revision': document.revision, 'result': document.output})
+
+# 即時編輯：把 braille[offset:offset+deleted] 換成 inserted，只回傳輸出的差異
+@app.route('/api/live/edit', methods=['POST'])
+def live_edit():
+    data = service.check_payload(request.get_json(silent=True))
+    offset = data.get('offset')
+    deleted = data.get('deleted', 0)
+    inserted = data.get('inserted', '')
+    if not (isinstance(offset, int) and isinstance(deleted, int) and isinstance(inserted, str)):
+        return jsonify({'error': '⚠️ 需要 offset、deleted（整數）與 inserted（字串）'}), 400
+    try:
+        revision, diff = service.edit_live(live_sessions, data.get('doc_id'), data.get('revision'),
+                                           offset, deleted, inserted)
+    except SessionNotFound:
+        return jsonify({'error': '⚠️ 找不到文件，請重新開啟'}), 404
+    except RevisionMismatch as e:
+        return jsonify({'error': '⚠️ 文件版本不符，請重新開啟', 'revision': e.revision}), 409
+    except (ConversionRejected, DocumentTooLarge):
+        raise
+    except ValueError as e:
+        return jsonify({'error': f'⚠️ {e}'}), 400
+    return jsonify({'revision': revision, **diff})
+
+# Prometheus 指標
+@app.route('/metrics')
+def metrics():
+    body = render_metrics(request_latency, get_profiler(), result_cache, live_sessions, service)
+    return Response(body, mimetype='text/plain; version=0.0.4')
 
 @app.route('/support_us')
 def support_us():
@@ -0,0 +1,206 @@
+"""
+非同步（ASGI）服務入口，與 app.py 的 /api/convert（含 diagnostics）、/api/convert/batch 相同的 JSON 介面。
+
+    uvicorn asgi:app --workers 2
+    gunicorn asgi:app -k uvicorn.workers.UvicornWorker
+
+短的輸入直接在事件迴圈上轉換（幾毫秒內完成），不會排在長文件後面；
+長的輸入交給有上限的 process pool，同時執行加排隊的數量超過 ASGI_MAX_PENDING 時
+直接回 503（附 Retry-After），不讓請求無限堆積。
+"""
+import asyncio
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+from conversion_service import ConversionRejected, ConversionService
+from converter import (
+    UNKNOWN_DIALECT_MESSAGE,
+    convert_braille_to_pinyin,
+    convert_many,
+    convert_with_diagnostics,
+    get_dialect_tables,
+)
+from result_cache import ResultCache, cache_key
+
+# 小於這個字元數就在事件迴圈上直接轉換
+INLINE_MAX_CHARS = int(os.environ.get('ASGI_INLINE_MAX_CHARS', 4000))
+# process pool 的 worker 數與「執行中＋排隊中」的上限
+POOL_WORKERS = int(os.environ.get('ASGI_POOL_WORKERS', os.cpu_count() or 1))
+MAX_PENDING = int(os.environ.get('ASGI_MAX_PENDING', POOL_WORKERS * 4))
+MAX_BODY_BYTES = int(os.environ.get('ASGI_MAX_BODY_BYTES', 16 * 1024 * 1024))
+REQUEST_TIMEOUT = float(os.environ.get('ASGI_REQUEST_TIMEOUT', 60))
+
+result_cache = ResultCache()
+# 與 app.py 相同的輸入檢查、大小限制與各入口耗時統計；較長的輸入驗證後才交給 process pool
+service = ConversionService(result_cache)
+
+
+class _Busy(Exception):
+    pass
+
+
+class _Offloader:
+    """
+    有上限的背景轉換：pending 計算「執行中＋排隊中」的工作數，滿了就拒絕。
+    逾時的請求先回應，但名額要等工作真正結束才釋放，避免 pool 被塞爆。
+    """
+
+    def __init__(self, workers, max_pending):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.pending = 0
+        self.executor = None
+
+    def start(self):
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.workers)
+
+    def shutdown(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
+
+    async def run(self, fn, *args):
+        if self.pending >= self.max_pending:
+            raise _Busy()
+        self.start()
+        self.pending += 1
+        future = asyncio.get_running_loop().run_in_executor(self.executor, fn, *args)
+        future.add_done_callback(self._release)
+        return await asyncio.wait_for(asyncio.shield(future), REQUEST_TIMEOUT)
+
+    def _release(self, _future):
+        self.pending -= 1
+
+
+offloader = _Offloader(POOL_WORKERS, MAX_PENDING)
+
+
+async def _convert(braille, dialect):
+    braille = service.check_text(braille)
+    if len(braille) <= INLINE_MAX_CHARS:
+        return service.convert(braille, dialect, entry='asgi')
+    dialect = service.normalize_dialect(dialect)
+    with service.measure('asgi', len(braille)):
+        if get_dialect_tables(dialect) is None:
+            return UNKNOWN_DIALECT_MESSAGE
+        key = cache_key(braille, dialect)
+        result = result_cache.get(key)
+        if result is None:
+            result = await offloader.run(convert_braille_to_pinyin, braille, dialect)
+            result_cache.put(key, result)
+        return result
+
+
+def _diagnostics_dict(braille, dialect):
+    # 在 process pool 內轉成 dict 再傳回，不必 pickle 整個 ConversionDiagnostics
+    return convert_with_diagnostics(braille, dialect).to_dict()
+
+
+async def _diagnose(braille, dialect):
+    braille = service.check_text(braille)
+    if len(braille) <= INLINE_MAX_CHARS:
+        return service.diagnose(braille, dialect, entry='asgi_diagnostics').to_dict()
+    dialect = service.normalize_dialect(dialect)
+    with service.measure('asgi_diagnostics', len(braille)):
+        return await offloader.run(_diagnostics_dict, braille, dialect)
+
+
+async def _convert_batch(items, dialect):
+    dialect, size, accepted, rejected = service.prepare_batch(items, dialect)
+    with service.measure('asgi_batch', size):
+        if size <= INLINE_MAX_CHARS:
+            results = convert_many(accepted, dialect)
+        else:
+            results = await offloader.run(convert_many, accepted, dialect)
+    return service.merge_batch(results, rejected)
+
+
+async def _read_body(receive):
+    chunks = []
+    size = 0
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return None
+        body = message.get('body', b'')
+        size += len(body)
+        if size > MAX_BODY_BYTES:
+            raise ValueError('too large')
+        chunks.append(body)
+        if not message.get('more_body', False):
+            return b''.join(chunks)
+
+
+async def _send_json(send, status, payload, headers=()):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [(b'content-type', b'application/json; charset=utf-8'),
+                    (b'content-length', str(len(body)).encode('ascii')), *headers],
+    })
+    await send({'type': 'http.response.body', 'body': body})
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            offloader.start()
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            offloader.shutdown()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def app(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    path = scope['path']
+    if path not in ('/api/convert', '/api/convert/batch'):
+        await _send_json(send, 404, {'error': 'not found'})
+        return
+    if scope['method'] != 'POST':
+        await _send_json(send, 405, {'error': 'method not allowed'}, [(b'allow', b'POST')])
+        return
+
+    try:
+        body = await _read_body(receive)
+    except ValueError:
+        await _send_json(send, 413, {'error': '⚠️ 內容太大'})
+        return
+    if body is None:
+        return
+    try:
+        data = json.loads(body or b'{}')
+    except ValueError:
+        await _send_json(send, 400, {'error': '⚠️ 需要 JSON 物件'})
+        return
+
+    try:
+        data = service.check_payload(data)
+        dialect = data.get('dialect', '')
+        if path == '/api/convert' and data.get('diagnostics'):
+            # 與 app.py 相同：diagnostics 為 true 時回傳位置與規則（不經快取）
+            payload = await _diagnose(data.get('braille', ''), dialect)
+        elif path == '/api/convert':
+            payload = {'result': await _convert(data.get('braille', ''), dialect)}
+        else:
+            payload = {'results': await _convert_batch(data.get('items'), dialect)}
+    except ConversionRejected as e:
+        await _send_json(send, e.status, {'error': str(e)})
+        return
+    except _Busy:
+        await _send_json(send, 503, {'error': '⚠️ 伺服器忙碌中，請稍後再試'}, [(b'retry-after', b'1')])
+        return
+    except asyncio.TimeoutError:
+        await _send_json(send, 504, {'error': '⚠️ 轉換逾時'})
+        return
+    await _send_json(send, 200, payload)
@@ -0,0 +1,251 @@
+"""
+轉換器效能基準測試。
+
+    python benchmark.py                       # 全部腔調、短/中/整本書三種長度
+    python benchmark.py -o before.json        # 結果存成 JSON
+    python benchmark.py --compare before.json after.json
+
+語料由 braille_data 的點字表以固定亂數種子產生，刻意偏重入聲（rushio）、標點
+與有歧義的 ⠆（分號 / 子音 bb / 調號 ˇ）。每組語料記錄輸出的雜湊，
+--compare 時雜湊不同就視為轉換結果被改動，以非零結束碼回報。
+另外回報反向轉換（拼音 → 點字）的往返一致比例，比較時比例下降也視為錯誤。
+"""
+import argparse
+import hashlib
+import json
+import platform
+import random
+import sys
+import time
+import tracemalloc
+
+from converter import (
+    convert_braille_to_pinyin,
+    convert_parallel,
+    convert_pinyin_to_braille,
+    convert_stream,
+    dialect_map,
+    get_dialect_tables,
+    tables_version,
+)
+
+# 名稱: (目標字元數, 計時次數)
+SIZES = {
+    'short': (200, 200),
+    'medium': (20_000, 10),
+    'book': (400_000, 2),
+}
+
+_PUNCT_AFTER_TONE = ('⠂', '⠲', '⠖', '⠒', '⠐', '⠲⠲⠲', '⠴', '⠲⠴')
+
+
+def build_corpus(dialect, size, seed=0):
+    """
+    產生約 size 個字元的點字語料（同樣的腔調、長度與種子一定產生同樣的內容）。
+    """
+    tables = get_dialect_tables(dialect)
+    rnd = random.Random(f'{dialect}:{size}:{seed}')
+
+    consonants = sorted(k for k in tables.consonants if k != '⠆')
+    vowels = sorted(k for k in tables.vowels if len(k) == 1 and k not in tables.punctuations)
+    tones = sorted(k for k in tables.tones if k not in ('⠆', '⠤'))
+    rushio = sorted(tables.rushio)
+    specials = sorted(tables.special_cases)
+    has_bb = '⠆' in tables.consonants
+
+    def syllable():
+        r = rnd.random()
+        if r < 0.25:
+            # 入聲：子音 + rushio
+            return rnd.choice(consonants) + rnd.choice(rushio)
+        if r < 0.30:
+            return rnd.choice(specials) + rnd.choice(tones)
+        initial = rnd.choice(consonants) if rnd.random() < 0.8 else ''
+        if has_bb and rnd.random() < 0.08:
+            initial = '⠆'  # 子音 bb
+        vowel = rnd.choice(vowels)
+        tone = '⠆' if rnd.random() < 0.15 else rnd.choice(tones)  # 調號 ˇ
+        if tone == '⠆' and not has_bb and initial + vowel in tables.rushio:
+            # 子音+母音恰好是 rushio 鍵時，後面的 ⠆ 會被當成 bb，而此腔調沒有 bb
+            tone = rnd.choice(tones)
+        return initial + vowel + tone
+
+    parts = []
+    total = 0
+    in_quote = False
+    while total < size:
+        piece = ''.join(syllable() for _ in range(rnd.randint(1, 3)))
+
+        r = rnd.random()
+        if r < 0.10:
+            piece += '⠆⠀'  # 分號
+        elif r < 0.25:
+            piece += rnd.choice(_PUNCT_AFTER_TONE)
+        elif r < 0.30:
+            piece += '⠦'  # 問號
+        elif r < 0.33:
+            piece = ('⠦' if not in_quote else '') + piece
+            in_quote = not in_quote
+        elif r < 0.36:
+            piece = '⠐⠣' + piece + '⠐⠜'
+
+        piece += '\n' if rnd.random() < 0.05 else ' '
+        parts.append(piece)
+        total += len(piece)
+    return ''.join(parts)
+
+
+def _percentile(sorted_values, q):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def run_case(dialect, size_name, size, repeat, seed=0):
+    text = build_corpus(dialect, size, seed)
+    output = convert_braille_to_pinyin(text, dialect)  # 暖身兼取得輸出
+
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        convert_braille_to_pinyin(text, dialect)
+        timings.append(time.perf_counter() - started)
+    timings.sort()
+
+    tracemalloc.start()
+    convert_braille_to_pinyin(text, dialect)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    p50 = _percentile(timings, 0.50)
+    return {
+        'dialect': dialect,
+        'size': size_name,
+        'chars': len(text),
+        'repeat': repeat,
+        'p50_ms': p50 * 1000,
+        'p99_ms': _percentile(timings, 0.99) * 1000,
+        'chars_per_sec': len(text) / p50 if p50 else 0.0,
+        'peak_bytes': peak,
+        'output_sha256': hashlib.sha256(output.encode('utf-8')).hexdigest(),
+    }
+
+
+def cross_check(dialect, seed=0):
+    """
+    其他轉換路徑（串流、平行）必須與整份轉換完全相同；回傳不一致的路徑名稱列表。
+    """
+    text = build_corpus(dialect, SIZES['medium'][0], seed)
+    expected = convert_braille_to_pinyin(text, dialect)
+    failures = []
+    chunks = [text[i:i + 777] for i in range(0, len(text), 777)]
+    if ''.join(convert_stream(chunks, dialect)) != expected:
+        failures.append('convert_stream')
+    if convert_parallel(text, dialect, workers=2, segment_chars=2000) != expected:
+        failures.append('convert_parallel')
+    return failures
+
+
+def round_trip(dialect, seed=0, samples=50):
+    """
+    反向轉換檢查：點字 → 拼音 → 點字 → 拼音，兩次拼音相同的比例（短語料 samples 組）。
+    語料含刻意的歧義寫法，不要求 100%，用來比較修改前後是否退步。
+    """
+    matched = 0
+    for k in range(samples):
+        pinyin = convert_braille_to_pinyin(build_corpus(dialect, SIZES['short'][0], seed * samples + k), dialect)
+        if convert_braille_to_pinyin(convert_pinyin_to_braille(pinyin, dialect), dialect) == pinyin:
+            matched += 1
+    return matched / samples
+
+
+def run(dialects, size_names, seed=0):
+    results = {
+        'meta': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'tables_version': tables_version(),
+            'seed': seed,
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        },
+        'cases': [],
+        'cross_check_failures': {},
+        'round_trip': {},
+    }
+    for dialect in dialects:
+        for size_name in size_names:
+            size, repeat = SIZES[size_name]
+            case = run_case(dialect, size_name, size, repeat, seed)
+            results['cases'].append(case)
+            print(
+                f'{dialect:10} {size_name:6} {case["chars"]:>9} 字元  '
+                f'p50 {case["p50_ms"]:10.2f} ms  p99 {case["p99_ms"]:10.2f} ms  '
+                f'{case["chars_per_sec"]:>12,.0f} 字元/秒  峰值 {case["peak_bytes"] / 1024:>10,.0f} KiB',
+                file=sys.stderr,
+            )
+        failures = cross_check(dialect, seed)
+        if failures:
+            results['cross_check_failures'][dialect] = failures
+            print(f'⚠️ {dialect} 結果不一致：{", ".join(failures)}', file=sys.stderr)
+        rate = results['round_trip'][dialect] = round_trip(dialect, seed)
+        print(f'{dialect:10} 反向轉換往返一致 {rate:.0%}', file=sys.stderr)
+    return results
+
+
+def compare(old, new):
+    """
+    比較兩次結果：列出速度比值，輸出雜湊不同的組合視為錯誤。回傳結束碼。
+    """
+    old_cases = {(c['dialect'], c['size']): c for c in old['cases']}
+    status = 0
+    for case in new['cases']:
+        key = (case['dialect'], case['size'])
+        before = old_cases.get(key)
+        if before is None:
+            continue
+        ratio = case['chars_per_sec'] / before['chars_per_sec'] if before['chars_per_sec'] else 0.0
+        same = case['output_sha256'] == before['output_sha256']
+        mark = '' if same else '  ⚠️ 輸出不同'
+        print(f'{key[0]:10} {key[1]:6} {ratio:6.2f}x  '
+              f'p50 {before["p50_ms"]:.2f} → {case["p50_ms"]:.2f} ms{mark}')
+        if not same:
+            status = 1
+    for dialect, rate in new.get('round_trip', {}).items():
+        before = old.get('round_trip', {}).get(dialect)
+        if before is not None and rate < before:
+            print(f'{dialect:10} 反向轉換往返一致 {before:.0%} → {rate:.0%}  ⚠️ 退步')
+            status = 1
+    if new.get('cross_check_failures'):
+        status = 1
+    return status
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='客語點字轉換器效能基準測試')
+    parser.add_argument('-d', '--dialect', action='append', choices=sorted(dialect_map),
+                        help='只測指定腔調（可重複；預設全部）')
+    parser.add_argument('-s', '--size', action='append', choices=list(SIZES),
+                        help='只測指定長度（可重複；預設全部）')
+    parser.add_argument('--seed', type=int, default=0, help='語料亂數種子')
+    parser.add_argument('-o', '--output', help='把結果寫成 JSON 檔')
+    parser.add_argument('--compare', nargs=2, metavar=('OLD', 'NEW'),
+                        help='比較兩個 JSON 結果檔，不執行測試')
+    args = parser.parse_args(argv)
+
+    if args.compare:
+        with open(args.compare[0], encoding='utf-8') as f:
+            old = json.load(f)
+        with open(args.compare[1], encoding='utf-8') as f:
+            new = json.load(f)
+        return compare(old, new)
+
+    results = run(args.dialect or list(dialect_map), args.size or list(SIZES), args.seed)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+    return 1 if results['cross_check_failures'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,225 @@
+"""
+轉換服務層：JSON API、批次、串流、即時編輯、ASGI 與命令列共用的入口。
+
+- 驗證輸入型別、正規化腔調代碼（別名換成登錄表中的正式代碼）
+- 限制單次請求的點字字元數（批次另外限制筆數，字元數以整批合計；串流轉換另有較大的上限）
+- 建立時載入各腔調點字表（有預先編譯檔時直接讀取），之後所有入口共用
+- 單段轉換經過結果快取；依入口記錄每次轉換的耗時與輸入字元數，由 /metrics 輸出
+
+不合規定的輸入拋出 ConversionRejected（內容太大為其子類 InputTooLarge），
+訊息可直接回給使用者，status 為建議的 HTTP 狀態碼。
+"""
+import os
+import time
+from contextlib import contextmanager
+
+from converter import (
+    UNKNOWN_DIALECT_MESSAGE,
+    convert_all_dialects,
+    convert_many,
+    convert_pinyin_to_braille,
+    convert_stream,
+    convert_with_diagnostics,
+    dialect_map,
+    get_dialect_tables,
+    iter_text_chunks,
+    resolve_dialect,
+)
+from metrics import LatencyHistogram
+from result_cache import ResultCache, cached_convert
+
+MAX_INPUT_CHARS = int(os.environ.get('MAX_INPUT_CHARS', 1024 * 1024))
+MAX_BATCH_ITEMS = int(os.environ.get('MAX_BATCH_ITEMS', 1000))
+# 串流轉換不把整份輸入留在記憶體，上限另外設定
+MAX_STREAM_CHARS = int(os.environ.get('MAX_STREAM_CHARS', 256 * 1024 * 1024))
+
+INPUT_CHARS_BUCKETS = (10, 100, 1000, 10_000, 100_000, 1_000_000)
+
+
+class ConversionRejected(ValueError):
+    status = 400
+
+
+class InputTooLarge(ConversionRejected):
+    status = 413
+
+
+class ConversionService:
+    """
+    各入口共用的轉換服務。result_cache 省略時建立預設大小的 ResultCache。
+    """
+
+    def __init__(self, result_cache=None, max_chars=MAX_INPUT_CHARS, max_batch_items=MAX_BATCH_ITEMS,
+                 max_stream_chars=MAX_STREAM_CHARS):
+        self.result_cache = result_cache if result_cache is not None else ResultCache()
+        self.max_chars = max_chars
+        self.max_stream_chars = max_stream_chars
+        self.max_batch_items = max_batch_items
+        self.latency = LatencyHistogram()
+        self.input_chars = LatencyHistogram(INPUT_CHARS_BUCKETS)
+        # 載入各腔調點字表；gunicorn --preload 時在 master 建立，worker 共用這份記憶體
+        for dialect in dialect_map:
+            get_dialect_tables(dialect)
+
+    # ---------- 驗證 ----------
+
+    @staticmethod
+    def normalize_dialect(dialect):
+        """別名換成正式代碼（快取與統計都以正式代碼為準）；不認得的代碼原樣交給轉換器回報。"""
+        if dialect is None:
+            return ''
+        if not isinstance(dialect, str):
+            raise ConversionRejected('⚠️ dialect 必須是字串')
+        return resolve_dialect(dialect) or dialect.strip().lower()
+
+    @staticmethod
+    def check_payload(data):
+        """JSON 請求內容：沒有內容（或不是 JSON）時視為空物件，不是物件時拒絕。"""
+        if data is None:
+            return {}
+        if not isinstance(data, dict):
+            raise ConversionRejected('⚠️ 需要 JSON 物件')
+        return data
+
+    def check_text(self, value, field='braille'):
+        if not isinstance(value, str):
+            raise ConversionRejected(f'⚠️ {field} 欄位必須是字串')
+        if len(value) > self.max_chars:
+            raise InputTooLarge(f'⚠️ 內容太大（上限 {self.max_chars} 字元）')
+        return value
+
+    def check_batch(self, items):
+        if not isinstance(items, list):
+            raise ConversionRejected('⚠️ items 必須是列表')
+        if len(items) > self.max_batch_items:
+            raise InputTooLarge(f'⚠️ 項目太多（上限 {self.max_batch_items} 筆）')
+        total = 0
+        for item in items:
+            text = item.get('braille', '') if isinstance(item, dict) else item
+            if isinstance(text, str):
+                total += len(text)
+        if total > self.max_chars:
+            raise InputTooLarge(f'⚠️ 內容太大（上限 {self.max_chars} 字元）')
+        return total
+
+    @contextmanager
+    def measure(self, entry, chars):
+        """記錄區塊的耗時與輸入字元數；chars 可以是結束時才呼叫的函式（串流時事先不知道長度）。"""
+        started = time.perf_counter()
+        status = 'error'
+        try:
+            yield
+            status = 'ok'
+        finally:
+            self.latency.observe(entry, status, time.perf_counter() - started)
+            self.input_chars.observe(entry, status, chars() if callable(chars) else chars)
+
+    # ---------- 入口 ----------
+
+    def convert(self, braille, dialect, entry='json'):
+        """單段點字轉拼音（經過結果快取）；無此腔調時回傳 UNKNOWN_DIALECT_MESSAGE。"""
+        braille = self.check_text(braille)
+        dialect = self.normalize_dialect(dialect)
+        with self.measure(entry, len(braille)):
+            return cached_convert(braille, dialect, self.result_cache)
+
+    def convert_batch(self, items, dialect, entry='batch'):
+        """批次轉換，結果格式同 converter.convert_many。"""
+        dialect, total, accepted, rejected = self.prepare_batch(items, dialect)
+        with self.measure(entry, total):
+            results = convert_many(accepted, dialect)
+        return self.merge_batch(results, rejected)
+
+    def prepare_batch(self, items, dialect):
+        """
+        驗證整批並正規化腔調，回傳 (整批腔調, 字元數, 要轉換的項目, {原位置: 錯誤結果})；
+        逐項腔調不合規定時只有該項失敗。轉換結果以 merge_batch 放回原本的順序。
+        """
+        total = self.check_batch(items)
+        dialect = self.normalize_dialect(dialect)
+        accepted, rejected = [], {}
+        for i, item in enumerate(items):
+            if isinstance(item, dict) and item.get('dialect') is not None:
+                try:
+                    item = {**item, 'dialect': self.normalize_dialect(item['dialect'])}
+                except ConversionRejected as e:
+                    rejected[i] = {'error': str(e)}
+                    continue
+            accepted.append(item)
+        return dialect, total, accepted, rejected
+
+    @staticmethod
+    def merge_batch(results, rejected):
+        if not rejected:
+            return results
+        size = len(results) + len(rejected)
+        results = iter(results)
+        return [rejected[i] if i in rejected else next(results) for i in range(size)]
+
+    def convert_all(self, braille, dialects=None, entry='all'):
+        """同一段點字轉成多個腔調（dialects 省略時為全部腔調）。"""
+        braille = self.check_text(braille)
+        if dialects is not None:
+            if not isinstance(dialects, list):
+                raise ConversionRejected('⚠️ dialects 必須是字串列表')
+            dialects = [self.normalize_dialect(d) for d in dialects]
+        with self.measure(entry, len(braille)):
+            return convert_all_dialects(braille, dialects)
+
+    def convert_reverse(self, pinyin, dialect, entry='reverse'):
+        """拼音轉點字。"""
+        pinyin = self.check_text(pinyin, 'pinyin')
+        dialect = self.normalize_dialect(dialect)
+        with self.measure(entry, len(pinyin)):
+            return convert_pinyin_to_braille(pinyin, dialect)
+
+    def diagnose(self, braille, dialect, entry='diagnostics'):
+        """轉換並回傳 ConversionDiagnostics（不經快取）。"""
+        braille = self.check_text(braille)
+        dialect = self.normalize_dialect(dialect)
+        with self.measure(entry, len(braille)):
+            return convert_with_diagnostics(braille, dialect)
+
+    def convert_stream(self, chunks, dialect, entry='stream'):
+        """
+        串流轉換（輸入格式同 converter.convert_stream），回傳逐段產生拼音的 iterator。
+        腔調在呼叫時就檢查，無此腔調時拋出 ConversionRejected；輸入累計超過 max_stream_chars
+        時，iterator 在轉換途中拋出 InputTooLarge（前面的結果已經產生）。
+        """
+        dialect = self.normalize_dialect(dialect)
+        if get_dialect_tables(dialect) is None:
+            raise ConversionRejected(UNKNOWN_DIALECT_MESSAGE)
+        return self._stream(chunks, dialect, entry)
+
+    def _stream(self, chunks, dialect, entry):
+        counter = [0]
+
+        def limited():
+            for chunk in iter_text_chunks(chunks):
+                counter[0] += len(chunk)
+                if counter[0] > self.max_stream_chars:
+                    raise InputTooLarge(f'⚠️ 內容太大（上限 {self.max_stream_chars} 字元）')
+                yield chunk
+
+        with self.measure(entry, lambda: counter[0]):
+            yield from convert_stream(limited(), dialect)
+
+    def open_live(self, sessions, braille, dialect, entry='live'):
+        """在 live_sessions.LiveSessions 開啟即時編輯文件，回傳 (doc_id, document)。"""
+        braille = self.check_text(braille)
+        dialect = self.normalize_dialect(dialect)
+        if get_dialect_tables(dialect) is None:
+            raise ConversionRejected(UNKNOWN_DIALECT_MESSAGE)
+        with self.measure(entry, len(braille)):
+            return sessions.open(braille, dialect)
+
+    def edit_live(self, sessions, doc_id, revision, offset, deleted, inserted, entry='live_edit'):
+        """即時編輯文件的一次編輯（參數同 LiveSessions.edit），回傳 (revision, diff)；inserted 受單次請求的字元數上限。"""
+        inserted = self.check_text(inserted, 'inserted')
+        with self.measure(entry, len(inserted)):
+            return sessions.edit(doc_id, revision, offset, deleted, inserted)
+
+    def metrics_lines(self):
+        return (self.latency.render('braille_conversion_seconds', '各入口的轉換耗時（秒）')
+                + self.input_chars.render('braille_conversion_input_chars', '各入口的輸入點字字元數'))
+
@@ -1,65 +1,86 @@
+import argparse
+import codecs
+import hashlib
 import json
+import logging
 import os
+import pickle
 import re
+import sys
+import threading
+import time
+from array import array
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, replace
+from types import MappingProxyType
 
-def _peek_nonspace(text, pos):
-    # 取下一個非空白字元（若沒有則回 ''），不移動游標；把 U+2800 視為空白
-    i = pos
-    n = len(text)
-    while i < n and text[i] in (' ', '\u2800'):
-        i += 1
-    return text[i] if i < n else ''
-
-def _prev_nonspace(text, pos):
-    # 取上一個非空白字元（若沒有則回 ''）；把 U+2800 視為空白
-    i = pos - 1
-    while i >= 0 and text[i] in (' ', '\u2800'):
-        i -= 1
-    return text[i] if i >= 0 else ''
-
-def _endswith_key(text, end_index, key_set, max_len):
-    """檢查 text[:end_index] 是否以 key_set 中任一鍵結尾（長度至多 max_len）。"""
-    start = max(0, end_index - max_len)
-    for j in range(end_index, start, -1):
-        if text[j-1:end_index] in key_set:
-            return True
-    return False
+BRAILLE_DATA_DIR = os.path.join(os.path.dirname(__file__), 'braille_data')
+
+logger = logging.getLogger(__name__)
+
+# 腔調代碼 → 中文名稱；由 braille_data/dialects.json 載入（見「腔調登錄表」）
+dialect_map = {}
 
 def load_json(filename):
-    base_path = os.path.join(os.path.dirname(__file__), 'braille_data')
-    with open(os.path.join(base_path, filename), encoding='utf-8') as f:
+    with open(os.path.join(BRAILLE_DATA_DIR, filename), encoding='utf-8') as f:
         return json.load(f)
 
 def load_json_keys_sorted(data_dict):
     # 依 key 長度由長到短排序
     return sorted(data_dict.keys(), key=len, reverse=True)
 
-def match_from_dict(text, start, candidates, allow_trailing_space=False):
-    # candidates 須為「已依長度由長到短」的列表
-    for candidate in candidates:
-        candidate_to_match = candidate.rstrip() if allow_trailing_space else candidate
-        length = len(candidate_to_match)
-        if text.startswith(candidate_to_match, start):
-            # 回傳原始 candidate（包含尾空白），避免外面 key error
-            return length, candidate
-    return 0, None
-
-# ---------- 新增：共用小工具 ----------
-
-def _has_syllable_content(syllable):
-    # 除了 nasal 以外的欄位只要有值，就代表正在組裝音節
-    return any(v for k, v in syllable.items() if k != "nasal")
+_TRIE_END = ''  # 節點中存放「完整鍵」的欄位；單一字元不可能是空字串
 
-def _endswith_any(text, end_index, keys):
+class PrefixTrie:
     """
-    檢查 text[:end_index] 是否以 keys 之任何鍵（最長優先）結尾。
-    回傳 (匹配長度, 鍵)；若無則 (0, None)。
+    點字鍵的前綴樹：match() 以 O(鍵長) 找出最長匹配，取代逐一 startswith 的線性掃描。
+    回傳 (匹配長度, 原始鍵)，無匹配則 (0, None)。
+    allow_trailing_space=True 時以去尾空白後的鍵比對，但仍回傳原始鍵。
     """
-    for k in keys:
-        L = len(k)
-        if end_index - L >= 0 and text[end_index - L:end_index] == k:
-            return L, k
-    return 0, None
+    __slots__ = ('_root', '_stripped_root', 'max_len')
+
+    def __init__(self, keys):
+        # 依長度由長到短插入：去尾空白後撞鍵時，保留先出現（較長）的原始鍵
+        ordered = sorted((k for k in keys if k), key=len, reverse=True)
+        self._root = self._build(ordered, strip=False)
+        if any(k != k.rstrip() for k in ordered):
+            self._stripped_root = self._build(ordered, strip=True)
+        else:
+            self._stripped_root = self._root
+        self.max_len = max((len(k) for k in ordered), default=0)
+
+    @staticmethod
+    def _build(keys, strip):
+        root = {}
+        for key in keys:
+            path = key.rstrip() if strip else key
+            if not path:
+                continue
+            node = root
+            for ch in path:
+                node = node.setdefault(ch, {})
+            node.setdefault(_TRIE_END, key)
+        return root
+
+    def match(self, text, start, allow_trailing_space=False):
+        node = self._stripped_root if allow_trailing_space else self._root
+        best_len = 0
+        best_key = None
+        i = start
+        n = len(text)
+        while i < n:
+            node = node.get(text[i])
+            if node is None:
+                break
+            i += 1
+            key = node.get(_TRIE_END)
+            if key is not None:
+                best_len = i - start
+                best_key = key
+        return best_len, best_key
+
+# ---------- 新增：共用小工具 ----------
 
 def _eat_spaces(text, i):
     """
@@ -71,27 +92,76 @@ def _eat_spaces(text, i):
         count += 1
     return count
 
-def _is_tone_char(ch, tones_dict):
-    return ch in tones_dict
+# ---------- 脈絡索引（一次預掃描，之後 O(1) 查詢） ----------
 
-def _peek_nonspace(text, pos):
-    # 取下一個非空白字元（若沒有則回 ''），不移動游標
-    i = pos
-    n = len(text)
-    while i < n and text[i] == ' ':
-        i += 1
-    return text[i] if i < n else ''
+_SPACE_RUN_RE = re.compile(' +')
 
-def _prev_nonspace(text, pos):
-    # 取上一個非空白字元（若沒有則回 ''）
-    i = pos - 1
-    while i >= 0 and text[i] == ' ':
-        i -= 1
-    return text[i] if i >= 0 else ''
 
-def _match_punctuation_with_context(text, i, punctuation_keys, tones_keys, rushio_keys,
-                                    current_syllable, punct_map,
-                                    opening_braille_set=None, closing_braille_set=None):
+class TextIndex:
+    """
+    對一段點字文字預先算好的脈絡查詢表，取代每次往前/往後逐字掃描：
+      peek_nonspace(i)：i 之後（含 i）第一個非 ' ' 字元
+      prev_nonspace(i)：i 之前最後一個非 ' ' 字元
+      ends_with_rushio(i) / ends_with_tone(i)：text[:i] 是否以 rushio / tone 鍵結尾
+    只把 ASCII 空白當空白。
+    空白串以外的位置在 next_ns / prev_ns 中都是 0（代表「自己」/「前一格」），
+    所以預掃描只需處理空白串與鍵出現的位置。
+    """
+    __slots__ = ('text', 'next_ns', 'prev_ns', 'rushio_end', 'tone_end')
+
+    def __init__(self, text, tables):
+        n = len(text)
+        self.text = text
+
+        # next_ns[i]：i 在空白串 [a, b) 內時為 b；prev_ns[i]：i-1 在空白串 [a, b) 內時為 a + 1
+        zeros = bytes(array('i').itemsize * (n + 1))
+        next_ns = array('i', zeros)
+        prev_ns = array('i', zeros)
+        for m in _SPACE_RUN_RE.finditer(text):
+            a, b = m.span()
+            if b - a == 1:
+                next_ns[a] = b
+                prev_ns[b] = b
+            else:
+                next_ns[a:b] = array('i', [b]) * (b - a)
+                prev_ns[a + 1:b + 1] = array('i', [a + 1]) * (b - a)
+        self.next_ns = next_ns
+        self.prev_ns = prev_ns
+
+        self.rushio_end = self._key_ends(text, tables.rushio_keys)
+        self.tone_end = self._key_ends(text, tables.tones_keys)
+
+    @staticmethod
+    def _key_ends(text, keys):
+        ends = bytearray(len(text) + 1)
+        find = text.find
+        for key in keys:
+            if not key:
+                continue
+            size = len(key)
+            p = find(key)
+            while p != -1:
+                ends[p + size] = 1
+                p = find(key, p + 1)
+        return ends
+
+    def peek_nonspace(self, pos):
+        j = self.next_ns[pos] or pos
+        return self.text[j] if j < len(self.text) else ''
+
+    def prev_nonspace(self, pos):
+        v = self.prev_ns[pos]
+        j = v - 2 if v else pos - 1
+        return self.text[j] if j >= 0 else ''
+
+    def ends_with_rushio(self, pos):
+        return self.rushio_end[pos] == 1
+
+    def ends_with_tone(self, pos):
+        return self.tone_end[pos] == 1
+
+
+def _match_punctuation_with_context(text, i, tables, current_syllable, index):
     """
     具有脈絡的標點判定：
       1) 位置 i 能匹配某個標點鍵
@@ -101,8 +171,13 @@ def _match_punctuation_with_context(text, i, punctuation_keys, tones_keys, rushi
     ★ 特例B：分號 '⠆' 必須「前 rushio 或 tone」且「後緊接點字空格 U+2800」才算標點
              否則交回主流程（可能是 bb 或 ˇ）
     """
+    tones_keys = tables.tones_key_set
+    punct_map = tables.punctuations
+    opening_braille_set = tables.opening_braille_set
+    closing_braille_set = tables.closing_braille_set
+
     # 嘗試匹配任何標點（含可帶尾空白的鍵）
-    punct_len, punct_match = match_from_dict(text, i, punctuation_keys, allow_trailing_space=True)
+    punct_len, punct_match = tables.punctuation_trie.match(text, i, allow_trailing_space=True)
     if punct_len == 0 or punct_match is None:
         return 0, None
 
@@ -111,10 +186,8 @@ def _match_punctuation_with_context(text, i, punctuation_keys, tones_keys, rushi
         # 後綴：下一個字元「必須」是點字空格（緊接，不跳過一般空白）
         next_is_bspace = (i + punct_len < len(text) and text[i + punct_len] == '\u2800')
         # 前綴：是否以 rushio / tone 鍵結尾（最長優先）
-        _, rkey = _endswith_any(text, i, rushio_keys)
-        _, tkey = _endswith_any(text, i, tones_keys)
-        prev_is_rushio = (rkey is not None)
-        prev_is_tone   = (tkey is not None)
+        prev_is_rushio = index.ends_with_rushio(i)
+        prev_is_tone   = index.ends_with_tone(i)
         if next_is_bspace and (prev_is_rushio or prev_is_tone):
             return punct_len, punct_match
         else:
@@ -123,39 +196,36 @@ def _match_punctuation_with_context(text, i, punctuation_keys, tones_keys, rushi
 
     # ★ 特例A（收斂版）：括號類在合理脈絡直接放行
     if opening_braille_set and punct_match in opening_braille_set:
-        if not _has_syllable_content(current_syllable):  # 不在組音節中
-            prev_ch = _prev_nonspace(text, i)
+        if not current_syllable.has_content():  # 不在組音節中
+            prev_ch = index.prev_nonspace(i)
             if prev_ch == '' or prev_ch == ' ' or prev_ch in punct_map:
-                next_ch = _peek_nonspace(text, i + punct_len)
+                next_ch = index.peek_nonspace(i + punct_len)
                 if not next_ch or next_ch not in tones_keys:  # 開括號不帶 tone
                     return punct_len, punct_match
         # 不符合上述脈絡 → 不強行放行，落回一般規則
 
     if closing_braille_set and punct_match in closing_braille_set:
         # 閉括號通常出現在音節後；只要不在組音節中就視為標點
-        if not _has_syllable_content(current_syllable):
+        if not current_syllable.has_content():
             return punct_len, punct_match
         return 0, None  # 讓外層先收束音節
 
     # 一般脈絡：前面只能是起始/空白/ tone / rushio 結尾
-    prev_ch = _prev_nonspace(text, i)
+    prev_ch = index.prev_nonspace(i)
     prev_ok = False
     if prev_ch == '' or prev_ch == ' ':
         prev_ok = True
     else:
-        # tone：用最長結尾檢查以涵蓋多鍵情況
-        _, tkey = _endswith_any(text, i, tones_keys)
-        if tkey is not None:
+        # tone：用結尾查表檢查以涵蓋多鍵情況
+        if index.ends_with_tone(i):
+            prev_ok = True
+        elif index.ends_with_rushio(i):
             prev_ok = True
-        else:
-            _, rkey = _endswith_any(text, i, rushio_keys)
-            if rkey is not None:
-                prev_ok = True
     if not prev_ok:
         return 0, None
 
     # 後面第一個非空白不可是 tone（標點不帶 tone）
-    next_ch = _peek_nonspace(text, i + punct_len)
+    next_ch = index.peek_nonspace(i + punct_len)
     if next_ch and next_ch in tones_keys:
         return 0, None
 
@@ -163,21 +233,38 @@ def _match_punctuation_with_context(text, i, punctuation_keys, tones_keys, rushi
 
 # ---------- 組裝輸出 ----------
 
-def assemble_syllable(syllable):
-    initial = str(syllable.get("initial", ""))
-    vowel = str(syllable.get("vowel", ""))
-    nasal = "nn" if syllable.get("nasal") else ""
-    rushio = str(syllable.get("rushio", ""))
-    tone = str(syllable.get("tone", ""))
+class Syllable:
+    """
+    組裝中的音節。主流程只建立一個，收束後 reset() 重複使用，不再每個音節配置新 dict。
+    """
+    __slots__ = ('initial', 'vowel', 'rushio', 'tone', 'nasal')
 
-    # rushio 後面不加底線，不管 tone 有沒有
-    syllable_text = initial + vowel + nasal + rushio + tone
+    def __init__(self):
+        self.reset()
 
-    # 如果沒有 rushio 且沒有 tone，才加底線，用來標記空格
-    if rushio == "" and tone == "":
-        syllable_text += "_"
+    def reset(self):
+        self.initial = ''
+        self.vowel = ''
+        self.rushio = ''
+        self.tone = ''
+        self.nasal = False
 
-    return syllable_text
+    def has_content(self):
+        # 除了 nasal 以外的欄位只要有值，就代表正在組裝音節
+        return bool(self.initial or self.vowel or self.rushio or self.tone)
+
+    def assemble(self):
+        rushio = self.rushio
+        tone = self.tone
+
+        # rushio 後面不加底線，不管 tone 有沒有
+        syllable_text = self.initial + self.vowel + ('nn' if self.nasal else '') + rushio + tone
+
+        # 如果沒有 rushio 且沒有 tone，才加底線，用來標記空格
+        if rushio == "" and tone == "":
+            syllable_text += "_"
+
+        return syllable_text
 
 def get_rushio_value(key, dialect, rushio_dict):
     # 根據腔調取出拼音值，支援巢狀格式的 JSON，如：
@@ -190,442 +277,2096 @@ def get_rushio_value(key, dialect, rushio_dict):
     else:
         return entry  # fallback for 舊格式
 
-def convert_braille_to_pinyin(braille_text, dialect):
-    vowels = load_json('dot_vowels.json')
-    rushio = load_json('dot_rushio_syllables.json')
-    special_cases = load_json('dot_special.json')
-    punctuations = load_json('dot_punctuation.json')
+# ---------- 腔調登錄表 ----------
+#
+# braille_data/dialects.json 是腔調的唯一來源：每個腔調的中文名稱、子音表與調號表檔名、
+# rushio 取值用的鍵（dot_rushio_syllables.json 巢狀格式中的 "default"、"tapu"、"choaan"），
+# 以及別名（例如舊前端用的 ngiophing、coan）。前端從同一份點字表打包檔取得它。
+# 代碼與別名（不分大小寫）在 _dialect_lookup 內直接查到正式代碼；
+# 別名的點字表與正式代碼共用同一個 DialectTables，也放進 _tables_cache。
+
+DIALECT_REGISTRY_FILE = 'dialects.json'
+
+
+@dataclass(frozen=True)
+class DialectSpec:
+    code: str
+    name: str
+    consonants: str
+    tones: str
+    rushio: str
+    aliases: tuple
+
+
+dialect_registry = {}  # 正式代碼 → DialectSpec
+_dialect_lookup = {}   # 正式代碼、別名（小寫）→ 正式代碼
+
+
+def _load_dialect_registry():
+    data = load_json(DIALECT_REGISTRY_FILE)
+    registry = {}
+    lookup = {}
+    for code, entry in data.items():
+        spec = DialectSpec(
+            code=code,
+            name=entry['name'],
+            consonants=entry['consonants'],
+            tones=entry['tones'],
+            rushio=entry.get('rushio', 'default'),
+            aliases=tuple(entry.get('aliases', ())),
+        )
+        registry[code] = spec
+        for key in (code, *spec.aliases):
+            key = key.lower()
+            if lookup.setdefault(key, code) != code:
+                raise ValueError(f'{DIALECT_REGISTRY_FILE}: 「{key}」同時對應 {lookup[key]} 與 {code}')
+
+    # 原地更新，其他模組 import 的 dialect_map 也跟著改變
+    dialect_registry.clear()
+    dialect_registry.update(registry)
+    dialect_map.clear()
+    dialect_map.update((code, spec.name) for code, spec in registry.items())
+    _dialect_lookup.clear()
+    _dialect_lookup.update(lookup)
+
+
+def resolve_dialect(dialect):
+    """腔調代碼或別名（不分大小寫、忽略前後空白）→ 正式代碼；無此腔調時回傳 None。"""
+    if not isinstance(dialect, str):
+        return None
+    code = _dialect_lookup.get(dialect)
+    if code is None:
+        code = _dialect_lookup.get(dialect.strip().lower())
+    return code
 
-    # ★ 動態蒐集：這些明眼標點的「點字鍵」
-    opening_targets = {'『', '【', '（'}
-    closing_targets = {'】'}  # 若也想包含『」』）等，自己加進來
-    opening_braille_set = {k for k, v in punctuations.items() if v in opening_targets}
-    closing_braille_set = {k for k, v in punctuations.items() if v in closing_targets}
-
-    punctuation_keys = load_json_keys_sorted(punctuations)
-    special_punctuations_allow_prefix = ["⠴", "⠠⠴", "⠐⠜", "⠨⠜"]  # 保留，但會先走「脈絡判定」版
-
-    dialect_map = {
-        'siian2': '四縣腔',
-        'namsiian2': '南四縣腔',
-        'hailuk': '海陸腔',
-        'tapu': '大埔腔',
-        'ngiauphin': '饒平腔',
-        'choaan': '詔安腔'
-    }
-
-    human_dialect = dialect_map.get(dialect, None)
-    if human_dialect is None:
-        return '⚠️ 無此腔調配置'
-
-    if human_dialect in ['四縣腔', '南四縣腔']:
-        consonants = load_json('dot_consonants_siian2.json')
-        tones = load_json('dot_tone_siian2.json')
-    else:
-        consonants = load_json('dot_consonants_hpzt.json')
-        tones = load_json('dot_tone_hpzt.json')
 
-    special_keys = load_json_keys_sorted(special_cases)
-    consonants_keys = load_json_keys_sorted(consonants)
-    vowels_keys = load_json_keys_sorted(vowels)
-    rushio_keys = load_json_keys_sorted(rushio)
-    tones_keys = load_json_keys_sorted(tones)
+_load_dialect_registry()
 
-    # ★ 查表用（供分號短路與 bb 限制）
-    rushio_key_set = set(rushio_keys)
-    rushio_max_len = max((len(k) for k in rushio_keys), default=0)
-    tones_key_set  = set(tones_keys)
-    tones_max_len  = max((len(k) for k in tones_keys),  default=0)
 
-    # 開/閉括號鍵：長到短排序，避免子串誤配
-    opening_braille_sorted = sorted(opening_braille_set, key=len, reverse=True)
-    closing_braille_sorted = sorted(closing_braille_set, key=len, reverse=True)
+# ---------- 編譯後的點字表（每個腔調只建一次） ----------
 
-    result = []
-    current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
+# 明眼標點中需要「依脈絡直接放行」的開/閉括號
+_OPENING_TARGETS = frozenset({'『', '【', '（'})
+_CLOSING_TARGETS = frozenset({'】'})  # 若也想包含『」』）等，自己加進來
 
-    i = 0
-    length = len(braille_text)
+# 句首 / 空白後一定當標點的開括號：『(⠠⠦)、【(⠨⠣)、（(⠐⠣)
+# 安全回退用：若 dot_punctuation.json 無對應鍵，給預設明眼符號
+_HARD_OPEN_MAP = {'⠠⠦': '『', '⠨⠣': '【', '⠐⠣': '（'}
+_HARD_OPEN_TRIE = PrefixTrie(_HARD_OPEN_MAP)
 
-    while i < length:
 
-        # ★ 高優先級：句首 / 空白 / 點字空白 / 換行 後的「開括號」一定當標點
-        #   這三個：『(⠠⠦)、【(⠨⠣)、（(⠐⠣)
-        if i == 0 or braille_text[i - 1] in (' ', '\u2800', '\n', '\r'):
-            # 安全回退用：若 dot_punctuation.json 無對應鍵，給預設明眼符號
-            hard_open_map = {'⠠⠦': '『', '⠨⠣': '【', '⠐⠣': '（'}
-            matched_open_key = None
-            matched_open_len = 0
-
-            for open_key in ('⠠⠦', '⠨⠣', '⠐⠣'):
-                if braille_text.startswith(open_key, i):
-                    matched_open_key = open_key
-                    matched_open_len = len(open_key)
-                    break
+@dataclass(frozen=True)
+class DialectTables:
+    """
+    單一腔調編譯後的唯讀點字表：原始對照表、依長度排序的鍵、查表用集合與最長鍵長、
+    開/閉括號鍵集合。由 get_dialect_tables() 建立並快取，轉換時不再讀檔或排序。
+    """
+    dialect: str
+    human_dialect: str
 
-            if matched_open_key is not None:
-                if _has_syllable_content(current_syllable):
-                    result.append(assemble_syllable(current_syllable))
-                    current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-                result.append(punctuations.get(matched_open_key, hard_open_map[matched_open_key]))
-                i += matched_open_len
+    vowels: MappingProxyType
+    rushio: MappingProxyType
+    special_cases: MappingProxyType
+    punctuations: MappingProxyType
+    consonants: MappingProxyType
+    tones: MappingProxyType
+
+    # rushio 鍵 → 此腔調的拼音（已套用 get_rushio_value）
+    rushio_values: MappingProxyType
+
+    # 依 key 長度由長到短排序
+    special_keys: tuple
+    consonants_keys: tuple
+    vowels_keys: tuple
+    rushio_keys: tuple
+    tones_keys: tuple
+    punctuation_keys: tuple
+
+    # 查表用（供分號短路與 bb 限制）
+    rushio_key_set: frozenset
+    rushio_max_len: int
+    tones_key_set: frozenset
+    tones_max_len: int
+
+    # 開/閉括號鍵；閉括號另存長到短排序，避免子串誤配
+    opening_braille_set: frozenset
+    closing_braille_set: frozenset
+    closing_braille_sorted: tuple
+
+    # 最長匹配用的前綴樹（取代逐鍵 startswith）
+    special_trie: PrefixTrie
+    consonants_trie: PrefixTrie
+    vowels_trie: PrefixTrie
+    rushio_trie: PrefixTrie
+    tones_trie: PrefixTrie
+    punctuation_trie: PrefixTrie
+    closing_trie: PrefixTrie
+
+
+_json_cache = {}
+_tables_cache = {}
+_tables_lock = threading.Lock()
+
+
+def _load_json_cached(filename):
+    # 同一個 JSON 檔在所有腔調間共用，只解析一次
+    data = _json_cache.get(filename)
+    if data is None:
+        data = MappingProxyType(load_json(filename))
+        _json_cache[filename] = data
+    return data
+
+
+def _build_dialect_tables(spec):
+    vowels = _load_json_cached('dot_vowels.json')
+    rushio = _load_json_cached('dot_rushio_syllables.json')
+    special_cases = _load_json_cached('dot_special.json')
+    punctuations = _load_json_cached('dot_punctuation.json')
+
+    # 子音、調號表依登錄表（四縣、南四縣用 siian2；其他用 hpzt）
+    consonants = _load_json_cached(spec.consonants)
+    tones = _load_json_cached(spec.tones)
+
+    rushio_keys = tuple(load_json_keys_sorted(rushio))
+    tones_keys = tuple(load_json_keys_sorted(tones))
+
+    # ★ 動態蒐集：這些明眼標點的「點字鍵」
+    opening_braille_set = frozenset(k for k, v in punctuations.items() if v in _OPENING_TARGETS)
+    closing_braille_set = frozenset(k for k, v in punctuations.items() if v in _CLOSING_TARGETS)
+
+    return DialectTables(
+        dialect=spec.code,
+        human_dialect=spec.name,
+        vowels=vowels,
+        rushio=rushio,
+        special_cases=special_cases,
+        punctuations=punctuations,
+        consonants=consonants,
+        tones=tones,
+        rushio_values=MappingProxyType({k: get_rushio_value(k, spec.rushio, rushio) for k in rushio}),
+        special_keys=tuple(load_json_keys_sorted(special_cases)),
+        consonants_keys=tuple(load_json_keys_sorted(consonants)),
+        vowels_keys=tuple(load_json_keys_sorted(vowels)),
+        rushio_keys=rushio_keys,
+        tones_keys=tones_keys,
+        punctuation_keys=tuple(load_json_keys_sorted(punctuations)),
+        rushio_key_set=frozenset(rushio_keys),
+        rushio_max_len=max((len(k) for k in rushio_keys), default=0),
+        tones_key_set=frozenset(tones_keys),
+        tones_max_len=max((len(k) for k in tones_keys), default=0),
+        opening_braille_set=opening_braille_set,
+        closing_braille_set=closing_braille_set,
+        closing_braille_sorted=tuple(sorted(closing_braille_set, key=len, reverse=True)),
+        special_trie=PrefixTrie(special_cases),
+        consonants_trie=PrefixTrie(consonants),
+        vowels_trie=PrefixTrie(vowels),
+        rushio_trie=PrefixTrie(rushio),
+        tones_trie=PrefixTrie(tones),
+        punctuation_trie=PrefixTrie(punctuations),
+        closing_trie=PrefixTrie(closing_braille_set),
+    )
+
+
+def _cache_tables(tables):
+    # 呼叫端需持有 _tables_lock；正式代碼與各別名都指向同一份點字表
+    spec = dialect_registry[tables.dialect]
+    _tables_cache[spec.code] = tables
+    for alias in spec.aliases:
+        _tables_cache[alias] = tables
+
+
+def get_dialect_tables(dialect):
+    """
+    取得腔調的編譯後點字表（第一次使用時建立，之後直接回傳快取）。
+    dialect 可以是正式代碼或登錄表中的別名；無此腔調則回傳 None。
+    """
+    tables = _tables_cache.get(dialect)
+    if tables is not None:
+        return tables
+
+    code = resolve_dialect(dialect)
+    if code is None:
+        return None
+
+    global _artifact_checked
+    with _tables_lock:
+        tables = _tables_cache.get(code)
+        if tables is None:
+            started = time.perf_counter()
+            if not _artifact_checked:
+                # 第一次需要點字表時，先試著一次載入所有腔調的預先編譯檔
+                _artifact_checked = True
+                for loaded in (load_compiled_tables() or {}).values():
+                    _cache_tables(loaded)
+                tables = _tables_cache.get(code)
+            if tables is None:
+                tables = _build_dialect_tables(dialect_registry[code])
+                _cache_tables(tables)
+            if _profiler is not None:
+                _profiler.add_stage('load_tables', time.perf_counter() - started)
+    return tables
+
+
+def reload_tables():
+    """
+    丟棄所有快取的點字表，下次轉換時重新讀取 braille_data/*.json。
+    用於修改 JSON 後不重啟 worker 就套用新表。
+    """
+    global _tables_version, _artifact_checked
+    with _tables_lock:
+        _json_cache.clear()
+        _load_dialect_registry()
+        _tables_cache.clear()
+        _artifact_checked = False
+        _engine_cache.clear()
+        _reverse_cache.clear()
+        _family_cache.clear()
+        _tables_version = None
+
+
+_tables_version = None
+
+
+def tables_version():
+    """
+    braille_data/*.json 內容的雜湊（十六進位字串），任何一個表被修改就會改變。
+    供快取鍵與「內容未變就略過」判斷使用；reload_tables() 之後重新計算。
+    """
+    global _tables_version
+    version = _tables_version
+    if version is None:
+        digest = hashlib.sha256()
+        for filename in sorted(os.listdir(BRAILLE_DATA_DIR)):
+            if not filename.endswith('.json'):
                 continue
+            digest.update(filename.encode('utf-8') + b'\0')
+            with open(os.path.join(BRAILLE_DATA_DIR, filename), 'rb') as f:
+                digest.update(f.read())
+            digest.update(b'\0')
+        version = _tables_version = digest.hexdigest()[:16]
+    return version
+
+
+# ---------- 預先編譯的點字表檔 ----------
+#
+# python -m converter --compile-tables 把所有腔調的 DialectTables（含前綴樹、排序後的鍵、
+# 已套用腔調的 rushio 值）存成單一 pickle 檔。worker 第一次需要點字表時載入它，
+# 不必解析 JSON、重建前綴樹；gunicorn --preload 時在 master 載入一次，fork 出的 worker 共用。
+# 檔案內記錄 tables_version()，與目前 JSON 不一致（過期）或格式不符時自動改用 JSON。
+# braille_data/ 會公開給前端下載，所以預先編譯檔放在專案的 .cache/ 底下（可用環境變數 TABLES_ARTIFACT 指定）。
+
+TABLES_ARTIFACT = os.environ.get(
+    'TABLES_ARTIFACT', os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache', 'compiled_tables.pickle'))
+_ARTIFACT_FORMAT = 1
+
+_artifact_checked = False
+
+
+def _tables_state(tables):
+    # MappingProxyType 無法 pickle，存成一般 dict（同一個 dict 在各腔調間共用，pickle 只存一份）
+    state = {}
+    for name in DialectTables.__dataclass_fields__:
+        value = getattr(tables, name)
+        state[name] = value.copy() if isinstance(value, MappingProxyType) else value
+    return state
+
+
+def compile_tables(path=TABLES_ARTIFACT):
+    """把所有腔調的點字表從 JSON 編譯並寫成預先編譯檔（原子寫入），回傳檔案路徑。"""
+    version = tables_version()
+    shared = {}
+    states = {}
+    for dialect, spec in dialect_registry.items():
+        state = _tables_state(_build_dialect_tables(spec))
+        for name, value in state.items():
+            if isinstance(value, dict):
+                # 內容相同的表只存一份，載入後也共用同一個物件
+                state[name] = shared.setdefault(json.dumps(value, ensure_ascii=False, sort_keys=True), value)
+        states[dialect] = state
+    payload = {'format': _ARTIFACT_FORMAT, 'tables_version': version, 'tables': states}
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(payload, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    return path
+
+
+def load_compiled_tables(path=TABLES_ARTIFACT):
+    """
+    讀取預先編譯檔，回傳 {腔調: DialectTables}；
+    檔案不存在、損壞、格式不符或與目前 JSON 不一致時回傳 None（呼叫端改用 JSON）。
+    """
+    try:
+        with open(path, 'rb') as f:
+            payload = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        logger.warning('預先編譯的點字表無法讀取，改用 JSON：%s: %s', type(e).__name__, e)
+        return None
+    if not isinstance(payload, dict) or payload.get('format') != _ARTIFACT_FORMAT:
+        return None
+    if payload.get('tables_version') != tables_version():
+        logger.warning('預先編譯的點字表已過期（braille_data 有修改），改用 JSON；'
+                       '請重新執行 python -m converter --compile-tables')
+        return None
 
-        # ★ 高優先級：遇到「閉括號」鍵，直接當標點
-        matched_close = None
-        for k in closing_braille_sorted:
-            if braille_text.startswith(k, i):
-                matched_close = k
-                break
-        if matched_close is not None:
-            if _has_syllable_content(current_syllable):
-                result.append(assemble_syllable(current_syllable))
-                current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            result.append(punctuations[matched_close])  # 】（或你表裡定義的任一閉括號）
-            i += len(matched_close)
+    proxies = {}
+    loaded = {}
+    for dialect, state in payload['tables'].items():
+        fields = {}
+        for name, value in state.items():
+            if isinstance(value, dict):
+                proxy = proxies.get(id(value))
+                if proxy is None:
+                    proxy = proxies[id(value)] = MappingProxyType(value)
+                value = proxy
+            fields[name] = value
+        loaded[dialect] = DialectTables(**fields)
+    return loaded
+
+
+UNKNOWN_DIALECT_MESSAGE = '⚠️ 無此腔調配置'
+
+
+def convert_braille_to_pinyin(braille_text, dialect):
+    tables = get_dialect_tables(dialect)
+    if tables is None:
+        return UNKNOWN_DIALECT_MESSAGE
+    return _convert_with_tables(braille_text, tables)
+
+
+def convert_many(texts, dialect):
+    """
+    批次轉換：texts 的每一項可以是點字字串（使用 dialect），
+    或 {"braille": ..., "dialect": ...} 的 dict（可逐項指定腔調）。
+    依原順序回傳結果列表，每項為 {"result": 拼音} 或 {"error": 錯誤訊息}；
+    單項失敗不影響其他項目。同一腔調的編譯表在整批中共用。
+    """
+    results = []
+    for item in texts:
+        item_dialect = dialect
+        braille_text = item
+        if isinstance(item, dict):
+            braille_text = item.get('braille', '')
+            item_dialect = item.get('dialect') or dialect
+
+        if not isinstance(braille_text, str):
+            results.append({'error': '⚠️ braille 欄位必須是字串'})
             continue
 
-        # ★★★ Tri-disambiguation for '⠆'：分號； / 子音 bb / 調號 ˇ ★★★
-        if braille_text[i] == '⠆':
-            next_is_bspace = (i + 1 < length and braille_text[i + 1] == '\u2800')
-
-            # 前綴查表：判斷「前面是否以 rushio 或 tone 鍵結尾」
-            prev_is_rushio = _endswith_key(braille_text, i, rushio_key_set, rushio_max_len)
-            prev_is_tone   = _endswith_key(braille_text, i, tones_key_set,  tones_max_len)
-
-            # 1) 『分號；』：前面是 rushio 或 tone，且後面是「點字空格」
-            if next_is_bspace and (prev_is_rushio or prev_is_tone):
-                if _has_syllable_content(current_syllable):
-                    result.append(assemble_syllable(current_syllable))
-                    current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-                result.append('；')
-                i += 2  # 跳過 '⠆' + 點字空格
-                continue
+        tables = get_dialect_tables(item_dialect)
+        if tables is None:
+            results.append({'error': UNKNOWN_DIALECT_MESSAGE})
+            continue
 
-            # 2) 『子音 bb』：僅在音節起始，且 '⠆' 後面「立刻」能匹配母音鍵
-            if not _has_syllable_content(current_syllable):
-                vlen, _ = match_from_dict(braille_text, i + 1, vowels_keys)
-                if vlen > 0:
-                    current_syllable["initial"] = consonants['⠆']
-                    i += 1
-                    continue
-                # 起始但後面不是母音 → 不當 bb，交給後續（可能是 tone 或其他）
-
-            # 3) 『調號 ˇ』：前面不是 rushio/其他 tone，且當前音節已開、尚未有 tone
-            if not (prev_is_rushio or prev_is_tone) and _has_syllable_content(current_syllable) and not current_syllable["tone"]:
-                current_syllable["tone"] = tones['⠆']
-                i += 1
-                continue
-            # 以上皆非 → 交由一般流程（之後的標點/母音/子音/tone 判斷）
+        try:
+            results.append({'result': _convert_with_tables(braille_text, tables)})
+        except Exception as e:
+            results.append({'error': f'⚠️ 轉換失敗：{type(e).__name__}: {e}'})
+    return results
 
-        # ★ (A) 標點：先用「脈絡判定」的方式辨識，避免把母音/聲母誤當標點
-        punct_len, punct_match = _match_punctuation_with_context(
-            braille_text, i, punctuation_keys, tones_keys, rushio_keys,
-            current_syllable, punctuations,
-            opening_braille_set, closing_braille_set
-        )
-        if punct_len > 0:
-            # 若當前音節尚未輸出，先結束它（理論上 _match 已確保沒有在組裝中）
-            if _has_syllable_content(current_syllable):
-                result.append(assemble_syllable(current_syllable))
-                current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-
-            # 特例處理 ⠦（和你原邏輯一致）
-            prev_char = _prev_nonspace(braille_text, i)
-            next_char = _peek_nonspace(braille_text, i + punct_len)
-
-            if punct_match == '⠦':
-                if prev_char in tones:
-                    result.append('？')
-                elif not next_char or (next_char not in tones and next_char != ' '):
-                    result.append('「')
-                else:
-                    result.append('？')
-            else:
-                result.append(punctuations[punct_match])
 
-            i += punct_len
-            if result and result[-1] == '；':
-                i += _eat_spaces(braille_text, i)
+# ---------- 一次轉換成多個腔調 ----------
+#
+# 同一組子音/調號/母音/標點/特殊字表的腔調（四縣、南四縣一組；海陸、大埔、饒平、詔安一組），
+# 主流程的斷詞完全相同，只有 rushio 的拼音不同，而 rushio 值只影響輸出文字、不影響判斷。
+# 所以每組只轉換一次：rushio 先輸出成私用區的佔位字元，再依各腔調替換，最後各自後處理。
+
+_PLACEHOLDER_BASE = 0xE000
+
+_family_cache = {}
+
+
+def _dialect_families(dialects):
+    """把腔調依「除了 rushio 值以外完全相同的點字表」分組，回傳 [(範本表, 佔位替換表, [(腔調, 表)...])]。"""
+    groups = {}
+    for dialect in dialects:
+        tables = get_dialect_tables(dialect)
+        key = tuple(id(getattr(tables, name)) for name in
+                    ('vowels', 'rushio', 'special_cases', 'punctuations', 'consonants', 'tones'))
+        groups.setdefault(key, []).append((dialect, tables))
+
+    families = []
+    for key, members in groups.items():
+        first = members[0][1]
+        cached = _family_cache.get(key)
+        if cached is None or cached[0] is not first:
+            placeholders = {k: chr(_PLACEHOLDER_BASE + n) for n, k in enumerate(first.rushio_keys)}
+            template = replace(first, dialect='*' + first.dialect,
+                               rushio_values=MappingProxyType(placeholders))
+            cached = _family_cache[key] = (first, template, placeholders)
+        _, template, placeholders = cached
+        families.append((template, placeholders, members))
+    return families
+
+
+def convert_all_dialects(braille_text, dialects=None):
+    """
+    把同一段點字轉成多個腔調（預設 dialect_map 全部），回傳 {腔調: 拼音}，
+    結果與逐一呼叫 convert_braille_to_pinyin 相同。無此腔調的值為 UNKNOWN_DIALECT_MESSAGE，
+    轉換失敗的值為錯誤訊息（同 convert_many），不影響其他腔調。
+    """
+    if dialects is None:
+        dialects = list(dialect_map)
+    results = {d: UNKNOWN_DIALECT_MESSAGE for d in dialects if get_dialect_tables(d) is None}
+    known = [d for d in dialects if d not in results]
+
+    families = _dialect_families(known)
+    # 原文本身含佔位字元時無法區分，改為逐一轉換
+    placeholder_end = _PLACEHOLDER_BASE + max((len(p) for _, p, _ in families), default=0)
+    if any(_PLACEHOLDER_BASE <= ord(ch) < placeholder_end for ch in set(braille_text)):
+        families = [(tables, None, [(d, tables)]) for _, _, members in families for d, tables in members]
+
+    for template, placeholders, members in families:
+        try:
+            result = []
+            _, syllable = _convert_span(braille_text, 0, len(braille_text), template, Syllable(), result)
+            if syllable.has_content():
+                result.append(syllable.assemble())
+            raw = ''.join(result)
+        except Exception as e:
+            for dialect, _ in members:
+                results[dialect] = f'⚠️ 轉換失敗：{type(e).__name__}: {e}'
             continue
+        for dialect, tables in members:
+            if placeholders is not None:
+                raw_dialect = raw.translate(
+                    {ord(ch): tables.rushio_values[k] for k, ch in placeholders.items()})
+            else:
+                raw_dialect = raw
+            results[dialect] = _postprocess_pinyin(raw_dialect)
+    return {d: results[d] for d in dialects}
+
+
+# ---------- 串流轉換 ----------
+
+STREAM_READ_SIZE = 64 * 1024
+
+# 主流程會跨越的空白：_eat_spaces 吃掉的字元
+_STREAM_SPACE_CHARS = (' ', '\u2800', '\n', '\r')
+_STREAM_SPACE_STR = ''.join(_STREAM_SPACE_CHARS)
+
+
+def _context_margins(tables):
+    """
+    回傳 (lookahead, lookback)：主流程從某位置出發，固定距離最多往後看幾個字元、往前看幾個字元
+    （不含跳過空白的掃描）。往後是一輪內可連續匹配的各表最長鍵長總和；
+    往前是 i-1 與 rushio/tone 結尾查表。
+    """
+    lookahead = (tables.special_trie.max_len + tables.rushio_trie.max_len
+                 + tables.consonants_trie.max_len + tables.vowels_trie.max_len
+                 + tables.tones_trie.max_len + tables.punctuation_trie.max_len + 4)
+    lookback = max(tables.rushio_max_len, tables.tones_max_len, 2) + 2
+    return lookahead, lookback
+
+
+def _iter_file_chunks(f, size=STREAM_READ_SIZE):
+    while True:
+        block = f.read(size)
+        if not block:
+            return
+        yield block
+
+
+def _whitespace_is_inert(tables):
+    """
+    點字表中沒有任何鍵含空白字元時，主流程在空白上只會走 fallback（收束音節後原字輸出），
+    不會往後看；串流轉換才能直接轉換到空白串裡面，不必等空白串結束。
+    """
+    for mapping in (tables.special_cases, tables.rushio, tables.consonants, tables.vowels,
+                    tables.tones, tables.punctuations):
+        for key in mapping:
+            if any(ch in key for ch in _STREAM_SPACE_CHARS):
+                return False
+    return True
+
 
-        # ★ (B) 兼容你原有「某些前綴形標點」的特殊判斷（多數情形會被 (A) 提早處理）
-        sp_len, sp_match = match_from_dict(braille_text, i, special_punctuations_allow_prefix)
-        if sp_len > 0:
-            # 若後面第一個非空白是 tone，視為拼音，不當標點
-            next_char = _peek_nonspace(braille_text, i + sp_len)
-            if next_char in tones:
-                pass
+def _trailing_space_run(text):
+    # 回傳 (結尾空白串的起點, 空白串中是否有 ' ' 以外的字元)
+    body = len(text.rstrip(_STREAM_SPACE_STR))
+    return body, text[body:].strip(' ') != ''
+
+
+def _is_plain_output_char(ch):
+    return ch not in '_，；\u2800' and not ch.isspace()
+
+
+# 片段拆成「連續空白」與「同一字元的連續串」
+_RUN_PART_RE = re.compile(r'(\s+)|((.)\3*)', re.S)
+_NON_PLAIN_PREFIX_RE = re.compile(r'[_，；\s\u2800]*')
+
+
+class _StreamingPostprocess:
+    """
+    後處理的串流版本：feed() 送入主流程的輸出片段，產生可以定稿的結果片段，
+    全部串接後與 _postprocess_pinyin 整段處理相同。
+    後處理的規則只作用在底線/「，；」/空白/點字空格組成的片段上，片段前後是一般字元時
+    結果與前後文無關，所以兩個一般字元之間的部分直接交給 _postprocess_pinyin；
+    只有結尾還沒結束的片段逐字處理。四道規則中只有「底線後是否接字母」與
+    「空白後是否接『，』」需要看後面，所以只保留最後一個底線與還沒決定去留的空白
+    （同一字元的長串以 [字元, 個數] 記錄），再長的空行、空白串也只佔固定記憶體。
+    """
+    __slots__ = ('_open', '_prev_pause', '_underscore', '_underscore_after_pause',
+                 '_after_pause', '_after_comma', '_held', '_out')
+
+    def __init__(self):
+        self._open = False
+        self._prev_pause = False
+        self._underscore = False
+        self._underscore_after_pause = False
+        self._after_pause = False
+        self._after_comma = False
+        self._held = []
+        self._out = []
+
+    def feed(self, raw_pinyin):
+        start = 0
+        if self._open:
+            end = _NON_PLAIN_PREFIX_RE.match(raw_pinyin).end()
+            self._feed_run(raw_pinyin[:end])
+            if end == len(raw_pinyin):
+                return self._drain()
+            next_ch = raw_pinyin[end]
+            self._close(next_ch.isascii() and next_ch.isalpha())
+            start = end
+
+        p = len(raw_pinyin)
+        while p > start and not _is_plain_output_char(raw_pinyin[p - 1]):
+            p -= 1
+        if p > start:
+            self._out.append(_postprocess_pinyin(raw_pinyin[start:p]))
+        if p < len(raw_pinyin):
+            self._open = True
+            self._feed_run(raw_pinyin[p:])
+        return self._drain()
+
+    def feed_repeat(self, ch, count):
+        """送入 count 個相同的非一般字元（例如壓縮掉的空白）。"""
+        self._open = True
+        self._raw(ch, count)
+        return self._drain()
+
+    def finish(self):
+        if self._open:
+            self._close(False)
+        return self._drain()
+
+    # 以下依序對應四道規則：底線（_raw、_close）、「，；」後的空白（_pause）、「，」前後的空白（_comma）
+
+    def _feed_run(self, run):
+        for m in _RUN_PART_RE.finditer(run):
+            if m.group(1):
+                self._spaces(m.group(1))
             else:
-                # 同樣檢查脈絡；不合規就不當標點
-                _plen, _pm = _match_punctuation_with_context(
-                    braille_text, i, punctuation_keys, tones_keys, rushio_keys,
-                    current_syllable, punctuations,
-                    opening_braille_set, closing_braille_set
-                )
-                if _plen > 0 and _pm == sp_match:
-                    # 是標點
-                    if _has_syllable_content(current_syllable):
-                        result.append(assemble_syllable(current_syllable))
-                        current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-                    result.append(punctuations[sp_match])
-                    i += sp_len
-                    if result and result[-1] == '；':
-                        i += _eat_spaces(braille_text, i)
-                    continue
-
-        # (C) 拼音區塊開始：鼻化 ⠠
-        if braille_text[i] == '⠠':
-            if not _has_syllable_content(current_syllable):
-                current_syllable["nasal"] = True
-                i += 1
+                self._raw(m.group(3), m.end() - m.start())
+
+    def _spaces(self, text):
+        # 一段連續空白（不含點字空格），與逐字交給 _raw 的結果相同
+        self._underscore = False
+        self._prev_pause = False
+        if self._after_pause:
+            text = text.lstrip(' ')
+            if not text:
+                return
+            self._after_pause = False
+        if not self._after_comma:
+            self._hold(text)
+
+    def _raw(self, ch, count):
+        if ch == '_':
+            # 底線後面還是底線：前一個底線直接移除；只有最後一個底線可能轉成空白
+            self._underscore_after_pause = self._prev_pause and not self._underscore and count == 1
+            self._underscore = True
+            self._prev_pause = False
+            return
+        self._underscore = False
+        self._pause(ch, count)
+        self._prev_pause = ch in '，；'
+
+    def _close(self, next_is_letter):
+        # 片段結束，下一個字元是一般字元（或文件結尾）
+        if self._underscore and next_is_letter and not self._underscore_after_pause:
+            self._pause(' ', 1)
+        self._underscore = False
+        self._flush_held()
+        self._open = self._prev_pause = self._after_pause = self._after_comma = False
+
+    def _pause(self, ch, count):
+        if self._after_pause and ch in ' \u2800':
+            return
+        self._after_pause = ch in '，；'
+        self._comma(ch, count)
+
+    def _comma(self, ch, count):
+        if ch.isspace():
+            if not self._after_comma:
+                self._hold_repeat(ch, count)
+            return
+        if ch == '，':
+            self._held.clear()
+            self._after_comma = True
+        else:
+            self._flush_held()
+            self._after_comma = False
+        self._out.append((ch, count))
+
+    def _hold(self, text):
+        # 還沒決定去留的空白：同一字元的長串記成 [字元, 個數]，其他串成不超過 STREAM_READ_SIZE 的字串
+        if len(text) > 64 and text.count(text[0]) == len(text):
+            self._hold_repeat(text[0], len(text))
+            return
+        held = self._held
+        if held and isinstance(held[-1], str) and len(held[-1]) < STREAM_READ_SIZE:
+            held[-1] += text
+        else:
+            held.append(text)
+
+    def _hold_repeat(self, ch, count):
+        if count <= 64:
+            self._hold(ch * count)
+            return
+        held = self._held
+        if held and not isinstance(held[-1], str) and held[-1][0] == ch:
+            held[-1][1] += count
+        else:
+            held.append([ch, count])
+
+    def _flush_held(self):
+        self._out.extend(self._held)
+        self._held.clear()
+
+    def _drain(self):
+        # 產生輸出片段：一般字串合併輸出，重複字元分段展開，不一次配置整串
+        out = self._out
+        self._out = []
+        text = []
+        for piece in out:
+            if isinstance(piece, str):
+                text.append(piece)
                 continue
+            ch, count = piece
+            if count <= 64:
+                text.append(ch * count)
+                continue
+            if text:
+                yield ''.join(text)
+                text = []
+            while count > 0:
+                step = min(count, STREAM_READ_SIZE)
+                yield ch * step
+                count -= step
+        if text:
+            joined = ''.join(text)
+            if joined:
+                yield joined
+
+
+class _StreamConverter:
+    """
+    convert_stream 的狀態：未轉換的尾段 buf、主流程位置 pos、組裝中的音節與後處理。
+    往後看只有兩種：固定距離（各表最長鍵長的總和以內）與跳過空白的掃描
+    （peek_nonspace 跳過 ' '，「；」後的 _eat_spaces 跳過所有空白），
+    所以一般情況轉換到 buf 中最後一個非空白字元之前 lookahead 的位置。
+    結尾的空白串另外處理，每段輸入只花 O(段長)：
+      - 空白串中有換行或點字空格、且長度超過 lookahead：往前的掃描都停在空白串內，可以整段轉換；
+        主流程在空白上只會原字輸出，若被「；」後的空白吃到 buf 結尾，之後的空白繼續吃掉（eating）。
+      - 空白串全是 ' '：只保留前 lookahead 個，其餘記在 held_spaces；空白串結束時，
+        主流程從空白串之前轉換到空白串開頭（往後看的結果與完整空白串相同），
+        停在開頭就代表這些空白會原字輸出，否則已被「；」後的空白吃掉。
+    """
+    __slots__ = ('tables', 'lookahead', 'lookback', 'inert', 'buf', 'pos', 'ws', 'has_break',
+                 'held_spaces', 'held_at', 'eating', 'syllable', 'post')
+
+    def __init__(self, tables):
+        self.tables = tables
+        self.lookahead, self.lookback = _context_margins(tables)
+        self.inert = _whitespace_is_inert(tables)
+        self.buf = ''
+        self.pos = 0
+        self.ws = 0              # buf[ws:] 是結尾的空白串
+        self.has_break = False   # 結尾空白串中有 ' ' 以外的字元
+        self.held_spaces = 0     # 接在 buf 之後、壓縮掉的 ' ' 個數
+        self.held_at = 0         # 壓縮的空白串在 buf 中的起點
+        self.eating = False
+        self.syllable = Syllable()
+        self.post = _StreamingPostprocess()
+
+    def feed(self, chunk):
+        if self.eating:
+            # 主流程停在 buf 結尾；被吃掉的空白仍留在 buf（回看要用），位置直接跳過
+            eaten = _eat_spaces(chunk, 0)
+            self._append(chunk)
+            self.pos += eaten
+            if eaten == len(chunk):
+                self._trim()
+                return
+            self.eating = False
+        elif self.held_spaces:
+            spaces = len(chunk) - len(chunk.lstrip(' '))
+            self.held_spaces += spaces
+            if spaces == len(chunk):
+                return
+            self._append(chunk[spaces:])
+            yield from self._release_spaces()
+            if self.eating:
+                self._trim()
+                return
+        else:
+            self._append(chunk)
+        yield from self._advance()
+
+    def finish(self):
+        if self.held_spaces:
+            yield from self._release_spaces()
+        result = []
+        if self.pos < len(self.buf):
+            self.pos, self.syllable = _convert_span(self.buf, self.pos, len(self.buf), self.tables,
+                                                    self.syllable, result)
+        if self.syllable.has_content():
+            result.append(self.syllable.assemble())
+        yield from self.post.feed(''.join(result))
+        yield from self.post.finish()
+
+    def _append(self, chunk):
+        start = len(self.buf)
+        self.buf += chunk
+        body, has_break = _trailing_space_run(chunk)
+        if body:
+            self.ws = start + body
+            self.has_break = has_break
+        else:
+            self.has_break = self.has_break or has_break
+
+    def _convert_to(self, stop):
+        result = []
+        self.pos, self.syllable = _convert_span(self.buf, self.pos, stop, self.tables, self.syllable, result)
+        if result:
+            yield from self.post.feed(''.join(result))
+
+    def _advance(self):
+        n = len(self.buf)
+        run = n - self.ws
+        if self.inert and run and self.pos >= self.ws:
+            stop = n
+        elif self.inert and self.has_break and run >= self.lookahead:
+            # 留最後一個字元：停在 n 之後就代表被「；」後的空白吃到了結尾
+            stop = n - 1
+        else:
+            stop = self.ws - self.lookahead
+        if self.pos < stop:
+            yield from self._convert_to(stop)
+            if self.pos > stop and self.pos == n:
+                self.eating = True
+        self._trim()
+        if (self.inert and not self.has_break and self.pos < self.ws
+                and len(self.buf) - self.ws > self.lookahead):
+            keep = self.ws + self.lookahead
+            self.held_spaces = len(self.buf) - keep
+            self.held_at = self.ws
+            self.buf = self.buf[:keep]
+
+    def _release_spaces(self):
+        # buf 已接上空白串之後的內容；主流程停在空白串開頭時，空白之前的音節先收束，空白原字輸出
+        yield from self._convert_to(self.held_at)
+        if self.pos == self.held_at:
+            if self.syllable.has_content():
+                yield from self.post.feed(self.syllable.assemble())
+                self.syllable.reset()
+            yield from self.post.feed_repeat(' ', self.held_spaces)
+        elif self.pos == len(self.buf):
+            self.eating = True
+        self.held_spaces = 0
+
+    def _trim(self):
+        """
+        丟掉 pos 之前已轉換完、之後不會再被回看的部分。
+        回看只有兩種：固定 lookback 字元內（i-1、rushio/tone 結尾查表），
+        以及 prev_nonspace 跳過 ASCII 空白找上一個字元；
+        後者中間連續的空白可以壓縮掉，記憶體不會隨空白長度成長。
+        """
+        buf = self.buf
+        cut = self.pos - self.lookback
+        if cut <= 0:
+            return
+        j = self.pos - 1
+        while j >= 0 and buf[j] == ' ':
+            j -= 1
+        if j < 0 or j >= cut:
+            self.buf = buf[cut:]
+            shift = cut
+        else:
+            self.buf = buf[j] + buf[cut:]
+            shift = cut - 1
+        self.pos -= shift
+        if self.ws >= cut:
+            self.ws -= shift
+        else:
+            self.ws, self.has_break = _trailing_space_run(self.buf)
 
-        # (D) 特殊 er 音節
-        if (
-            braille_text[i] == '⠗' and
-            (i == 0 or braille_text[i - 1] == ' ') and
-            (i + 1 < length and braille_text[i + 1] in tones) and
-            (i + 2 == length or braille_text[i + 2] == ' ')
-        ):
-            current_syllable["vowel"] = "er"
-            current_syllable["tone"] = tones[braille_text[i + 1]]
-            result.append(assemble_syllable(current_syllable))
-            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            i += 2
-            continue
 
-        # (E) 特殊字
-        special_len, special_match = match_from_dict(braille_text, i, special_keys)
-        if special_len > 0:
-            current_syllable["vowel"] = special_cases[special_match]
-            i += special_len
+def convert_stream(chunks, dialect):
+    """
+    串流轉換：chunks 為文字片段的 iterable（str 或 UTF-8 bytes），或可 read() 的檔案物件；
+    逐步產生轉換後的拼音片段，''.join() 後與 convert_braille_to_pinyin 整份轉換完全相同。
+    只保留未轉換的尾段與少量前文，記憶體不隨文件長度成長；長串空白（例如大量空行）也一樣，
+    每段輸入的處理時間只與段長有關。
+    """
+    tables = get_dialect_tables(dialect)
+    if tables is None:
+        yield UNKNOWN_DIALECT_MESSAGE
+        return
+
+    converter = _StreamConverter(tables)
+    for chunk in iter_text_chunks(chunks):
+        yield from converter.feed(chunk)
+    yield from converter.finish()
 
-            if i < length:
-                tone_len, tone_match = match_from_dict(braille_text, i, tones_keys)
-                if tone_len > 0:
-                    current_syllable["tone"] = tones[tone_match]
-                    i += tone_len
-
-                    # 標點檢查（允許尾隨空白）
-                    if i < length:
-                        p_len, p_match = match_from_dict(braille_text, i, punctuation_keys, allow_trailing_space=True)
-                        if p_len > 0 and p_match is not None:
-                            result.append(assemble_syllable(current_syllable))
-                            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-
-                            # ⠦ 特例
-                            prev_char = _prev_nonspace(braille_text, i)
-                            next_char = _peek_nonspace(braille_text, i + p_len)
-                            if p_match == '⠦':
-                                if prev_char in tones:
-                                    result.append('？')
-                                elif not next_char or (next_char not in tones and next_char != ' '):
-                                    result.append('「')
-                                else:
-                                    result.append('？')
-                            else:
-                                result.append(punctuations[p_match])
-
-                            i += p_len
-                            if result and result[-1] == '；':
-                                i += _eat_spaces(braille_text, i)
-                            continue
 
-            result.append(assemble_syllable(current_syllable))
-            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            continue
+def iter_text_chunks(chunks):
+    """
+    把 convert_stream 接受的輸入（str 或 UTF-8 bytes 片段的 iterable、可 read() 的檔案物件）
+    逐段轉成非空的 str；跨片段的多位元組字元會接起來，不合法的 UTF-8 拋出 UnicodeDecodeError。
+    """
+    if hasattr(chunks, 'read'):
+        chunks = _iter_file_chunks(chunks)
+    decoder = None
+    for chunk in chunks:
+        if isinstance(chunk, (bytes, bytearray)):
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        if chunk:
+            yield chunk
+    if decoder is not None:
+        chunk = decoder.decode(b'', final=True)
+        if chunk:
+            yield chunk
 
-        # (F) 腔調 rushio
-        rushio_len, rushio_match = match_from_dict(braille_text, i, rushio_keys)
-        if rushio_len > 0:
-            rushio_value = get_rushio_value(rushio_match, dialect, rushio)
-            if rushio_value:
-                current_syllable["rushio"] = rushio_value
-                i += rushio_len
-
-                # 標點 or 下一音節
-                if i < length:
-                    # 依脈絡判定是否標點
-                    p_len, p_match = _match_punctuation_with_context(
-                        braille_text, i, punctuation_keys, tones_keys, rushio_keys,
-                        current_syllable, punctuations,
-                        opening_braille_set, closing_braille_set
-                    )
-                    if p_len > 0:
-                        result.append(assemble_syllable(current_syllable))
-                        current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-
-                        # ⠦ 特例
-                        prev_char = _prev_nonspace(braille_text, i)
-                        next_char = _peek_nonspace(braille_text, i + p_len)
-                        if p_match == '⠦':
-                            if prev_char in tones:
-                                result.append('？')
-                            elif not next_char or (next_char not in tones and next_char != ' '):
-                                result.append('「')
-                            else:
-                                result.append('？')
-                        else:
-                            result.append(punctuations[p_match])
-
-                        i += p_len
-                        continue
 
-                # 預設：結束音節
-                result.append(assemble_syllable(current_syllable))
-                current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            continue
+# ---------- 多核心平行轉換 ----------
 
-        # (G) 子音 consonants
-        cons_len, cons_match = match_from_dict(braille_text, i, consonants_keys)
-        if cons_len > 0:
-            # ★ '⠆' 作為子音 bb 的嚴格條件：
-            #    1) 必須在音節起始（current_syllable 目前不能有內容）
-            #    2) 而且 '⠆' 後面「馬上」要能匹配到一個母音鍵（否則交給 tone/標點處理）
-            if cons_match == '⠆':
-                if not _has_syllable_content(current_syllable):
-                    next_is_vowel = False
-                    if i + cons_len < length:
-                        vlen, _ = match_from_dict(braille_text, i + cons_len, vowels_keys)
-                        next_is_vowel = vlen > 0
-                    if next_is_vowel:
-                        current_syllable["initial"] = consonants[cons_match]
-                        i += cons_len
-                        continue
-                # 其他情況：不要當 bb，讓後續 (H)/(I)/(A) 去判斷（tone 或 標點）
+PARALLEL_SEGMENT_CHARS = 256 * 1024
+
+
+def _parallel_boundaries(text, segment_chars):
+    """
+    找出可以切開平行轉換的位置：換行 '\n' 之後、且下一個字元不是空白。
+    主流程遇到換行一定先收束音節，再原字輸出換行並前進一格；
+    唯一會跨過換行的是「；」後的 _eat_spaces，而它正好停在第一個非空白字元。
+    所以循序轉換必定恰好停在這個位置，且音節內容是空的；唯一可能留下的是
+    鼻化 ⠠ 的 nasal 旗標（它不算音節內容，不會被收束），由 convert_parallel 接回時補正。
+    往前的脈絡查詢（prev_nonspace 等）也會被換行擋下，不會讀到上一段之前。
+    回傳遞增的位置列表，首尾為 0 與 len(text)。
+    """
+    n = len(text)
+    bounds = [0]
+    pos = segment_chars
+    while pos < n:
+        k = text.find('\n', pos)
+        while k != -1 and k + 1 < n and text[k + 1] in _STREAM_SPACE_CHARS:
+            k = text.find('\n', k + 1)
+        if k == -1 or k + 1 >= n:
+            break
+        bounds.append(k + 1)
+        pos = k + 1 + segment_chars
+    bounds.append(n)
+    return bounds
+
+
+def _convert_segment(args):
+    # 在 worker 內轉換 window[start:stop]；window 含前後脈絡，nasal 為段首的鼻化旗標。
+    # 回傳 (未後處理的拼音, 段尾是否留下鼻化旗標)
+    window, start, stop, dialect, nasal = args
+    tables = get_dialect_tables(dialect)
+    current_syllable = Syllable()
+    current_syllable.nasal = nasal
+    result = []
+    _, current_syllable = _convert_span(window, start, stop, tables, current_syllable, result)
+    if current_syllable.has_content():
+        result.append(current_syllable.assemble())
+        return ''.join(result), False
+    return ''.join(result), current_syllable.nasal
+
+
+def convert_parallel(braille_text, dialect, workers=None,
+                     segment_chars=PARALLEL_SEGMENT_CHARS, executor=None):
+    """
+    多核心轉換：在換行處把長文件切段，交給 process pool 轉換後依序接回，
+    結果與 convert_braille_to_pinyin 完全相同。
+    workers 為 worker 數（預設 CPU 核心數）；也可傳入既有的 executor 重複使用。
+    文件太短、只切得出一段或 workers <= 1 時直接循序轉換。
+    """
+    tables = get_dialect_tables(dialect)
+    if tables is None:
+        return UNKNOWN_DIALECT_MESSAGE
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    bounds = _parallel_boundaries(braille_text, segment_chars)
+    # 換行處可切開的前提是沒有任何鍵含換行（見 _parallel_boundaries）
+    newline_in_keys = any(
+        '\n' in k
+        for keys in (tables.special_keys, tables.consonants_keys, tables.vowels_keys,
+                     tables.rushio_keys, tables.tones_keys, tables.punctuation_keys)
+        for k in keys
+    )
+    if len(bounds) <= 2 or (workers <= 1 and executor is None) or newline_in_keys:
+        return _convert_with_tables(braille_text, tables)
+
+    lookahead, lookback = _context_margins(tables)
+    n = len(braille_text)
+    jobs = []
+    for a, b in zip(bounds, bounds[1:]):
+        left = max(0, a - lookback)
+        right = min(n, b + lookahead)
+        jobs.append((braille_text[left:right], a - left, b - left, dialect, False))
+
+    if executor is not None:
+        converted = list(executor.map(_convert_segment, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            converted = list(pool.map(_convert_segment, jobs))
+
+    # 各段都假設段首沒有鼻化旗標；上一段結尾留下 ⠠ 時（少見），該段在此重轉
+    pieces = []
+    carry_nasal = False
+    for job, (raw, nasal_after) in zip(jobs, converted):
+        if carry_nasal:
+            raw, nasal_after = _convert_segment(job[:4] + (True,))
+        pieces.append(raw)
+        carry_nasal = nasal_after
+
+    # 後處理的「，」前後空白規則可能跨越換行，所以接回後整份只做一次
+    return _postprocess_pinyin(''.join(pieces))
+
+
+# ---------- 增量轉換（即時編輯） ----------
+
+INCREMENTAL_SEGMENT_CHARS = 2000
+
+
+def _postprocess_safe_join(left_raw, right_raw):
+    """
+    兩段未後處理的拼音接在一起時，能否各自後處理再相接（結果與整段一起處理相同）。
+    需清理的片段都從「_，；」開始；左段去掉結尾空白後是一般字元、右段開頭也是一般字元時，
+    沒有片段會跨過接縫，「，」前去空白也不會吃到左段。
+    """
+    left = left_raw.rstrip()
+    return bool(left) and _is_plain_output_char(left[-1]) and _is_plain_output_char(right_raw[:1] or '_')
+
+
+class IncrementalDocument:
+    """
+    即時編輯用的增量轉換：保留整份點字與每段的轉換結果，
+    套用一次編輯（offset, deleted, inserted）時只重轉受影響的段落，回傳輸出的差異。
+
+    分段點與 convert_parallel 相同（換行之後、下一個字元不是空白），段首音節必定是空的，
+    只需接上前一段留下的鼻化旗標；重轉到旗標與舊值一致就停。
+    後處理以「單元」為單位：相鄰兩段的接縫不安全（見 _postprocess_safe_join）時併成同一單元，
+    輸出存在單元的第一段，其餘段為 None。
+    """
+
+    def __init__(self, braille_text, dialect, segment_chars=INCREMENTAL_SEGMENT_CHARS):
+        tables = get_dialect_tables(dialect)
+        if tables is None:
+            raise ValueError(UNKNOWN_DIALECT_MESSAGE)
+        self.dialect = dialect
+        self.tables = tables
+        self.revision = 0
+        self._lookahead, self._lookback = _context_margins(tables)
+        newline_in_keys = any(
+            '\n' in k
+            for keys in (tables.special_keys, tables.consonants_keys, tables.vowels_keys,
+                         tables.rushio_keys, tables.tones_keys, tables.punctuation_keys)
+            for k in keys
+        )
+        # 有鍵含換行時無法切段，整份視為一段
+        self.segment_chars = float('inf') if newline_in_keys else segment_chars
+
+        self.text = braille_text
+        starts, raws, nasals, _ = self._convert_region(braille_text, 0, len(braille_text), False)
+        self._starts, self._raws, self._nasals = starts, raws, nasals
+        self._outs = self._postprocess_units(raws)
+
+    @property
+    def output(self):
+        return ''.join(out for out in self._outs if out)
+
+    def __len__(self):
+        return len(self.text)
+
+    def _convert_region(self, text, start, stop, nasal):
+        # 在 text[start:stop] 重新找分段點並逐段轉換；回傳 (段首位置, 拼音, 段尾鼻化旗標, 最後的旗標)
+        bounds = _parallel_boundaries(text[start:stop], self.segment_chars)
+        starts, raws, nasals = [], [], []
+        for a, b in zip(bounds, bounds[1:]):
+            raw, nasal = self._convert_one(text, start + a, start + b, nasal)
+            starts.append(start + a)
+            raws.append(raw)
+            nasals.append(nasal)
+        return starts, raws, nasals, nasal
+
+    def _convert_one(self, text, a, b, nasal):
+        syllable = Syllable()
+        syllable.nasal = nasal
+        result = []
+        left = max(0, a - self._lookback)
+        window = text[left:min(len(text), b + self._lookahead)]
+        _, syllable = _convert_span(window, a - left, b - left, self.tables, syllable, result)
+        if syllable.has_content():
+            result.append(syllable.assemble())
+            return ''.join(result), False
+        return ''.join(result), syllable.nasal
+
+    @staticmethod
+    def _postprocess_units(raws):
+        outs = []
+        start = 0
+        for j in range(1, len(raws) + 1):
+            if j == len(raws) or _postprocess_safe_join(raws[j - 1], raws[j]):
+                outs.append(_postprocess_pinyin(''.join(raws[start:j])))
+                outs.extend([None] * (j - start - 1))
+                start = j
+        return outs
+
+    def apply_edit(self, offset, deleted, inserted):
+        """
+        把 text[offset:offset + deleted] 換成 inserted，回傳輸出的差異
+        {"offset", "deleted", "inserted"}（位置為舊輸出中的字元位置）。
+        轉換失敗時拋出例外，文件維持原狀。
+        """
+        old_text = self.text
+        if not isinstance(inserted, str):
+            raise TypeError('inserted 必須是字串')
+        if not (0 <= offset <= len(old_text) and 0 <= deleted <= len(old_text) - offset):
+            raise ValueError('編輯範圍超出文件')
+
+        new_text = old_text[:offset] + inserted + old_text[offset + deleted:]
+        delta = len(inserted) - deleted
+        starts, raws, nasals, outs = self._starts, self._raws, self._nasals, self._outs
+        count = len(starts)
+
+        # 轉換時會讀到 [段首 - lookback, 段尾 + lookahead) 的段落，都要重轉
+        first = max(0, bisect_left(starts, offset - self._lookahead) - 1)
+        last = max(first, bisect_right(starts, offset + deleted + self._lookback) - 1)
+        region_end = starts[last + 1] + delta if last + 1 < count else len(new_text)
+        new_starts, new_raws, new_nasals, carry = self._convert_region(
+            new_text, starts[first], region_end, nasals[first - 1] if first else False)
+
+        # 後面的段落文字沒變，但段首的鼻化旗標變了就得接著重轉
+        while last + 1 < count and carry != nasals[last]:
+            last += 1
+            b = starts[last + 1] + delta if last + 1 < count else len(new_text)
+            raw, carry = self._convert_one(new_text, starts[last] + delta, b, carry)
+            new_starts.append(starts[last] + delta)
+            new_raws.append(raw)
+            new_nasals.append(carry)
+
+        # 合併後的段落：[0, first) 與 [new_end, ...) 沒變，分別對應舊索引 j 與 j - new_end + tail
+        tail = last + 1
+        merged = raws[:first] + new_raws + raws[tail:]
+        new_end = first + len(new_raws)
+
+        # 要重做後處理的單元範圍 [lo, hi)：接縫要在新的拼音上安全，而且在舊輸出裡也是單元起點
+        lo = first
+        if lo > 0 and not (_postprocess_safe_join(merged[lo - 1], merged[lo]) and outs[lo] is not None):
+            lo -= 1
+            while lo > 0 and outs[lo] is None:
+                lo -= 1
+        hi = new_end
+        if hi < len(merged) and not (_postprocess_safe_join(merged[hi - 1], merged[hi])
+                                     and outs[tail] is not None):
+            hi += 1
+            while hi < len(merged) and outs[hi - new_end + tail] is None:
+                hi += 1
+        old_lo, old_hi = lo, hi - new_end + tail
+
+        unit_outs = self._postprocess_units(merged[lo:hi])
+        old_piece = ''.join(out for out in outs[old_lo:old_hi] if out)
+        new_piece = ''.join(out for out in unit_outs if out)
+        out_offset = sum(len(out) for out in outs[:old_lo] if out)
+
+        self.text = new_text
+        self._starts = starts[:first] + new_starts + [s + delta for s in starts[tail:]]
+        self._raws = merged
+        self._nasals = nasals[:first] + new_nasals + nasals[tail:]
+        self._outs = outs[:old_lo] + unit_outs + outs[old_hi:]
+        self.revision += 1
+
+        # 去掉前後相同的部分，只回傳真正改變的範圍
+        p = 0
+        limit = min(len(old_piece), len(new_piece))
+        while p < limit and old_piece[p] == new_piece[p]:
+            p += 1
+        s = 0
+        while s < limit - p and old_piece[-1 - s] == new_piece[-1 - s]:
+            s += 1
+        return {
+            'offset': out_offset + p,
+            'deleted': len(old_piece) - p - s,
+            'inserted': new_piece[p:len(new_piece) - s],
+        }
+
+
+def _convert_with_tables(braille_text, tables):
+    result = []
+    _, current_syllable = _convert_span(
+        braille_text, 0, len(braille_text), tables, Syllable(), result
+    )
+
+    # 收尾：若有殘留音節
+    if current_syllable.has_content():
+        result.append(current_syllable.assemble())
+
+    return _postprocess_pinyin(''.join(result))
+
+
+# ---------- 轉換引擎：規則表 + 首字分派 ----------
+#
+# 主流程原本在每個位置依序嘗試 (A)～(J) 各分支。現在每條規則宣告「可能由哪些首字觸發」，
+# 編譯時依點字表算出每個首字要嘗試的規則（保持原本順序），每個位置只查一次分派表，
+# 不可能匹配的分支直接略過。規則函式回傳下一個位置；不適用則回傳 None，交給下一條規則。
+# 新增規則：寫一個規則函式，並在 _RULES 的適當順序加入 (名稱, 觸發字元, 函式)。
+
+_BREAK_BEFORE_OPEN = (' ', '\u2800', '\n', '\r')
+_II_AFTER = ('⠵', '⠉', '⠎')
+
+
+class _Run:
+    """單次轉換的狀態：文字、脈絡索引、組裝中的音節與輸出片段。"""
+    __slots__ = ('text', 'length', 'tables', 'index', 'syllable', 'result')
+
+    def __init__(self, text, tables, syllable, result):
+        self.text = text
+        self.length = len(text)
+        self.tables = tables
+        self.index = TextIndex(text, tables)
+        self.syllable = syllable
+        self.result = result
+
+    def flush(self):
+        # 若有組裝中的音節，先輸出並清空
+        syllable = self.syllable
+        if syllable.has_content():
+            self.result.append(syllable.assemble())
+            syllable.reset()
+
+    def finish_syllable(self):
+        self.result.append(self.syllable.assemble())
+        self.syllable.reset()
+
+    def emit_punctuation(self, key, i, key_len, eat_after_semicolon=True):
+        """
+        輸出位置 i 的標點鍵並回傳下一個位置。
+        ⠦ 依前後文決定是「？」或「「」；「；」之後的空白一併吃掉（rushio 後的標點除外）。
+        """
+        if key == '⠦':
+            tones = self.tables.tones
+            if self.index.prev_nonspace(i) in tones:
+                mark = '？'
             else:
-                if not _has_syllable_content(current_syllable):
-                    current_syllable["initial"] = consonants[cons_match]
-                    i += cons_len
-                    continue
+                next_char = self.index.peek_nonspace(i + key_len)
+                if not next_char or (next_char not in tones and next_char != ' '):
+                    mark = '「'
+                else:
+                    mark = '？'
+        else:
+            mark = self.tables.punctuations[key]
+        self.result.append(mark)
+        i += key_len
+        if eat_after_semicolon and mark == '；':
+            i += _eat_spaces(self.text, i)
+        return i
+
+    def context_punctuation(self, i):
+        return _match_punctuation_with_context(self.text, i, self.tables, self.syllable, self.index)
 
-        # (H) 母音 vowels
-        vowel_len, vowel_match = match_from_dict(braille_text, i, vowels_keys)
+
+def _rule_open_bracket(run, i):
+    # ★ 高優先級：句首 / 空白 / 點字空白 / 換行 後的「開括號」一定當標點：『(⠠⠦)、【(⠨⠣)、（(⠐⠣)
+    if i and run.text[i - 1] not in _BREAK_BEFORE_OPEN:
+        return None
+    key_len, key = _HARD_OPEN_TRIE.match(run.text, i)
+    if key is None:
+        return None
+    run.flush()
+    run.result.append(run.tables.punctuations.get(key, _HARD_OPEN_MAP[key]))
+    return i + key_len
+
+
+def _rule_close_bracket(run, i):
+    # ★ 高優先級：遇到「閉括號」鍵，直接當標點
+    key_len, key = run.tables.closing_trie.match(run.text, i)
+    if key is None:
+        return None
+    run.flush()
+    run.result.append(run.tables.punctuations[key])
+    return i + key_len
+
+
+def _rule_semicolon_bb_tone(run, i):
+    # ★★★ Tri-disambiguation for '⠆'：分號； / 子音 bb / 調號 ˇ ★★★
+    text = run.text
+    syllable = run.syllable
+    next_is_bspace = i + 1 < run.length and text[i + 1] == '\u2800'
+    prev_is_rushio_or_tone = run.index.ends_with_rushio(i) or run.index.ends_with_tone(i)
+
+    # 1) 『分號；』：前面是 rushio 或 tone，且後面是「點字空格」
+    if next_is_bspace and prev_is_rushio_or_tone:
+        run.flush()
+        run.result.append('；')
+        return i + 2  # 跳過 '⠆' + 點字空格
+
+    # 2) 『子音 bb』：僅在音節起始，且 '⠆' 後面「立刻」能匹配母音鍵
+    if not syllable.has_content():
+        vowel_len, _ = run.tables.vowels_trie.match(text, i + 1)
         if vowel_len > 0:
-            if vowel_match == '⠔':
-                prev_char = braille_text[i - 1] if i > 0 else ''
-                if prev_char in ['⠵', '⠉', '⠎']:
-                    current_syllable["vowel"] = "ii"
-                else:
-                    current_syllable["vowel"] = "ua"
-            else:
-                current_syllable["vowel"] = vowels[vowel_match]
-            i += vowel_len
+            syllable.initial = run.tables.consonants['⠆']
+            return i + 1
+        # 起始但後面不是母音 → 不當 bb，交給後續（可能是 tone 或其他）
+
+    # 3) 『調號 ˇ』：前面不是 rushio/其他 tone，且當前音節已開、尚未有 tone
+    if not prev_is_rushio_or_tone and syllable.has_content() and not syllable.tone:
+        syllable.tone = run.tables.tones['⠆']
+        return i + 1
+
+    # 以上皆非 → 交由一般流程（之後的標點/母音/子音/tone 判斷）
+    return None
+
+
+def _rule_punctuation(run, i):
+    # (A) 標點：用「脈絡判定」辨識，避免把母音/聲母誤當標點
+    key_len, key = run.context_punctuation(i)
+    if key_len == 0:
+        return None
+    run.flush()
+    return run.emit_punctuation(key, i, key_len)
+
+
+def _rule_nasal(run, i):
+    # (C) 拼音區塊開始：鼻化 ⠠
+    if run.syllable.has_content():
+        return None
+    run.syllable.nasal = True
+    return i + 1
+
+
+def _rule_er(run, i):
+    # (D) 特殊 er 音節：前後是空白（或頭尾），中間一個 tone
+    text = run.text
+    length = run.length
+    tones = run.tables.tones
+    if not (
+        (i == 0 or text[i - 1] == ' ') and
+        (i + 1 < length and text[i + 1] in tones) and
+        (i + 2 == length or text[i + 2] == ' ')
+    ):
+        return None
+    syllable = run.syllable
+    syllable.vowel = "er"
+    syllable.tone = tones[text[i + 1]]
+    run.finish_syllable()
+    return i + 2
+
+
+def _rule_special(run, i):
+    # (E) 特殊字（ziim 等），可接 tone，tone 後可接標點（允許尾隨空白）
+    tables = run.tables
+    text = run.text
+    special_len, special_key = tables.special_trie.match(text, i)
+    if special_len == 0:
+        return None
+    syllable = run.syllable
+    syllable.vowel = tables.special_cases[special_key]
+    i += special_len
+
+    if i < run.length:
+        tone_len, tone_key = tables.tones_trie.match(text, i)
+        if tone_len > 0:
+            syllable.tone = tables.tones[tone_key]
+            i += tone_len
+
+            if i < run.length:
+                p_len, p_key = tables.punctuation_trie.match(text, i, allow_trailing_space=True)
+                if p_len > 0 and p_key is not None:
+                    run.finish_syllable()
+                    return run.emit_punctuation(p_key, i, p_len)
+
+    run.finish_syllable()
+    return i
+
+
+def _rule_rushio(run, i):
+    # (F) 腔調 rushio，後面依脈絡判定是否接標點
+    tables = run.tables
+    rushio_len, rushio_key = tables.rushio_trie.match(run.text, i)
+    if rushio_len == 0:
+        return None
+    rushio_value = tables.rushio_values[rushio_key]
+    if not rushio_value:
+        return None
+    run.syllable.rushio = rushio_value
+    i += rushio_len
+
+    if i < run.length:
+        p_len, p_key = run.context_punctuation(i)
+        if p_len > 0:
+            run.finish_syllable()
+            return run.emit_punctuation(p_key, i, p_len, eat_after_semicolon=False)
+
+    # 預設：結束音節
+    run.finish_syllable()
+    return i
+
+
+def _rule_consonant(run, i):
+    # (G) 子音：只在音節起始
+    if run.syllable.has_content():
+        return None
+    tables = run.tables
+    cons_len, cons_key = tables.consonants_trie.match(run.text, i)
+    if cons_len == 0:
+        return None
+    if cons_key == '⠆':
+        # ★ '⠆' 作為子音 bb：後面「馬上」要能匹配到一個母音鍵（否則交給 tone/標點處理）
+        if i + cons_len >= run.length or tables.vowels_trie.match(run.text, i + cons_len)[0] == 0:
+            return None
+    run.syllable.initial = tables.consonants[cons_key]
+    return i + cons_len
+
+
+def _rule_vowel(run, i):
+    # (H) 母音，之後可接「子音作 rushio」（舊格式相容）、tone，tone 後可接標點
+    tables = run.tables
+    text = run.text
+    length = run.length
+    vowel_len, vowel_key = tables.vowels_trie.match(text, i)
+    if vowel_len == 0:
+        return None
+    syllable = run.syllable
+    if vowel_key == '⠔':
+        syllable.vowel = "ii" if i > 0 and text[i - 1] in _II_AFTER else "ua"
+    else:
+        syllable.vowel = tables.vowels[vowel_key]
+    i += vowel_len
+
+    if i < length:
+        final_len, final_key = tables.consonants_trie.match(text, i)
+        # ★ 禁止 '⠆' 在母音後被當成尾子音（避免吃掉真正的 tone/分號）
+        if final_len > 0 and final_key != '⠆':
+            if run.index.peek_nonspace(i + final_len) in tables.tones_key_set:
+                syllable.rushio = tables.consonants[final_key]
+                i += final_len
+
+    if i < length:
+        tone_len, tone_key = tables.tones_trie.match(text, i)
+        if tone_len > 0:
+            syllable.tone = tables.tones[tone_key]
+            i += tone_len
 
-            # 嘗試補 rushio（僅限「子音作 rushio」的舊格式相容）
-            if i < length:
-                final_cons_len, final_cons_match = match_from_dict(braille_text, i, consonants_keys)
-                if final_cons_len > 0:
-                    # ★ 重要：禁止 '⠆' 在母音後被當成尾子音（避免吃掉真正的 tone/分號）
-                    if final_cons_match != '⠆':
-                        next_ch = _peek_nonspace(braille_text, i + final_cons_len)
-                        if next_ch in tones_keys:
-                            current_syllable["rushio"] = consonants[final_cons_match]
-                            i += final_cons_len
-
-            # 補 tone
             if i < length:
-                tone_len, tone_match = match_from_dict(braille_text, i, tones_keys)
-                if tone_len > 0:
-                    current_syllable["tone"] = tones[tone_match]
-                    i += tone_len
-
-                    # tone 後若接標點（脈絡判定）
-                    if i < length:
-                        p_len, p_match = _match_punctuation_with_context(
-                            braille_text, i, punctuation_keys, tones_keys, rushio_keys,
-                            current_syllable, punctuations,
-                            opening_braille_set, closing_braille_set
-                        )
-                        if p_len > 0:
-                            result.append(assemble_syllable(current_syllable))
-                            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-
-                            # ⠦ 特例
-                            prev_char = _prev_nonspace(braille_text, i)
-                            next_char = _peek_nonspace(braille_text, i + p_len)
-                            if p_match == '⠦':
-                                if prev_char in tones:
-                                    result.append('？')
-                                elif not next_char or (next_char not in tones and next_char != ' '):
-                                    result.append('「')
-                                else:
-                                    result.append('？')
-                            else:
-                                result.append(punctuations[p_match])
-
-                            i += p_len
-                            if result and result[-1] == '；':
-                                i += _eat_spaces(braille_text, i)
-                            continue
+                p_len, p_key = run.context_punctuation(i)
+                if p_len > 0:
+                    run.finish_syllable()
+                    return run.emit_punctuation(p_key, i, p_len)
 
-            # 結束音節
-            result.append(assemble_syllable(current_syllable))
-            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            continue
+    run.finish_syllable()
+    return i
 
-        # (I) 尾音：tone 或 rushio（tones_keys 內有些鍵同時在 rushio 作對映時）
-        tail_len, tail_match = match_from_dict(braille_text, i, tones_keys)
-        if tail_len > 0:
-            if tail_match in rushio:
-                rushio_value = get_rushio_value(tail_match, dialect, rushio)
-                if rushio_value:
-                    current_syllable["rushio"] = rushio_value
-                result.append(assemble_syllable(current_syllable))
-                current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
-            else:
-                current_syllable["tone"] = tones[tail_match]
-            i += tail_len
+
+def _rule_tail(run, i):
+    # (I) 尾音：tone 或 rushio（tones 內有些鍵同時在 rushio 有對映）
+    tables = run.tables
+    tail_len, tail_key = tables.tones_trie.match(run.text, i)
+    if tail_len == 0:
+        return None
+    if tail_key in tables.rushio:
+        rushio_value = tables.rushio_values[tail_key]
+        if rushio_value:
+            run.syllable.rushio = rushio_value
+        run.finish_syllable()
+    else:
+        run.syllable.tone = tables.tones[tail_key]
+    return i + tail_len
+
+
+def _rule_fallback(run, i):
+    # (J) 無法匹配：若有正在組裝的音節，先輸出；否則試一般標點（允許尾空白），再不行原字輸出
+    if run.syllable.has_content():
+        run.finish_syllable()
+        return i
+    p_len, p_key = run.tables.punctuation_trie.match(run.text, i, allow_trailing_space=True)
+    if p_len > 0 and p_key is not None:
+        return run.emit_punctuation(p_key, i, p_len)
+    run.result.append(run.text[i])
+    return i + 1
+
+
+def _first_chars(keys):
+    return frozenset(k[0] for k in keys if k)
+
+
+# 規則依序嘗試；觸發字元為 None 表示任何字元都要試。
+# 原本的 (B)「前綴形標點」分支會以同樣參數再做一次 (A) 的脈絡判定，永遠不會成立，故不列入。
+_RULES = (
+    ('open_bracket', lambda t: _first_chars(_HARD_OPEN_MAP), _rule_open_bracket),
+    ('close_bracket', lambda t: _first_chars(t.closing_braille_set), _rule_close_bracket),
+    ('semicolon_bb_tone', lambda t: frozenset('⠆'), _rule_semicolon_bb_tone),
+    ('punctuation', lambda t: _first_chars(k.rstrip() for k in t.punctuations), _rule_punctuation),
+    ('nasal', lambda t: frozenset('⠠'), _rule_nasal),
+    ('er', lambda t: frozenset('⠗'), _rule_er),
+    ('special', lambda t: _first_chars(t.special_cases), _rule_special),
+    ('rushio', lambda t: _first_chars(t.rushio), _rule_rushio),
+    ('consonant', lambda t: _first_chars(t.consonants), _rule_consonant),
+    ('vowel', lambda t: _first_chars(t.vowels), _rule_vowel),
+    ('tail', lambda t: _first_chars(t.tones), _rule_tail),
+    ('fallback', lambda t: None, _rule_fallback),
+)
+
+
+class ConversionEngine:
+    """
+    由腔調點字表與 _RULES 編譯出的分派表：首字 → 依序要嘗試的規則函式。
+    由 get_engine() 建立並快取。
+    """
+    __slots__ = ('tables', 'dispatch', 'default_rules')
+
+    def __init__(self, tables, rules=_RULES):
+        triggers = [(trigger(tables), rule) for _name, trigger, rule in rules]
+        chars = set()
+        for trigger_chars, _ in triggers:
+            if trigger_chars is not None:
+                chars |= trigger_chars
+        self.tables = tables
+        self.default_rules = tuple(rule for trigger_chars, rule in triggers if trigger_chars is None)
+        self.dispatch = {
+            ch: tuple(rule for trigger_chars, rule in triggers if trigger_chars is None or ch in trigger_chars)
+            for ch in chars
+        }
+
+    def run(self, text, i, stop, syllable, result):
+        """
+        從位置 i 轉換到 i >= stop，輸出片段 append 到 result；回傳停下的位置。
+        前後脈絡一律查整個 text（可以是只含部分文件的視窗）。
+        """
+        run = _Run(text, self.tables, syllable, result)
+        dispatch_get = self.dispatch.get
+        default_rules = self.default_rules
+        while i < stop:
+            for rule in dispatch_get(text[i], default_rules):
+                next_i = rule(run, i)
+                if next_i is not None:
+                    i = next_i
+                    break
+        return i
+
+
+_engine_cache = {}
+
+
+def get_engine(tables):
+    engine = _engine_cache.get(tables.dialect)
+    if engine is None or engine.tables is not tables:
+        engine = _engine_cache[tables.dialect] = ConversionEngine(tables)
+    return engine
+
+
+def _convert_span(braille_text, i, stop, tables, current_syllable, result):
+    """
+    主轉換：從位置 i 開始逐段轉換，直到 i >= stop，輸出片段 append 到 result。
+    回傳 (停下的位置, 尚未收尾的音節)，供串流轉換接續。
+    """
+    if _profiler is not None:
+        return _profiler.convert_span(braille_text, i, stop, tables, current_syllable, result)
+    i = get_engine(tables).run(braille_text, i, stop, current_syllable, result)
+    return i, current_syllable
+
+
+# ---------- 效能剖析（預設關閉） ----------
+#
+# enable_profiling() 之後，轉換改用「包了計時/計數外殼」的規則表（與 get_engine 的引擎分開快取），
+# 記錄各階段耗時、每條規則 (A)～(J) 的嘗試與命中次數，以及轉換過的字元數。
+# 關閉時主流程只多一次 _profiler is None 的判斷。process pool 的 worker 內不會記錄。
+
+_profiler = None
+
+
+class _ProfileStats:
+    # 單一執行緒的累計值；各執行緒各寫各的，snapshot() 時再加總
+    __slots__ = ('stages', 'rules', 'chars')
+
+    def __init__(self):
+        self.stages = {}  # 名稱 → [次數, 秒數]
+        self.rules = {}   # 規則名稱 → [嘗試次數, 命中次數, 秒數]
+        self.chars = 0
+
+
+class ConversionProfiler:
+    """
+    轉換過程的剖析資料。snapshot() 回傳
+    {"stages": {名稱: {"count", "seconds"}}, "rules": {名稱: {"attempts", "hits", "seconds"}},
+     "chars": 字元數, "attempts_per_char": 平均每個字元嘗試的規則數}。
+    stages 包含 load_tables（建立點字表）、convert（主流程，含脈絡索引）、postprocess（輸出清理）。
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._all = []
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def _stats(self):
+        stats = getattr(self._local, 'stats', None)
+        if stats is None:
+            stats = self._local.stats = _ProfileStats()
+            with self._lock:
+                self._all.append(stats)
+        return stats
+
+    def add_stage(self, name, seconds):
+        entry = self._stats().stages.setdefault(name, [0, 0.0])
+        entry[0] += 1
+        entry[1] += seconds
+
+    def _wrap_rule(self, name, rule):
+        perf_counter = time.perf_counter
+
+        def profiled(run, i):
+            rules = self._stats().rules
+            entry = rules.get(name)
+            if entry is None:
+                entry = rules[name] = [0, 0, 0.0]
+            started = perf_counter()
+            next_i = rule(run, i)
+            entry[2] += perf_counter() - started
+            entry[0] += 1
+            if next_i is not None:
+                entry[1] += 1
+            return next_i
+        return profiled
+
+    def _engine(self, tables):
+        engine = self._engines.get(tables.dialect)
+        if engine is None or engine.tables is not tables:
+            rules = tuple((name, trigger, self._wrap_rule(name, rule)) for name, trigger, rule in _RULES)
+            engine = self._engines[tables.dialect] = ConversionEngine(tables, rules)
+        return engine
+
+    def convert_span(self, braille_text, i, stop, tables, current_syllable, result):
+        engine = self._engine(tables)
+        started = time.perf_counter()
+        end = engine.run(braille_text, i, stop, current_syllable, result)
+        self.add_stage('convert', time.perf_counter() - started)
+        self._stats().chars += max(0, end - i)
+        return end, current_syllable
+
+    def postprocess(self, raw_pinyin):
+        started = time.perf_counter()
+        cleaned = _postprocess_runs(raw_pinyin)
+        self.add_stage('postprocess', time.perf_counter() - started)
+        return cleaned
+
+    def snapshot(self):
+        stages = {}
+        rules = {name: {'attempts': 0, 'hits': 0, 'seconds': 0.0} for name, _, _ in _RULES}
+        chars = 0
+        with self._lock:
+            all_stats = list(self._all)
+        for stats in all_stats:
+            for name, (count, seconds) in list(stats.stages.items()):
+                entry = stages.setdefault(name, {'count': 0, 'seconds': 0.0})
+                entry['count'] += count
+                entry['seconds'] += seconds
+            for name, (attempts, hits, seconds) in list(stats.rules.items()):
+                entry = rules[name]
+                entry['attempts'] += attempts
+                entry['hits'] += hits
+                entry['seconds'] += seconds
+            chars += stats.chars
+        attempts = sum(entry['attempts'] for entry in rules.values())
+        return {
+            'stages': stages,
+            'rules': rules,
+            'chars': chars,
+            'attempts_per_char': attempts / chars if chars else 0.0,
+        }
+
+    def reset(self):
+        with self._lock:
+            self._all = []
+        self._local = threading.local()
+
+
+def enable_profiling(profiler=None):
+    """開始記錄剖析資料（可傳入既有的 ConversionProfiler 接續累計），回傳使用中的 profiler。"""
+    global _profiler
+    _profiler = profiler or ConversionProfiler()
+    return _profiler
+
+
+def disable_profiling():
+    global _profiler
+    _profiler = None
+
+
+def get_profiler():
+    """目前使用中的 ConversionProfiler；未啟用時為 None。"""
+    return _profiler
+
+
+# ---------- 轉換診斷（預設關閉） ----------
+#
+# convert_with_diagnostics() 在轉換的同時記錄每個輸出音節/標點來自輸入的哪一段、由哪條規則產生、
+# 落在輸出的哪一段，以及 (J) 無法匹配而原樣輸出的字元。記錄只發生在另外的 _DiagnosticRun 與迴圈內，
+# 一般轉換的主流程不受影響。結果以 array 存放，每個 span 固定 5 個整數（見 SPAN_FIELDS）。
+
+SPAN_FIELDS = ('input_start', 'input_end', 'output_start', 'output_end', 'rule')
+DIAGNOSTIC_RULES = tuple(name for name, _, _ in _RULES)
+_RULE_INDEX = {rule: k for k, (_, _, rule) in enumerate(_RULES)}
+_NOT_UNMATCHED = frozenset(' \u2800\n\r\t')
+
+# 後處理只會刪除或改寫底線與空白類字元（以下稱「間隔」），其餘字元（「實字」）原樣保留，
+# 而一段間隔改寫成什麼，只看間隔本身與前後兩個實字。所以輸出位置可以在輸出片段時直接往前推算：
+# 片段的實字區塊在輸出中的長度固定，之前累積的間隔長度則由「前一個實字的類別 + 間隔 + 片段」決定。
+# 推算狀態是目前的位置（前一個實字之後）與「脈絡」：前一個實字的類別，接上之後尚未決定長度的間隔。
+# 迴圈內拿的是該脈絡的 _PieceLayouts 本身，每個片段只需查一次 dict。
+# 很長的間隔（例如整段換行）不逐字串接進脈絡，而是縮短成等效的短脈絡（見 _shorten_context）。
+_PIECE_PARTS_RE = re.compile(r'([_\s\u2800]*)(.*?)([_\s\u2800]*)', re.DOTALL)
+_CONTEXT_MAX = 16
+_LAYOUT_CACHE_MAX_CHARS = 1 << 18   # 共用快取所有鍵（脈絡與片段）的總字數上限
+
+
+def _gap_left(ch):
+    # 間隔前的實字：後處理只分辨「，」「；」與其他字
+    return ch if ch in '，；' else 'a'
+
+
+def _gap_right(ch):
+    # 間隔後的實字：另外要分辨是不是英文字母（決定底線轉空白還是刪除）
+    if ch in '，；':
+        return ch
+    return 'a' if ch.isascii() and ch.isalpha() else '#'
+
+
+def _gap_state(context):
+    """
+    依 _cleanup_run 的規則走過脈絡中的間隔，回傳 (階段, 保留的字數, 其中結尾空白的字數)。
+    「，；」之後先刪掉空格與點字空格（階段 0），「，」之後再刪掉其他空白（階段 1）；
+    進入階段 2 之後的字都保留，只有結尾那段空白在下一個實字是「，」時整段刪除。底線一律刪除
+    （最後一個底線可能轉成空白，由縮短後的脈絡保留）。
+    """
+    left = context[0]
+    phase = 0 if left in '，；' else 2
+    kept = trailing = 0
+    for ch in context[1:]:
+        if ch == '_':
             continue
+        if phase == 0:
+            if ch in ' \u2800':
+                continue
+            phase = 1 if left == '，' else 2
+        if phase == 1:
+            if ch.isspace():
+                continue
+            phase = 2
+        kept += 1
+        trailing = trailing + 1 if ch.isspace() else 0
+    return phase, kept, trailing
+
+
+def _shorten_context(context):
+    """
+    把過長的脈絡換成之後推算結果相同的短脈絡，回傳 (短脈絡, 一定保留的字數, 結尾空白多出的字數)：
+    後者與短脈絡的結尾空白同進退。
+    """
+    left = context[0]
+    phase, kept, trailing = _gap_state(context)
+    tail = '_' if context[-1] == '_' else ''
+    if phase < 2:
+        return left + ('\n' if phase else ' ') + tail, 0, 0
+    # 「，；」之後先以換行與點字空格進入階段 2，再補上一個結尾空白與結尾底線
+    short = left + ('\n\u2800' if left in '，；' else '') + ('\n' if trailing else '') + tail
+    _, short_kept, short_trailing = _gap_state(short)
+    return short, (kept - trailing) - (short_kept - short_trailing), trailing - short_trailing
+
+
+def _after_gap(context):
+    # 脈絡之後的查表物件；過長的脈絡縮短後，省略的字數由 _LongGapLayouts 補回
+    certain = pending = 0
+    if len(context) > _CONTEXT_MAX:
+        context, certain, pending = _shorten_context(context)
+    if certain or pending:
+        return _LongGapLayouts(context, certain, pending)
+    return _piece_layouts[context]
+
+
+class _PieceLayouts(dict):
+    """
+    某個脈絡之下，片段 → (實字區塊的起點, 終點, 之後脈絡的查表物件)；起點與終點都從目前的位置算起。
+    沒有實字的片段整段併入脈絡的間隔。
+    """
+    __slots__ = ('context',)
+
+    def __init__(self, context):
+        super().__init__()
+        self.context = context
+
+    def __missing__(self, piece):
+        context = self.context
+        head, core, tail = _PIECE_PARTS_RE.fullmatch(piece).groups()
+        if core:
+            gap = context[1:] + head
+            offset = len(_postprocess_runs(context[0] + gap + _gap_right(core[0]))) - 2 if gap else 0
+            layout = (offset, offset + len(_postprocess_runs(core)), _after_gap(_gap_left(core[-1]) + tail))
+        else:
+            layout = (0, 0, _after_gap(context + piece))
+        if _piece_layouts.charge(len(piece)):
+            self.clear()
+        self[piece] = layout
+        return layout
+
+
+class _LongGapLayouts(dict):
+    """
+    縮短過的脈絡：以短脈絡查表，再補上縮短時省略的字數。certain 一定保留；pending 是結尾的空白，
+    下一個實字是「，」而中間只有空白與底線時整段刪除。
+    查到的結果不留在 dict 裡：共用快取中的物件不會改變，間隔繼續累積時改用一次轉換專屬的
+    物件（private），直接更新它的欄位，長度不論多長的間隔每個字都只花固定的時間。
+    """
+    __slots__ = ('context', 'certain', 'pending', 'private')
+
+    def __init__(self, context, certain, pending, private=False):
+        super().__init__()
+        self.context = context
+        self.certain = certain
+        self.pending = pending
+        self.private = private
+
+    def __missing__(self, piece):
+        start, end, after = _piece_layouts[self.context][piece]
+        certain, pending = self.certain, self.pending
+        head = _PIECE_PARTS_RE.fullmatch(piece).group(1) if end else piece
+        # 間隔中出現空白以外的字（點字空格），之前的結尾空白就一定保留
+        gap = head.replace('_', '')
+        if gap and not gap.isspace():
+            certain, pending = certain + pending, 0
+        if end:
+            if pending and piece[len(head)] != '，':
+                certain += pending
+            return start + certain, end + certain, after
+        if isinstance(after, _LongGapLayouts):
+            certain += after.certain
+            pending += after.pending
+        if self.private:
+            self.context, self.certain, self.pending = after.context, certain, pending
+            return 0, 0, self
+        return 0, 0, _LongGapLayouts(after.context, certain, pending, private=True)
+
+
+class _ContextLayouts(dict):
+    """
+    脈絡 → 該脈絡的 _PieceLayouts。鍵的總字數超過 _LAYOUT_CACHE_MAX_CHARS 時整個清空；
+    清空後，舊的 _PieceLayouts 仍然正確，只是不再共用。
+    """
+    def __init__(self):
+        super().__init__()
+        self.key_chars = 0
+
+    def __missing__(self, context):
+        self.charge(len(context))
+        layouts = self[context] = _PieceLayouts(context)
+        return layouts
+
+    def charge(self, chars):
+        """記上新增鍵的字數；超過上限時清空並回傳 True。"""
+        self.key_chars += chars
+        if self.key_chars <= _LAYOUT_CACHE_MAX_CHARS:
+            return False
+        self.clear()
+        self.key_chars = 0
+        return True
+
+
+_piece_layouts = _ContextLayouts()
+
+
+def _place(piece, pos, layouts):
+    """
+    推算片段實字區塊在後處理之後的輸出位置，回傳 (區塊起點, 區塊終點, 之後脈絡的查表物件)；
+    沒有實字的片段起點與終點都是 pos。
+    """
+    start, end, layouts = layouts[piece]
+    return pos + start, pos + end, layouts
+
+
+class _DiagnosticRun(_Run):
+    """記錄標點輸出位置的 _Run：marks 為 (片段索引, 輸入起點, 輸入終點)。"""
+    __slots__ = ('marks',)
+
+    def __init__(self, text, tables, syllable, result):
+        super().__init__(text, tables, syllable, result)
+        self.marks = []
+
+    def emit_punctuation(self, key, i, key_len, eat_after_semicolon=True):
+        self.marks.append((len(self.result), i, i + key_len))
+        return _Run.emit_punctuation(self, key, i, key_len, eat_after_semicolon)
 
-        # (J) 無法匹配：若有正在組裝的音節，先輸出；否則當原字輸出避免卡住
-        if _has_syllable_content(current_syllable):
-            result.append(assemble_syllable(current_syllable))
-            current_syllable = {"initial": "", "vowel": "", "rushio": "", "tone": "", "nasal": False}
+
+# 會直接輸出片段（不經 emit_punctuation、也不是音節）的規則；這類片段一定是該步最後一個片段
+_DIRECT_RULES = frozenset((_rule_open_bracket, _rule_close_bracket, _rule_semicolon_bb_tone, _rule_fallback))
+
+
+class ConversionDiagnostics:
+    """
+    convert_with_diagnostics() 的結果。
+    text 為轉換結果（與 convert_braille_to_pinyin 相同）；spans 為 array('i')，
+    每 5 個整數一組（SPAN_FIELDS），rule 是 DIAGNOSTIC_RULES 的索引；
+    unmatched 為 array('i')，無法匹配而原樣輸出的輸入位置（不含空白）。
+    span 依輸出順序排列；鼻化 ⠠ 之後先輸出標點再接音節時，該音節的輸入範圍會從 ⠠ 算起，
+    與標點的範圍交錯。
+    轉換時 span 先記在攤平的 list，第一次讀取 spans 時才打包成 array；to_dict() 直接使用那份 list，
+    只回傳 JSON 時不必付打包再展開的成本。
+    """
+    __slots__ = ('text', 'unmatched', '_fields', '_spans', '_dict')
+
+    def __init__(self, text, fields, unmatched):
+        self.text = text
+        self.unmatched = unmatched
+        self._fields = fields
+        self._spans = None
+        self._dict = None
+
+    @property
+    def spans(self):
+        if self._spans is None:
+            self._spans = array('i', self._fields)
+            self._fields = None
+        return self._spans
+
+    def __len__(self):
+        fields = self._fields if self._spans is None else self._spans
+        return len(fields) // len(SPAN_FIELDS)
+
+    def span(self, k):
+        base = k * len(SPAN_FIELDS)
+        fields = dict(zip(SPAN_FIELDS, self.spans[base:base + len(SPAN_FIELDS)]))
+        fields['rule'] = DIAGNOSTIC_RULES[fields['rule']]
+        return fields
+
+    def to_dict(self):
+        """JSON 用的 dict；第一次呼叫時建立，之後回傳同一份（請勿修改）。"""
+        if self._dict is None:
+            self._dict = {
+                'result': self.text,
+                'rules': DIAGNOSTIC_RULES,
+                'span_fields': SPAN_FIELDS,
+                'spans': self._fields if self._spans is None else self._spans.tolist(),
+                'unmatched': self.unmatched.tolist(),
+            }
+        return self._dict
+
+
+def convert_with_diagnostics(braille_text, dialect):
+    """
+    轉換並回傳 ConversionDiagnostics：每個輸出音節/標點對應的輸入位置、輸出位置與產生的規則，
+    以及無法匹配的字元位置。無此腔調時 text 為 UNKNOWN_DIALECT_MESSAGE、沒有 span。
+    """
+    tables = get_dialect_tables(dialect)
+    if tables is None:
+        return ConversionDiagnostics(UNKNOWN_DIALECT_MESSAGE, [], array('i'))
+
+    engine = get_engine(tables)
+    dispatch_get = engine.dispatch.get
+    default_rules = engine.default_rules
+    rule_index = _RULE_INDEX
+    direct_rules = _DIRECT_RULES
+    not_unmatched = _NOT_UNMATCHED
+    text = braille_text
+    length = len(text)
+    result = []
+    syllable = Syllable()
+    run = _DiagnosticRun(text, tables, syllable, result)
+    marks = run.marks
+    spans = []                   # 攤平的 span 欄位（見 ConversionDiagnostics）
+    unmatched = array('i')
+
+    i = 0
+    n = 0                        # 目前的片段數
+    syllable_start = 0           # 組裝中音節的輸入起點；等於 i 表示這個音節還沒開始組裝
+    syllable_rule = _rule_fallback  # 最後一條只改變音節、沒有輸出的規則
+    pos, layouts = 0, _piece_layouts['a']  # 輸出位置的推算狀態（見 _place）
+    while i < length:
+        for rule in dispatch_get(text[i], default_rules):
+            next_i = rule(run, i)
+            if next_i is not None:
+                break
+        n1 = len(result)
+        if n1 == n:
+            # 只改變了音節（聲母、鼻化、調號等）
+            syllable_rule = rule
+            i = next_i
             continue
 
-        # 嘗試最後一次「一般標點」（允許尾空白），否則原字輸出
-        p2_len, p2_match = match_from_dict(braille_text, i, punctuation_keys, allow_trailing_space=True)
-        if p2_len > 0 and p2_match is not None:
-            prev_char = _prev_nonspace(braille_text, i)
-            next_char = _peek_nonspace(braille_text, i + p2_len)
-            if p2_match == '⠦':
-                if prev_char in tones:
-                    result.append('？')
-                elif not next_char or (next_char not in tones and next_char != ' '):
-                    result.append('「')
-                else:
-                    result.append('？')
+        if n1 == n + 1 and not marks:
+            # 最常見的情形：這一步只輸出一個片段
+            if rule not in direct_rules or next_i == i:
+                # 收尾一個音節（什麼都沒吃就收尾時，歸給最後一條組裝音節的規則）
+                offset, width, layouts = layouts[result[n]]
+                out_start = pos + offset
+                pos += width
+                spans += (syllable_start, next_i, out_start, pos, rule_index[rule if next_i > i else syllable_rule])
+                syllable_start = next_i
+            elif rule is _rule_fallback and text[i] in not_unmatched:
+                # 原樣輸出的空白只是間隔，不記錄
+                layouts = layouts[text[i]][2]
+                if syllable_start == i:
+                    syllable_start = next_i
             else:
-                result.append(punctuations[p2_match])
-            i += p2_len
-            if result and result[-1] == '；':
-                i += _eat_spaces(braille_text, i)
-            continue
+                # 括號、分號或原樣輸出的字元
+                if rule is _rule_fallback:
+                    unmatched.append(i)
+                offset, width, layouts = layouts[result[n]]
+                out_start = pos + offset
+                pos += width
+                spans += (i, next_i, out_start, pos, rule_index[rule])
+                if syllable_start == i:
+                    syllable_start = next_i
+        elif n1 == n + 2 and marks and marks[0][0] == n + 1:
+            # 其次常見：收尾音節之後緊接著一個標點
+            _, mark_start, mark_end = marks.pop()
+            offset, width, layouts = layouts[result[n]]
+            out_start = pos + offset
+            pos += width
+            spans += (syllable_start, mark_start, out_start, pos, rule_index[rule if mark_start > i else syllable_rule])
+            offset, width, layouts = layouts[result[n + 1]]
+            out_start = pos + offset
+            pos += width
+            spans += (mark_start, mark_end, out_start, pos, rule_index[rule])
+            syllable_start = next_i
         else:
-            result.append(braille_text[i])
-            i += 1
+            # 其他一步輸出多個片段的情形，依 marks 與規則分辨
+            m = 0
+            k = rule_index[rule]
+            for p in range(n, n1):
+                out_start, pos, layouts = _place(result[p], pos, layouts)
+                if m < len(marks) and marks[m][0] == p:
+                    _, start, end = marks[m]
+                    m += 1
+                    spans += (start, end, out_start, pos, k)
+                elif p == n1 - 1 and rule in direct_rules and next_i > i:
+                    # 括號、分號或原樣輸出的字元
+                    if rule is _rule_fallback:
+                        if text[i] in not_unmatched:
+                            continue
+                        unmatched.append(i)
+                    spans += (i, next_i, out_start, pos, k)
+                else:
+                    # 音節：結束於同一步的下一個片段之前，或這一步的終點
+                    if p + 1 < n1:
+                        end = marks[m][1] if m < len(marks) and marks[m][0] == p + 1 else i
+                    else:
+                        end = next_i
+                    spans += (syllable_start, end, out_start, pos, k if end > i else rule_index[syllable_rule])
+                    syllable_start = i
+            marks.clear()
+            if syllable_start == i:
+                syllable_start = next_i
+        n = n1
+        i = next_i
 
-    # 收尾：若有殘留音節
-    if _has_syllable_content(current_syllable):
-        result.append(assemble_syllable(current_syllable))
+    if syllable.has_content():
+        piece = syllable.assemble()
+        result.append(piece)
+        out_start, pos, layouts = _place(piece, pos, layouts)
+        spans += (syllable_start, length, out_start, pos, rule_index[syllable_rule])
+
+    return ConversionDiagnostics(_postprocess_pinyin(''.join(result)), spans, unmatched)
+
+
+# ---------- 後處理 ----------
+
+# 原本的四道清理規則（只在 _cleanup_run 對單一片段使用）
+_UNDERSCORE_TO_SPACE_RE = re.compile(r'(?<![，；])_(?=[a-zA-Zng])')
+_SPACES_AFTER_PAUSE_RE = re.compile(r'([，；])(?: |\u2800)+')
 
-    raw_pinyin = ''.join(result)
+# 需要清理的片段：從底線或「，；」開始，連同後面的底線/空白/點字空格/逗號分號。
+# 四道規則都只看這類字元；片段前是一般字元或空白，後面的字元只影響「底線轉空白」的判斷
+_CLEANUP_RUN_RE = re.compile(r'[_，；][_，；\s\u2800]*')
+
+_cleanup_cache = {}
+_CLEANUP_CACHE_MAX = 4096
+_CLEANUP_CACHE_RUN_MAX = 64   # 更長的片段（例如整段換行）直接計算，不放進快取
+
+
+def _cleanup_run(run, next_is_letter):
+    # 以原本的四道規則處理單一片段；結尾補一個代表「後一個字元」的哨兵字再去掉
+    text = run + ('a' if next_is_letter else '#')
 
     # 底線轉空白：但「，；」之後的底線不轉空白（避免標點後多一格）
-    final_pinyin = re.sub(r'(?<![，；])_(?=[a-zA-Zng])', ' ', raw_pinyin)
+    text = _UNDERSCORE_TO_SPACE_RE.sub(' ', text)
 
     # 把其他殘留底線移除
-    final_pinyin = final_pinyin.replace('_', '')
+    text = text.replace('_', '')
 
     # ★ 關鍵補強：移除「，；」後緊接的所有空白（同時吃 ASCII 空格與點字空格 U+2800）
-    final_pinyin = re.sub(r'([，；])(?: |\u2800)+', r'\1', final_pinyin)
+    text = _SPACES_AFTER_PAUSE_RE.sub(r'\1', text)
 
     # 逗號「，」前後不留空白（原規則保留；這行針對一般空白）
-    final_pinyin = re.sub(r'\s*，\s*', '，', final_pinyin)
+    text = _strip_around_commas(text)
+
+    return text[:-1]
+
 
-    return final_pinyin
+def _strip_around_commas(text):
+    # 等同 re.sub(r'\s*，\s*', '，', text)；正規式在不接逗號的長空白上會逐位置重試，是平方時間
+    parts = text.split('，')
+    last = len(parts) - 1
+    if not last:
+        return text
+    return '，'.join(part.rstrip() if k == 0 else part.lstrip() if k == last else part.strip()
+                    for k, part in enumerate(parts))
+
+
+def _postprocess_pinyin(raw_pinyin):
+    """
+    輸出清理：底線轉空白或移除、「，；」後不留空白、「，」前後不留空白。
+    一次掃描只處理含底線/標點的片段，同樣的片段只計算一次，結果與逐條套用規則相同。
+    """
+    if _profiler is not None:
+        return _profiler.postprocess(raw_pinyin)
+    return _postprocess_runs(raw_pinyin)
+
+
+def _postprocess_runs(raw_pinyin):
+    pieces = []
+    last = 0
+    length = len(raw_pinyin)
+    for m in _CLEANUP_RUN_RE.finditer(raw_pinyin):
+        start, end = m.span()
+        next_is_letter = end < length and raw_pinyin[end].isascii() and raw_pinyin[end].isalpha()
+        key = (m.group(), next_is_letter)
+        if end - start > _CLEANUP_CACHE_RUN_MAX:
+            cleaned = _cleanup_run(*key)
+        else:
+            cleaned = _cleanup_cache.get(key)
+            if cleaned is None:
+                if len(_cleanup_cache) >= _CLEANUP_CACHE_MAX:
+                    _cleanup_cache.clear()
+                cleaned = _cleanup_cache[key] = _cleanup_run(*key)
+
+        before = raw_pinyin[last:start]
+        if cleaned[:1] == '，':
+            # 逗號前的空白也要去掉
+            before = before.rstrip()
+        pieces.append(before)
+        pieces.append(cleaned)
+        last = end
+    if last == 0:
+        return raw_pinyin
+    pieces.append(raw_pinyin[last:])
+    return ''.join(pieces)
 
 def add_space_after_tone_less_syllable(text):
     # 只對底線後接拼音字母（排除以 ng/m/t/p 等 rushio 開頭）插入空格
@@ -634,3 +2375,480 @@ def add_space_after_tone_less_syllable(text):
     text = text.replace('_', '')
     text = re.sub(r'([ˇˋˊ\^]) ', r'\1', text)
     return text
+
+
+# ---------- 反向轉換：拼音 → 點字 ----------
+#
+# 由同一份 braille_data 建立「拼音 → 點字鍵」的反查表。拼音以音節為單位處理：
+# 字母串（可帶一個調號）拆成 聲母 + 韻母（或 rushio、特殊字），候選的點字依序交給正向轉換驗證，
+# 第一個轉回原音節的就採用；同樣的音節只計算一次。標點與空白逐字反查，其他字元原樣保留。
+# 一個點字鍵對到多個拼音（⠦ 是「？」也是「「」、⠔ 是 ii 也是 ua）時由正向轉換的脈絡決定，
+# 所以檢查的是「點字 → 拼音 → 點字 → 拼音」兩次拼音相同（見 benchmark.round_trip），
+# 而不是點字逐字相同；標點緊接在空白或另一個標點之後等少數脈絡仍可能轉不回原樣。
+
+_REVERSE_SYLLABLE_CACHE_MAX = 65536
+
+
+class ReverseTables:
+    """
+    單一腔調的反查表：拼音 → 點字鍵（聲母、韻母、調號、rushio、特殊字、標點），
+    以及斷出「字母串 + 調號」的正規式。由 get_reverse_tables() 建立並快取。
+    """
+    __slots__ = ('tables', 'consonants', 'vowels', 'tones', 'rushio', 'special',
+                 'punctuation_trie', 'punctuations', 'syllable_re', 'initials', 'max_letters', 'syllables')
+
+    def __init__(self, tables):
+        self.tables = tables
+
+        def invert(mapping):
+            # 同一個拼音有多個鍵時，保留表中先出現的（與正向的主要寫法一致）
+            inverted = {}
+            for key, value in mapping.items():
+                if value:
+                    inverted.setdefault(value, key)
+            return inverted
+
+        self.consonants = invert(tables.consonants)
+        self.vowels = invert(tables.vowels)
+        # ⠔ 在 ⠵⠉⠎ 之後讀作 ii，JSON 重複鍵只留下 ua，另外補上
+        self.vowels.setdefault('ii', '⠔')
+        self.tones = invert(tables.tones)
+        self.tones[''] = ''
+        self.special = invert(tables.special_cases)
+        self.rushio = {}
+        for key in tables.rushio_keys:
+            value = tables.rushio_values[key]
+            if value:
+                self.rushio.setdefault(value, key)
+
+        punctuations = invert(tables.punctuations)
+        # ⠦ 在音節之後讀作「？」，JSON 重複鍵只留下「，另外補上
+        if '⠦' in tables.punctuations:
+            punctuations.setdefault('？', '⠦')
+        # 分號要後接點字空格才會被正向轉換當成標點
+        if '；' in punctuations:
+            punctuations['；'] += '⠀'
+        self.punctuations = punctuations
+        self.punctuation_trie = PrefixTrie(punctuations)
+
+        # 聲母候選：長的先試，最後是「沒有聲母」
+        self.initials = tuple(sorted(self.consonants, key=len, reverse=True)) + ('',)
+        # 一個音節最多幾個字母：聲母 + 鼻化 nn + 韻母或 rushio，或舊格式的 聲母 + 韻母 + 子音入聲尾；
+        # 更長的字母串不可能是一個音節，不必逐一嘗試拆法
+        initial = max(map(len, self.consonants), default=0)
+        final = max(map(len, list(self.vowels) + list(self.rushio)), default=0)
+        self.max_letters = max(max(map(len, self.special), default=0), len('er'),
+                               initial + len('nn') + final, initial + final + initial)
+        tone_chars = ''.join(sorted({ch for value in self.tones for ch in value}))
+        self.syllable_re = re.compile(f'([a-zA-Z]+)([{re.escape(tone_chars)}]?)')
+        self.syllables = {}
+
+
+_reverse_cache = {}
+
+
+def get_reverse_tables(dialect):
+    """取得腔調的反查表（第一次使用時建立）；無此腔調回傳 None。"""
+    tables = get_dialect_tables(dialect)
+    if tables is None:
+        return None
+    reverse = _reverse_cache.get(tables.dialect)
+    if reverse is None or reverse.tables is not tables:
+        reverse = _reverse_cache[tables.dialect] = ReverseTables(tables)
+    return reverse
+
+
+def _syllable_splits(reverse, letters):
+    # (聲母點字, 剩下的拼音)：長的聲母先試，最後是沒有聲母
+    for initial in reverse.initials:
+        if letters.startswith(initial) and len(letters) > len(initial):
+            yield (reverse.consonants[initial] if initial else ''), letters[len(initial):]
+
+
+def _syllable_candidates(reverse, letters, tone):
+    # 依序產生可能的點字寫法（不含後面的空白）；常見寫法在前，舊格式在後
+    tone_key = reverse.tones.get(tone)
+    if letters in reverse.special and tone_key is not None:
+        yield reverse.special[letters] + tone_key
+    if letters == 'er' and tone_key:
+        yield '⠗' + tone_key
+
+    bodies = [('', letters)]
+    # 鼻化：拼音是 聲母 + 韻母 + nn + 入聲尾 + 調號，點字在音節開頭加 ⠠
+    at = letters.find('nn', 1)
+    if at != -1:
+        bodies.append(('⠠', letters[:at] + letters[at + 2:]))
+
+    for nasal, body in bodies:
+        for head, rest in _syllable_splits(reverse, body):
+            rushio_key = reverse.rushio.get(rest + (tone or ' '))
+            if rushio_key is not None:
+                yield nasal + head + rushio_key
+            vowel_key = reverse.vowels.get(rest)
+            if vowel_key is not None and tone_key is not None:
+                yield nasal + head + vowel_key + tone_key
+
+    # 只有聲母的音節
+    if letters in reverse.consonants and tone_key is not None:
+        yield reverse.consonants[letters] + tone_key
+
+    # 舊格式：韻母 + 子音作入聲尾 + 調號（沒有調號時由 _reverse_syllable 補上 ⠤）
+    if tone_key is not None:
+        for head, rest in _syllable_splits(reverse, letters):
+            for split in range(len(rest) - 1, 0, -1):
+                vowel_key = reverse.vowels.get(rest[:split])
+                final_key = reverse.consonants.get(rest[split:])
+                if vowel_key is not None and final_key is not None and final_key != '⠆':
+                    yield head + vowel_key + final_key + tone_key
+
+
+def _reverse_syllable(reverse, letters, tone, punct):
+    """
+    把一個拼音音節轉成點字；回傳 (點字, 是否已含結尾空白)，沒有任何候選寫法時回傳 (None, False)。
+    punct：後面緊接的標點 (拼音, 點字鍵) 或 None。⠂⠆⠒ 等鍵也是調號，
+    所以先連同標點一起驗證（沒有調號的音節可能要補 ⠤），不成立才只驗證音節本身。
+    """
+    if len(letters) > reverse.max_letters:
+        return None, False
+    cache_key = (letters, tone, punct)
+    cached = reverse.syllables.get(cache_key)
+    if cached is not None:
+        return cached
+
+    tables = reverse.tables
+    expected = letters + tone
+    candidates = list(_syllable_candidates(reverse, letters, tone))
+    found = (None, False)
+    if punct is not None:
+        punct_text, punct_key = punct
+        fillers = ('', '⠤') if not tone else ('',)
+        for braille in candidates:
+            for filler in fillers:
+                if _convert_with_tables(braille + filler + punct_key, tables) == expected + punct_text:
+                    found = (braille + filler, False)
+                    break
+            if found[0] is not None:
+                break
+    if found[0] is None:
+        for braille in candidates:
+            output = _convert_with_tables(braille, tables)
+            if output == expected:
+                found = (braille, False)
+            elif output == expected + ' ' and not tone:
+                found = (braille, True)  # rushio 的預設寫法本身帶一個空白
+            else:
+                continue
+            break
+    if found[0] is None and not tone:
+        # 單獨出現時會被當成標點的韻母（⠲ 是「。」也是 iun），補上無調號的 ⠤ 才讀成音節
+        for braille in candidates:
+            if _convert_with_tables(braille + '⠤', tables) == expected:
+                found = (braille + '⠤', False)
+                break
+    if found[0] is None and candidates:
+        # 只在前後文裡才讀得對的寫法（⠐ 開頭的韻母單獨出現時是「、」）：採用最主要的寫法，
+        # 不把拼音字母原樣留在點字裡
+        braille = candidates[0]
+        found = (braille, not tone and _convert_with_tables(braille, tables).endswith(' '))
+
+    if len(reverse.syllables) >= _REVERSE_SYLLABLE_CACHE_MAX:
+        reverse.syllables.clear()
+    reverse.syllables[cache_key] = found
+    return found
+
+
+def _split_syllables(reverse, letters, tone):
+    """
+    不能當成一個音節的字母串（例如單獨成音節的聲母緊接著下一個音節、或很長的字母串），
+    由左而右每次取有寫法的最長字首，調號跟著最後一段；切不開時回傳 None。
+    每段最多 max_letters 個字母，所需時間與字母串長度成正比。
+    """
+    pieces = []
+    i = 0
+    n = len(letters)
+    while i < n:
+        for j in range(min(n, i + reverse.max_letters), i, -1):
+            braille, _ = _reverse_syllable(reverse, letters[i:j], tone if j == n else '', None)
+            if braille is not None:
+                break
+        else:
+            return None
+        pieces.append(braille)
+        i = j
+    return ''.join(pieces)
+
+
+def _reverse_gap(reverse, text, out):
+    # 音節之間的文字：標點最長匹配，單獨的調號換成調號鍵，其餘（空白、換行、其他文字）原樣輸出
+    i = 0
+    n = len(text)
+    while i < n:
+        key_len, key = reverse.punctuation_trie.match(text, i)
+        if key_len:
+            out.append(reverse.punctuations[key])
+            i += key_len
+        else:
+            out.append(reverse.tones.get(text[i]) or text[i])
+            i += 1
+
+
+def convert_pinyin_to_braille(pinyin_text, dialect):
+    """
+    拼音轉點字（convert_braille_to_pinyin 的反向）。不是一個音節的字母串切成多個音節，
+    切不開的字母串與其他文字原樣保留。
+    """
+    reverse = get_reverse_tables(dialect)
+    if reverse is None:
+        return UNKNOWN_DIALECT_MESSAGE
+
+    out = []
+    pos = 0
+    length = len(pinyin_text)
+    for m in reverse.syllable_re.finditer(pinyin_text):
+        start, end = m.span()
+        if start < pos:
+            continue  # 上一個 rushio 已吃掉這裡的空白
+        if start > pos:
+            _reverse_gap(reverse, pinyin_text[pos:start], out)
+        letters, tone = m.group(1), m.group(2)
+        punct = None
+        if end < length:
+            punct_len, punct_text = reverse.punctuation_trie.match(pinyin_text, end)
+            if punct_len:
+                punct = (punct_text, reverse.punctuations[punct_text])
+        braille, has_space = _reverse_syllable(reverse, letters, tone, punct)
+        if braille is None:
+            braille = _split_syllables(reverse, letters, tone)
+            out.append(m.group() if braille is None else braille)
+        else:
+            out.append(braille)
+            if has_space and end < length and pinyin_text[end] == ' ':
+                end += 1
+        pos = end
+    if pos < length:
+        _reverse_gap(reverse, pinyin_text[pos:], out)
+    return ''.join(out)
+
+
+# ---------- 命令列批次轉換（python -m converter） ----------
+
+CLI_INPUT_SUFFIXES = ('.brl', '.txt')
+CLI_OUTPUT_SUFFIX = '.pinyin.txt'
+CLI_MANIFEST_NAME = '.pinyin_manifest.json'
+
+
+def _file_digest(path, dialect):
+    # 內容雜湊：輸入檔 + 腔調 + 點字表版本，任一改變就要重轉
+    digest = hashlib.sha256()
+    digest.update(f'{dialect}\0{tables_version()}\0'.encode('utf-8'))
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(STREAM_READ_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _counted(chunks, counter):
+    for chunk in chunks:
+        counter[0] += len(chunk)
+        yield chunk
+
+
+_cli_services = {}
+
+
+def _cli_service(max_chars):
+    # 命令列也經過轉換服務（同樣的輸入檢查、大小限制與耗時統計）；每個 worker process 各建一個。
+    # 在這裡才匯入，因為 conversion_service 本身匯入 converter
+    service = _cli_services.get(max_chars)
+    if service is None:
+        from conversion_service import ConversionService
+        service = _cli_services[max_chars] = ConversionService(max_stream_chars=max_chars)
+    return service
+
+
+def _convert_file(job):
+    """
+    轉換單一檔案（可在 worker process 內執行）。
+    回傳 (輸出路徑, 內容雜湊, 轉換字元數, 是否略過, 錯誤訊息)；錯誤訊息為 None 表示成功。
+    單一檔案失敗（讀寫錯誤、不是 UTF-8、超過字元數上限、轉換規則拋出例外）不影響其他檔案，
+    輸出先寫到暫存檔，成功才取代，舊的輸出檔不會只剩一半。
+    """
+    src, dst, dialect, max_chars, previous_digest = job
+    tmp_path = dst + '.tmp'
+    try:
+        digest = _file_digest(src, dialect) if previous_digest is not None else None
+        if digest is not None and digest == previous_digest and os.path.exists(dst):
+            return dst, digest, 0, True, None
+
+        out_dir = os.path.dirname(dst)
+        if out_dir:
+            os.makedirs(out_dir, exist_ok=True)
+        counter = [0]
+        with open(src, encoding='utf-8') as fin, open(tmp_path, 'w', encoding='utf-8', newline='') as fout:
+            for piece in _cli_service(max_chars).convert_stream(_counted(_iter_file_chunks(fin), counter),
+                                                                dialect, entry='cli'):
+                fout.write(piece)
+        os.replace(tmp_path, dst)
+    except (OSError, ValueError) as e:
+        # ValueError 包含 UnicodeDecodeError 與轉換服務的 ConversionRejected
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return dst, None, 0, False, f"{src}：{str(e).lstrip('⚠️ ')}"
+    except Exception as e:
+        # 轉換規則本身拋出的例外（例如詔安腔的 ⠆ 查不到子音）也只算這個檔案失敗
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        return dst, None, 0, False, f'{src}：轉換失敗：{type(e).__name__}: {e}'
+    return dst, digest, counter[0], False, None
+
+
+def _output_path(src, root, out_dir):
+    # 輸出檔名：去掉副檔名加上 .pinyin.txt；指定輸出目錄時保留相對於 root 的目錄結構
+    base = os.path.splitext(src)[0] + CLI_OUTPUT_SUFFIX
+    if out_dir is None:
+        return base
+    return os.path.join(out_dir, os.path.relpath(base, root))
+
+
+def _collect_jobs(paths, out_dir):
+    jobs = []
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    if filename.endswith(CLI_OUTPUT_SUFFIX) or not filename.endswith(CLI_INPUT_SUFFIXES):
+                        continue
+                    src = os.path.join(dirpath, filename)
+                    jobs.append((src, _output_path(src, path, out_dir)))
+        else:
+            jobs.append((path, _output_path(path, os.path.dirname(path), out_dir)))
+    return jobs
+
+
+def _load_manifest(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _save_manifest(path, manifest):
+    manifest_dir = os.path.dirname(path)
+    if manifest_dir:
+        os.makedirs(manifest_dir, exist_ok=True)
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1, sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def _build_arg_parser():
+    parser = argparse.ArgumentParser(
+        prog='python -m converter',
+        description='客語點字轉客語拼音（批次）。不給路徑或給 - 時讀 stdin、寫 stdout。',
+    )
+    parser.add_argument('paths', nargs='*', help='點字檔或目錄（目錄會遞迴處理 .brl / .txt）')
+    parser.add_argument('-d', '--dialect', default='siian2', type=str.lower, choices=sorted(_dialect_lookup),
+                        help='腔調（預設 siian2）')
+    parser.add_argument('-o', '--output-dir', help='輸出目錄（預設寫在輸入檔旁邊）')
+    parser.add_argument('-j', '--workers', type=int, default=1,
+                        help='平行處理檔案的 worker 數（0 表示 CPU 核心數）')
+    parser.add_argument('--skip-unchanged', action='store_true',
+                        help='輸入內容、腔調與點字表都沒變且輸出檔存在時略過')
+    parser.add_argument('--manifest', help=f'內容雜湊紀錄檔（預設為輸出目錄或目前目錄下的 {CLI_MANIFEST_NAME}）')
+    parser.add_argument('--max-chars', type=int, help='每個輸入的點字字元數上限（預設同轉換服務的 MAX_STREAM_CHARS）')
+    parser.add_argument('-q', '--quiet', action='store_true', help='不輸出統計摘要')
+    parser.add_argument('--compile-tables', action='store_true',
+                        help=f'把 braille_data 編譯成預先編譯檔（{os.path.basename(TABLES_ARTIFACT)}）後結束')
+    return parser
+
+
+def main(argv=None):
+    args = _build_arg_parser().parse_args(argv)
+    started = time.perf_counter()
+
+    if args.compile_tables:
+        path = compile_tables()
+        if not args.quiet:
+            print(f'已寫入 {path}（點字表版本 {tables_version()}）', file=sys.stderr)
+        return 0
+
+    from conversion_service import MAX_STREAM_CHARS, ConversionRejected  # 同 _cli_service，避免循環匯入
+    if args.max_chars is None:
+        args.max_chars = MAX_STREAM_CHARS
+
+    if not args.paths or args.paths == ['-']:
+        counter = [0]
+        pieces = _cli_service(args.max_chars).convert_stream(
+            _counted(_iter_file_chunks(sys.stdin), counter), args.dialect, entry='cli')
+        try:
+            for piece in pieces:
+                sys.stdout.write(piece)
+        except ConversionRejected as e:
+            # 例如超過 --max-chars；前面的結果已經寫出
+            sys.stdout.flush()
+            print(f'\n{e}', file=sys.stderr)
+            return 1
+        sys.stdout.flush()
+        if not args.quiet:
+            _print_summary(1, 0, counter[0], time.perf_counter() - started)
+        return 0
+
+    missing = [p for p in args.paths if not os.path.exists(p)]
+    if missing:
+        print(f'⚠️ 找不到檔案：{", ".join(missing)}', file=sys.stderr)
+        return 2
+
+    jobs = _collect_jobs(args.paths, args.output_dir)
+    manifest_path = args.manifest or os.path.join(args.output_dir or '.', CLI_MANIFEST_NAME)
+    manifest = _load_manifest(manifest_path) if args.skip_unchanged else {}
+
+    tasks = []
+    for src, dst in jobs:
+        previous = manifest.get(os.path.abspath(dst), '') if args.skip_unchanged else None
+        tasks.append((src, dst, args.dialect, args.max_chars, previous))
+
+    workers = args.workers if args.workers > 0 else (os.cpu_count() or 1)
+    if workers > 1 and len(tasks) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as pool:
+            outcomes = list(pool.map(_convert_file, tasks))
+    else:
+        outcomes = [_convert_file(task) for task in tasks]
+
+    converted = skipped = failed = chars = 0
+    for dst, digest, n_chars, was_skipped, error in outcomes:
+        if error is not None:
+            # 失敗的檔案不記入 manifest，下次 --skip-unchanged 時會重轉
+            print(f'⚠️ 無法轉換 {error}', file=sys.stderr)
+            manifest.pop(os.path.abspath(dst), None)
+            failed += 1
+            continue
+        if digest is not None:
+            manifest[os.path.abspath(dst)] = digest
+        skipped += was_skipped
+        converted += not was_skipped
+        chars += n_chars
+    if args.skip_unchanged:
+        _save_manifest(manifest_path, manifest)
+
+    if not args.quiet:
+        _print_summary(converted, skipped, chars, time.perf_counter() - started, failed)
+    return 1 if failed else 0
+
+
+def _print_summary(files, skipped, chars, elapsed, failed=0):
+    elapsed = max(elapsed, 1e-9)
+    failures = f'，失敗 {failed} 個' if failed else ''
+    print(
+        f'轉換 {files} 個檔案（略過 {skipped} 個{failures}），{chars} 字元，{elapsed:.2f} 秒；'
+        f'{chars / elapsed:,.0f} 字元/秒，{files / elapsed:,.1f} 檔案/秒',
+        file=sys.stderr,
+    )
+
+
+if __name__ == '__main__':
+    # 以模組名稱重新匯入，讓 process pool 能以 converter._convert_file 傳給 worker
+    from converter import main as _main
+    sys.exit(_main())
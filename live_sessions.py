@@ -0,0 +1,121 @@
+"""
+即時編輯工作階段：每份正在編輯的文件保留一個 IncrementalDocument，
+前端只送出編輯（位置、刪除長度、插入內容），伺服器只重轉受影響的段落並回傳輸出差異。
+
+工作階段存在行程記憶體內：超過 max_sessions 份或 max_chars（點字總字元數）時淘汰最久沒用到的
+（單一文件本身超過 max_chars 時直接拒絕，不淘汰其他文件），
+閒置超過 idle_seconds 的也會被清掉。多個 gunicorn worker 之間不共用，
+前端收到「找不到文件」時重新開啟即可。
+"""
+import secrets
+import threading
+import time
+from collections import OrderedDict
+
+from converter import IncrementalDocument
+
+
+class SessionNotFound(KeyError):
+    pass
+
+
+class DocumentTooLarge(ValueError):
+    """文件（開啟時或編輯後）超過 max_chars；不建立工作階段、不套用編輯。"""
+
+
+class RevisionMismatch(Exception):
+    def __init__(self, revision):
+        super().__init__(revision)
+        self.revision = revision
+
+
+class LiveSession:
+    __slots__ = ('document', 'lock', 'last_used')
+
+    def __init__(self, document):
+        self.document = document
+        self.lock = threading.Lock()
+        self.last_used = time.monotonic()
+
+
+class LiveSessions:
+    """
+    以文件 ID 管理 IncrementalDocument 的 LRU 表。
+    """
+
+    def __init__(self, max_sessions=256, max_chars=32 * 1024 * 1024, idle_seconds=30 * 60):
+        self.max_sessions = max_sessions
+        self.max_chars = max_chars
+        self.idle_seconds = idle_seconds
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+
+    def open(self, braille_text, dialect):
+        """
+        建立新的文件並回傳 (doc_id, document)；無此腔調時拋出 ValueError，
+        超過 max_chars 時拋出 DocumentTooLarge。新文件不會被自己擠掉，只淘汰其他文件。
+        """
+        self._check_size(len(braille_text))
+        document = IncrementalDocument(braille_text, dialect)
+        doc_id = secrets.token_urlsafe(16)
+        with self._lock:
+            self._sessions[doc_id] = LiveSession(document)
+            self._evict(keep=doc_id)
+        return doc_id, document
+
+    def edit(self, doc_id, revision, offset, deleted, inserted):
+        """
+        對文件套用一次編輯，回傳 (新版本號, 輸出差異)。
+        找不到文件時拋出 SessionNotFound；revision 與伺服器上的版本不同時拋出
+        RevisionMismatch，前端應重新開啟文件同步；編輯後超過 max_chars 時拋出 DocumentTooLarge。
+        """
+        with self._lock:
+            session = self._sessions.get(doc_id)
+            if session is None:
+                raise SessionNotFound(doc_id)
+            self._sessions.move_to_end(doc_id)
+            session.last_used = time.monotonic()
+
+        with session.lock:
+            document = session.document
+            if revision is not None and revision != document.revision:
+                raise RevisionMismatch(document.revision)
+            self._check_size(len(document) - deleted + len(inserted))
+            diff = document.apply_edit(offset, deleted, inserted)
+            revision = document.revision
+
+        with self._lock:
+            self._evict(keep=doc_id)
+        return revision, diff
+
+    def close(self, doc_id):
+        with self._lock:
+            return self._sessions.pop(doc_id, None) is not None
+
+    def _check_size(self, chars):
+        if chars > self.max_chars:
+            raise DocumentTooLarge(f'文件太大（上限 {self.max_chars} 字元）')
+
+    def _evict(self, keep):
+        # 呼叫端需持有 self._lock；keep 是這次建立或編輯的文件，從最久沒用到的開始淘汰其他文件
+        now = time.monotonic()
+        total = sum(len(s.document) for s in self._sessions.values())
+        for doc_id, oldest in list(self._sessions.items()):
+            if doc_id == keep:
+                continue
+            idle = now - oldest.last_used > self.idle_seconds
+            if not idle and len(self._sessions) <= self.max_sessions and total <= self.max_chars:
+                break
+            del self._sessions[doc_id]
+            total -= len(oldest.document)
+            self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'sessions': len(self._sessions),
+                'chars': sum(len(s.document) for s in self._sessions.values()),
+                'evictions': self.evictions,
+            }
+
@@ -0,0 +1,105 @@
+"""
+本機負載測試：同時送出大量短請求，並混入少量長文件，觀察短請求的延遲。
+
+    gunicorn app:app -b 127.0.0.1:8000                 # 同步 Flask
+    uvicorn asgi:app --port 8001                        # 非同步 ASGI
+    python loadtest.py http://127.0.0.1:8000 -c 32 -n 2000
+    python loadtest.py http://127.0.0.1:8001 -c 32 -n 2000
+
+只用標準函式庫（asyncio 直接寫 HTTP/1.1），不需要額外安裝套件。
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from urllib.parse import urlsplit
+
+from benchmark import build_corpus
+
+
+async def _post(host, port, path, payload):
+    body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(
+            f'POST {path} HTTP/1.1\r\nHost: {host}:{port}\r\n'
+            f'Content-Type: application/json\r\nContent-Length: {len(body)}\r\n'
+            f'Connection: close\r\n\r\n'.encode('ascii') + body
+        )
+        await writer.drain()
+        status_line = await reader.readline()
+        await reader.read()
+        return int(status_line.split()[1])
+    finally:
+        writer.close()
+
+
+def _percentile(values, q):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, round(q * (len(values) - 1)))]
+
+
+async def run(url, concurrency, total, large_ratio, large_chars, dialect):
+    parts = urlsplit(url)
+    host, port = parts.hostname, parts.port or 80
+    path = (parts.path.rstrip('/') or '') + '/api/convert'
+
+    rnd = random.Random(0)
+    small_texts = [build_corpus(dialect, 200, seed) for seed in range(50)]
+    large_text = build_corpus(dialect, large_chars)
+
+    latencies = {'small': [], 'large': []}
+    statuses = {}
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait('large' if rnd.random() < large_ratio else 'small')
+
+    async def worker():
+        while True:
+            try:
+                kind = queue.get_nowait()
+            except asyncio.QueueEmpty:
+                return
+            text = large_text if kind == 'large' else rnd.choice(small_texts)
+            started = time.perf_counter()
+            try:
+                status = await _post(host, port, path, {'braille': text, 'dialect': dialect})
+            except OSError:
+                status = 'error'
+            statuses[status] = statuses.get(status, 0) + 1
+            if status == 200:
+                latencies[kind].append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    print(f'{url}  並行 {concurrency}  共 {total} 個請求，{elapsed:.2f} 秒，{total / elapsed:,.1f} 請求/秒')
+    print(f'  狀態碼：{statuses}')
+    for kind in ('small', 'large'):
+        values = latencies[kind]
+        if values:
+            print(f'  {kind:5} {len(values):>6} 筆  p50 {_percentile(values, 0.5) * 1000:9.1f} ms  '
+                  f'p99 {_percentile(values, 0.99) * 1000:9.1f} ms')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='/api/convert 本機負載測試')
+    parser.add_argument('url', help='服務位址，例如 http://127.0.0.1:8000')
+    parser.add_argument('-c', '--concurrency', type=int, default=32, help='同時連線數')
+    parser.add_argument('-n', '--requests', type=int, default=1000, help='總請求數')
+    parser.add_argument('--large-ratio', type=float, default=0.02, help='長文件請求的比例')
+    parser.add_argument('--large-chars', type=int, default=200_000, help='長文件的字元數')
+    parser.add_argument('-d', '--dialect', default='siian2')
+    args = parser.parse_args(argv)
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.large_ratio,
+                    args.large_chars, args.dialect))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
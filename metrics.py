@@ -0,0 +1,115 @@
+"""
+/metrics 用的 Prometheus 文字格式輸出（不依賴 prometheus_client）。
+
+- LatencyHistogram：依路由與狀態碼分組的請求延遲直方圖。
+- render_metrics()：把延遲直方圖、轉換服務各入口的耗時與輸入大小、轉換器剖析資料
+  （converter.enable_profiling）、結果快取與即時編輯工作階段的統計組成一份文字。
+"""
+import threading
+from bisect import bisect_left
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{_escape(v)}"' for k, v in pairs) + '}'
+
+
+class LatencyHistogram:
+    """
+    以 (路由, 狀態碼) 分組的延遲直方圖；observe() 記錄一次請求的秒數。
+    換一組 buckets 也可以記錄其他數值（例如輸入字元數）。
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}  # (route, status) → [各區間次數..., 總秒數]
+        self._lock = threading.Lock()
+
+    def observe(self, route, status, seconds):
+        index = bisect_left(self.buckets, seconds)
+        key = (route, str(status))
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += seconds
+
+    def render(self, name, help_text='請求處理時間（秒）'):
+        lines = [f'# HELP {name} {help_text}', f'# TYPE {name} histogram']
+        with self._lock:
+            items = sorted((key, list(series)) for key, series in self._series.items())
+        for (route, status), series in items:
+            base = [('route', route), ('status', status)]
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_labels(base + [("le", repr(bound))])} {cumulative}')
+            cumulative += series[len(self.buckets)]
+            lines.append(f'{name}_bucket{_labels(base + [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{name}_sum{_labels(base)} {series[-1]}')
+            lines.append(f'{name}_count{_labels(base)} {cumulative}')
+        return lines
+
+
+def _profiler_lines(snapshot):
+    lines = [
+        '# HELP braille_stage_seconds_total 各轉換階段累計耗時',
+        '# TYPE braille_stage_seconds_total counter',
+    ]
+    for stage, entry in sorted(snapshot['stages'].items()):
+        lines.append(f'braille_stage_seconds_total{_labels([("stage", stage)])} {entry["seconds"]}')
+    lines += ['# HELP braille_stage_calls_total 各轉換階段執行次數',
+              '# TYPE braille_stage_calls_total counter']
+    for stage, entry in sorted(snapshot['stages'].items()):
+        lines.append(f'braille_stage_calls_total{_labels([("stage", stage)])} {entry["count"]}')
+
+    for field, help_text in (('attempts', '規則嘗試次數'), ('hits', '規則命中次數'),
+                             ('seconds', '規則累計耗時（秒）')):
+        name = f'braille_rule_{field}_total'
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for rule, entry in snapshot['rules'].items():
+            lines.append(f'{name}{_labels([("rule", rule)])} {entry[field]}')
+
+    lines += ['# HELP braille_converted_chars_total 主流程轉換過的點字字元數',
+              '# TYPE braille_converted_chars_total counter',
+              f'braille_converted_chars_total {snapshot["chars"]}']
+    return lines
+
+
+# 只會增加的統計欄位，以 counter 輸出；其餘視為 gauge
+_COUNTER_FIELDS = frozenset({'hits', 'misses', 'evictions'})
+
+
+def _stats_lines(prefix, help_prefix, stats):
+    lines = []
+    for field, value in stats.items():
+        if field in _COUNTER_FIELDS:
+            name, kind = f'{prefix}_{field}_total', 'counter'
+        else:
+            name, kind = f'{prefix}_{field}', 'gauge'
+        lines += [f'# HELP {name} {help_prefix} {field}', f'# TYPE {name} {kind}', f'{name} {value}']
+    return lines
+
+
+def render_metrics(latency=None, profiler=None, result_cache=None, live_sessions=None, service=None):
+    """組成 Prometheus 文字格式；沒有提供的部分略過。"""
+    lines = []
+    if latency is not None:
+        lines += latency.render('http_request_duration_seconds')
+    if service is not None:
+        lines += service.metrics_lines()
+    if profiler is not None:
+        lines += _profiler_lines(profiler.snapshot())
+    if result_cache is not None:
+        lines += _stats_lines('result_cache', '結果快取', result_cache.stats())
+    if live_sessions is not None:
+        lines += _stats_lines('live_sessions', '即時編輯工作階段', live_sessions.stats())
+    return '\n'.join(lines) + '\n'
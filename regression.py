@@ -0,0 +1,418 @@
+"""
+轉換結果的回歸檢查：修改轉換器（尤其是 ⠆、⠦、括號、er 的判斷）之後先跑這個。
+
+    python regression.py                      # 黃金語料 + 差異比對 + 效能門檻（沒有基準檔時失敗）
+    python regression.py --no-perf            # 不檢查效能（例如 CI 或還沒記錄基準的機器）
+    python regression.py --record-golden      # 以目前的實作重新產生黃金語料（確定行為改變是預期的才用）
+    python regression.py --record-baseline    # 在這台機器記錄效能基準
+
+- 黃金語料（golden_corpus.json）：各腔調的固定輸入與目前實作的輸出（或例外類型），逐筆比對。
+- 反向轉換往返：黃金語料的拼音轉成點字再轉回拼音必須完全相同；已知無法往返的輸入在語料中標記
+  round_trip: false（--record-golden 時重新判定）。
+- 差異比對：以 braille_data 的字母表隨機產生點字，其他轉換路徑（串流、平行、增量、多腔調、診斷）
+  必須與 convert_braille_to_pinyin 完全相同。
+- 前端引擎（static/braille_engine.js）：有安裝 node 時，以同一份黃金語料與隨機點字比對瀏覽器端的轉換結果。
+- 效能門檻：benchmark 的 medium 語料，字元/秒低於基準（perf_baseline.json）的 (1 - 容許值) 就失敗。
+  基準與機器有關，不放進版本控制；沒有基準檔時這一項失敗，不會默默通過。
+- 診斷成本：同一份語料開啟診斷（含 to_dict()）的字元/秒低於一般轉換的 (1 - 預算) 就失敗；
+  比的是同一台機器上的兩條路徑，不需要基準檔。
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+
+from benchmark import SIZES, build_corpus, run_case
+from converter import (
+    IncrementalDocument,
+    convert_all_dialects,
+    convert_braille_to_pinyin,
+    convert_parallel,
+    convert_pinyin_to_braille,
+    convert_stream,
+    convert_with_diagnostics,
+    dialect_map,
+    get_dialect_tables,
+    tables_version,
+)
+from table_bundle import build_bundle
+
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'golden_corpus.json')
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'perf_baseline.json')
+CLIENT_ENGINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'braille_engine.js')
+
+# 人工挑選的歧義寫法，每個腔調都會收進黃金語料
+EDGE_CASES = (
+    '⠅⠪⠆⠀⠃⠁⠂',        # ⠆ 後接點字空格：分號或調號
+    '⠅⠼⠔⠆⠀⠅⠁⠂',      # rushio 後的分號
+    '⠆⠁⠂ ⠆⠪⠆',         # ⠆ 當 bb / 調號
+    '⠅⠁⠆ ⠆ ⠅⠁',        # 單獨的 ⠆
+    '⠦⠅⠁⠂⠴',           # ⠦ 當「「」
+    '⠅⠁⠂⠦ ⠅⠁⠂ ⠦',      # ⠦ 當「？」
+    '⠐⠣⠅⠁⠂⠐⠜ ⠨⠣⠅⠁⠨⠜',  # 括號（也是母音 iem / ien 的鍵）
+    '⠠⠦⠅⠁⠂⠠⠴',         # 『』與鼻化 ⠠
+    '⠗⠂ ⠗⠆ ⠅⠗⠂ ⠗⠂⠗',   # er 與 r/rh
+    '⠵⠍⠂⠂ ⠉⠝⠆⠀⠘⠣',      # 特殊字後接標點
+    '⠠⠁⠂ ⠠⠅⠁ ⠠',        # 鼻化
+    '⠲⠲⠲ ⠲⠴ ⠐⠠⠤ ⠐⠂',    # 多字標點
+    '⠅⠁\n⠠⠁⠂\n\n ⠅⠁⠤⠂',  # 換行、⠤
+)
+
+# 每個腔調的黃金語料筆數：隨機點字（短）與 benchmark 語料段落（長）
+GOLDEN_RANDOM_CASES = 40
+GOLDEN_CORPUS_CASES = 6
+
+
+def braille_alphabet(dialect):
+    """此腔調點字表中出現的所有鍵（含多字鍵），加上空白、點字空格與換行。"""
+    tables = get_dialect_tables(dialect)
+    keys = set()
+    for mapping in (tables.consonants, tables.vowels, tables.tones, tables.rushio,
+                    tables.special_cases, tables.punctuations):
+        keys.update(k for k in mapping if k)
+    return sorted(keys) + [' ', ' ', '⠀', '\n', '⠆⠀', '⠤']
+
+
+def random_braille(dialect, rnd, max_tokens=40):
+    """從字母表隨機取鍵串成點字（不保證是合理的客語，用來找各轉換路徑的差異）。"""
+    alphabet = braille_alphabet(dialect)
+    return ''.join(rnd.choice(alphabet) for _ in range(rnd.randint(0, max_tokens)))
+
+
+def _run(convert, braille_text, dialect):
+    # 回傳輸出字串，或例外的類型名稱（基準實作對少數輸入會拋出例外，也是要維持的行為）
+    try:
+        return convert(braille_text, dialect)
+    except Exception as e:
+        return {'error': type(e).__name__}
+
+
+# ---------- 黃金語料 ----------
+
+def record_golden(path=GOLDEN_PATH, seed=0):
+    rnd = random.Random(seed)
+    corpus = {'tables_version': tables_version(), 'dialects': {}}
+    for dialect in dialect_map:
+        inputs = list(EDGE_CASES)
+        inputs += [random_braille(dialect, rnd) for _ in range(GOLDEN_RANDOM_CASES)]
+        inputs += [build_corpus(dialect, 300, k) for k in range(GOLDEN_CORPUS_CASES)]
+        cases = corpus['dialects'][dialect] = []
+        for text in inputs:
+            case = {'braille': text, 'expected': _run(convert_braille_to_pinyin, text, dialect)}
+            # 已知無法往返的輸入記在語料裡，往返檢查只對其他輸入要求完全一致
+            if isinstance(case['expected'], str) and _round_trip(case['expected'], dialect) != case['expected']:
+                case['round_trip'] = False
+            cases.append(case)
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(corpus, f, ensure_ascii=False, indent=1)
+        f.write('\n')
+    return corpus
+
+
+def check_golden(path=GOLDEN_PATH, convert=convert_braille_to_pinyin):
+    """逐筆比對黃金語料，回傳不一致的 [(腔調, 點字, 預期, 實際)]。"""
+    with open(path, encoding='utf-8') as f:
+        corpus = json.load(f)
+    if corpus.get('tables_version') != tables_version():
+        print('⚠️ braille_data 已修改，黃金語料是以舊點字表產生的；'
+              '確認輸出改變符合預期後以 --record-golden 重新產生', file=sys.stderr)
+    failures = []
+    for dialect, cases in corpus['dialects'].items():
+        for case in cases:
+            got = _run(convert, case['braille'], dialect)
+            if got != case['expected']:
+                failures.append((dialect, case['braille'], case['expected'], got))
+    return failures
+
+
+def _round_trip(pinyin, dialect):
+    # 拼音 → 點字 → 拼音
+    return _run(lambda text, d: convert_braille_to_pinyin(convert_pinyin_to_braille(text, d), d), pinyin, dialect)
+
+
+def check_round_trip(path=GOLDEN_PATH):
+    """
+    黃金語料的每個預期拼音經反向轉換再轉回拼音，必須與原拼音完全相同；
+    標記 round_trip: false 的輸入（隨機點字裡的歧義寫法）不檢查。
+    回傳 (不一致的 [(腔調, 拼音, 預期, 實際)], 標記為無法往返、現在卻能往返的筆數)。
+    """
+    with open(path, encoding='utf-8') as f:
+        corpus = json.load(f)
+    failures = []
+    fixed = 0
+    for dialect, cases in corpus['dialects'].items():
+        for case in cases:
+            pinyin = case['expected']
+            if not isinstance(pinyin, str):
+                continue
+            got = _round_trip(pinyin, dialect)
+            if case.get('round_trip', True):
+                if got != pinyin:
+                    failures.append((dialect, pinyin, pinyin, got))
+            elif got == pinyin:
+                fixed += 1
+    return failures, fixed
+
+
+# ---------- 差異比對 ----------
+
+def _via_stream(braille_text, dialect):
+    return ''.join(convert_stream([braille_text[i:i + 7] for i in range(0, len(braille_text), 7)], dialect))
+
+
+def _via_parallel(braille_text, dialect):
+    return convert_parallel(braille_text, dialect, workers=1, segment_chars=16,
+                            executor=_InlineExecutor())
+
+
+def _via_incremental(braille_text, dialect):
+    # 從一半開始，分兩次插入其餘內容
+    half = len(braille_text) // 2
+    document = IncrementalDocument(braille_text[:half], dialect, segment_chars=8)
+    document.apply_edit(half, 0, braille_text[half:])
+    return document.output
+
+
+def _via_all_dialects(braille_text, dialect):
+    result = convert_all_dialects(braille_text, [dialect, 'hailuk', 'siian2'])[dialect]
+    if result.startswith('⚠️ 轉換失敗：'):
+        # convert_all_dialects 把例外轉成訊息，原本的例外類型已經看不到
+        raise RuntimeError(result)
+    return result
+
+
+class _InlineExecutor:
+    # 在同一個行程內執行 convert_parallel 的分段（只為了檢查切段與接回的邏輯）
+    def map(self, fn, iterable):
+        return map(fn, iterable)
+
+
+def _via_diagnostics(braille_text, dialect):
+    return convert_with_diagnostics(braille_text, dialect).text
+
+
+ENGINES = {
+    'convert_stream': _via_stream,
+    'convert_parallel': _via_parallel,
+    'IncrementalDocument': _via_incremental,
+    'convert_all_dialects': _via_all_dialects,
+    'convert_with_diagnostics': _via_diagnostics,
+}
+
+
+def differential(candidate, reference=convert_braille_to_pinyin, dialects=None, cases=300, seed=0):
+    """
+    以隨機點字比較 candidate 與 reference（兩者都是 (點字, 腔調) → 拼音），
+    回傳不一致的 [(腔調, 點字, 預期, 實際)]；兩邊都拋出例外時視為一致。
+    """
+    rnd = random.Random(seed)
+    failures = []
+    for dialect in dialects or dialect_map:
+        for _ in range(cases):
+            text = random_braille(dialect, rnd)
+            expected = _run(reference, text, dialect)
+            got = _run(candidate, text, dialect)
+            if got != expected and not (isinstance(got, dict) and isinstance(expected, dict)):
+                failures.append((dialect, text, expected, got))
+    return failures
+
+
+# ---------- 前端引擎 ----------
+
+# 從標準輸入讀 {"files": 點字表打包內容, "cases": [[腔調, 點字], ...]}，
+# 輸出每筆的拼音或 {"error": 例外名稱}
+_CLIENT_RUNNER = '''
+const engine = require(process.argv[1]);
+let input = '';
+process.stdin.setEncoding('utf8');
+process.stdin.on('data', chunk => { input += chunk; });
+process.stdin.on('end', () => {
+  const { files, cases } = JSON.parse(input);
+  const converter = engine.create(files);
+  const results = cases.map(([dialect, braille]) => {
+    try {
+      return converter.convert(braille, dialect);
+    } catch (e) {
+      return { error: e.name };
+    }
+  });
+  process.stdout.write(JSON.stringify(results));
+});
+'''
+
+
+def run_client_engine(cases, node='node'):
+    """以 node 執行前端引擎，cases 為 [(腔調, 點字)]；回傳與 cases 同順序的輸出。"""
+    bundle = json.loads(build_bundle().bodies['identity'])
+    payload = json.dumps({'files': bundle['files'], 'cases': cases}, ensure_ascii=False)
+    completed = subprocess.run([node, '-e', _CLIENT_RUNNER, CLIENT_ENGINE_PATH],
+                               input=payload.encode('utf-8'), capture_output=True, check=True)
+    return json.loads(completed.stdout)
+
+
+def check_client_engine(path=GOLDEN_PATH, cases=300, seed=0, node='node'):
+    """
+    前端引擎與黃金語料、以及與 convert_braille_to_pinyin 在隨機點字上的比對，
+    回傳不一致的 [(腔調, 點字, 預期, 實際)]；兩邊都拋出例外時視為一致（例外類型名稱不一定相同）。
+    """
+    with open(path, encoding='utf-8') as f:
+        corpus = json.load(f)
+    expected = []
+    for dialect, golden in corpus['dialects'].items():
+        expected += [(dialect, case['braille'], case['expected']) for case in golden]
+    rnd = random.Random(seed)
+    for dialect in dialect_map:
+        for _ in range(cases):
+            text = random_braille(dialect, rnd)
+            expected.append((dialect, text, _run(convert_braille_to_pinyin, text, dialect)))
+
+    results = run_client_engine([[dialect, text] for dialect, text, _ in expected], node)
+    return [
+        (dialect, text, want, got)
+        for (dialect, text, want), got in zip(expected, results)
+        if got != want and not (isinstance(got, dict) and isinstance(want, dict))
+    ]
+
+
+# ---------- 效能門檻 ----------
+
+def measure(dialects=None, seed=0, rounds=3):
+    """各腔調 medium 語料的字元/秒；取幾輪中最快的一次，減少機器負載造成的誤判。"""
+    size, repeat = SIZES['medium']
+    return {
+        d: max(run_case(d, 'medium', size, repeat, seed)['chars_per_sec'] for _ in range(rounds))
+        for d in dialects or dialect_map
+    }
+
+
+def check_perf(baseline, tolerance):
+    """回傳低於門檻的 [(腔調, 基準字元/秒, 目前字元/秒)]。"""
+    current = measure(list(baseline))
+    return [(d, baseline[d], current[d]) for d in baseline
+            if current[d] < baseline[d] * (1 - tolerance)]
+
+
+def _elapsed(convert, braille_text, dialect):
+    started = time.perf_counter()
+    convert(braille_text, dialect)
+    return time.perf_counter() - started
+
+
+def _diagnostics_dict(braille_text, dialect):
+    return convert_with_diagnostics(braille_text, dialect).to_dict()
+
+
+def measure_diagnostics_overhead(dialects=None, seed=0, size=5000, rounds=100):
+    """
+    各腔調開啟診斷（含 to_dict()）時的字元/秒相對一般轉換的比例。兩者輪流執行、每輪算一次比例後取中位數：
+    同一輪的兩次執行受機器負載的影響相近，偶發的延遲也不會左右結果。
+    """
+    ratios = {}
+    for d in dialects or dialect_map:
+        text = build_corpus(d, size, seed)
+        samples = []
+        for k in range(rounds):
+            # 每輪交換先後，不讓固定先跑的一方吃到快取的好處
+            if k % 2:
+                diagnosed = _elapsed(_diagnostics_dict, text, d)
+                plain = _elapsed(convert_braille_to_pinyin, text, d)
+            else:
+                plain = _elapsed(convert_braille_to_pinyin, text, d)
+                diagnosed = _elapsed(_diagnostics_dict, text, d)
+            samples.append(plain / diagnosed)
+        ratios[d] = statistics.median(samples)
+    return ratios
+
+
+def check_diagnostics_overhead(budget):
+    """
+    診斷模式的吞吐量低於一般轉換 (1 - 預算) 時回傳各腔調的 {腔調: 比例}，否則回傳空 dict。
+    診斷的記錄方式與腔調無關，以各腔調比例的中位數判斷，單一腔調受機器雜訊影響的偏差不會造成誤判。
+    """
+    ratios = measure_diagnostics_overhead()
+    return ratios if statistics.median(ratios.values()) < 1 - budget else {}
+
+
+def _report(title, failures, limit=5):
+    if not failures:
+        print(f'✓ {title}')
+        return 0
+    print(f'✗ {title}：{len(failures)} 筆不一致')
+    for dialect, text, expected, got in failures[:limit]:
+        print(f'  [{dialect}] {text!r}\n    預期 {expected!r}\n    實際 {got!r}')
+    return 1
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='轉換器回歸檢查（黃金語料、差異比對、效能門檻）')
+    parser.add_argument('--record-golden', action='store_true', help='以目前實作重新產生黃金語料')
+    parser.add_argument('--record-baseline', action='store_true', help='記錄這台機器的效能基準')
+    parser.add_argument('--cases', type=int, default=300, help='差異比對每個腔調的隨機筆數')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='效能可接受的下降比例（預設 0.2，即低於基準 80%% 就失敗）')
+    parser.add_argument('--diagnostics-budget', type=float, default=0.2,
+                        help='開啟診斷可接受的吞吐量下降比例（預設 0.2）')
+    parser.add_argument('--no-perf', action='store_true', help='略過效能門檻')
+    args = parser.parse_args(argv)
+
+    if args.record_golden:
+        corpus = record_golden(seed=args.seed)
+        total = sum(len(cases) for cases in corpus['dialects'].values())
+        print(f'已寫入 {GOLDEN_PATH}（{total} 筆）')
+        return 0
+    if args.record_baseline:
+        baseline = measure(seed=args.seed)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+        print(f'已寫入 {BASELINE_PATH}')
+        return 0
+
+    status = _report('黃金語料', check_golden())
+    failures, fixed = check_round_trip()
+    status |= _report('反向轉換往返', failures)
+    if fixed:
+        print(f'  （{fixed} 筆標記為無法往返的輸入現在可以往返；確認後以 --record-golden 更新標記）')
+    for name, engine in ENGINES.items():
+        status |= _report(f'差異比對 {name}', differential(engine, cases=args.cases, seed=args.seed))
+    node = shutil.which('node')
+    if node:
+        status |= _report('前端引擎', check_client_engine(cases=args.cases, seed=args.seed, node=node))
+    else:
+        print('（找不到 node，略過前端引擎比對）')
+
+    if args.no_perf:
+        return status
+    costly = check_diagnostics_overhead(args.diagnostics_budget)
+    if costly:
+        status = 1
+        print(f'✗ 診斷成本：開啟診斷後的吞吐量低於一般轉換的 {1 - args.diagnostics_budget:.0%}')
+        for dialect, ratio in costly.items():
+            print(f'  {dialect:10} {ratio:.0%}')
+    else:
+        print('✓ 診斷成本')
+    if not os.path.exists(BASELINE_PATH):
+        # 沒有基準就無從判斷，不能當成通過；不需要效能門檻時明確加上 --no-perf
+        print(f'✗ 效能門檻：沒有 {os.path.basename(BASELINE_PATH)}，'
+              f'請先以 --record-baseline 記錄，或加上 --no-perf 略過')
+        return 1
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+    slow = check_perf(baseline, args.tolerance)
+    if slow:
+        status = 1
+        print(f'✗ 效能門檻：{len(slow)} 個腔調低於基準的 {1 - args.tolerance:.0%}')
+        for dialect, before, now in slow:
+            print(f'  {dialect:10} {before:>12,.0f} → {now:>12,.0f} 字元/秒')
+    else:
+        print('✓ 效能門檻')
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,178 @@
+"""
+轉換結果快取：同樣的（腔調、點字內容、點字表版本）直接回傳上次的拼音。
+
+- ResultCache：行程內 LRU，同時限制筆數與總位元組數，記錄命中/未命中次數。
+- FileResultCache：以目錄存放結果的共用後端，同一台機器上的多個 gunicorn worker 可共用。
+
+快取鍵含 converter.tables_version()，修改 braille_data 並 reload_tables() 後舊結果自然失效。
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+
+from converter import convert_braille_to_pinyin, get_dialect_tables, tables_version
+
+
+def cache_key(braille_text, dialect):
+    """(腔調, 點字內容雜湊, 點字表版本)"""
+    digest = hashlib.sha256(braille_text.encode('utf-8')).hexdigest()
+    return dialect, digest, tables_version()
+
+
+class ResultCache:
+    """
+    行程內的 LRU 快取。超過 max_entries 筆或 max_bytes（結果的 UTF-8 長度總和）時
+    淘汰最久沒用到的項目；可再接一個共用後端（例如 FileResultCache），本地未命中時查詢。
+    """
+
+    def __init__(self, max_entries=1024, max_bytes=16 * 1024 * 1024, shared=None):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.shared = shared
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+
+        if self.shared is not None:
+            value = self.shared.get(key)
+            if value is not None:
+                self._store(key, value)
+                with self._lock:
+                    self.hits += 1
+                return value
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, value):
+        self._store(key, value)
+        if self.shared is not None:
+            self.shared.put(key, value)
+
+    def _store(self, key, value):
+        size = len(value.encode('utf-8'))
+        if size > self.max_bytes:
+            return  # 單筆就超過上限，不快取
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[1]
+            self._entries[key] = (value, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                _, (_, evicted_size) = self._entries.popitem(last=False)
+                self._bytes -= evicted_size
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+            }
+
+
+class FileResultCache:
+    """
+    以目錄存放結果的共用快取（每個結果一個檔案，原子寫入）。
+    總大小超過 max_bytes 時，依最後修改時間刪掉最舊的檔案。
+    """
+
+    PRUNE_EVERY = 64
+
+    def __init__(self, directory, max_bytes=256 * 1024 * 1024):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._puts = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        name = hashlib.sha256('\0'.join(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + '.txt')
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with open(path, encoding='utf-8') as f:
+                value = f.read()
+        except OSError:
+            return None
+        try:
+            os.utime(path)  # 讓常用的結果不被當成最舊的刪掉
+        except OSError:
+            pass
+        return value
+
+    def put(self, key, value):
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        try:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(value)
+            os.replace(tmp_path, path)
+        except OSError:
+            return
+        with self._lock:
+            self._puts += 1
+            prune = self._puts % self.PRUNE_EVERY == 0
+        if prune:
+            self.prune()
+
+    def prune(self):
+        files = []
+        total = 0
+        with os.scandir(self.directory) as it:
+            for entry in it:
+                if not entry.name.endswith('.txt'):
+                    continue
+                try:
+                    st = entry.stat()
+                except OSError:
+                    continue
+                files.append((st.st_mtime, st.st_size, entry.path))
+                total += st.st_size
+        files.sort()
+        for _, size, path in files:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+
+
+def cached_convert(braille_text, dialect, cache):
+    """
+    先查快取，未命中才呼叫 convert_braille_to_pinyin 並存入。無此腔調的錯誤訊息不快取。
+    """
+    if get_dialect_tables(dialect) is None:
+        return convert_braille_to_pinyin(braille_text, dialect)
+    key = cache_key(braille_text, dialect)
+    result = cache.get(key)
+    if result is None:
+        result = convert_braille_to_pinyin(braille_text, dialect)
+        cache.put(key, result)
+    return result
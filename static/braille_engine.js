@@ -0,0 +1,605 @@
+// 瀏覽器端的點字 → 拼音轉換引擎：converter.py 主流程的逐條移植。
+//
+// 點字表來自同一份打包檔（/braille_data/bundle.<digest>.json 的 files），依 dialects.json 建立
+// 各腔調的查表與前綴樹，規則順序、首字分派、⠆ / ⠦ 的脈絡判斷與後處理都和伺服器相同，
+// 所以一般長度的文字可以直接在頁面上轉換，不必送到伺服器。
+// 修改 converter.py 的規則時要同步修改這裡；python regression.py 會用 node 以黃金語料與
+// 隨機點字比對兩邊的輸出。
+//
+//   const engine = BrailleEngine.create(files);
+//   engine.convert('⠅⠁⠂', 'siian2');
+//
+// 在瀏覽器中是全域的 BrailleEngine；在 node 中以 require() 取得。
+(function (root, factory) {
+  if (typeof module === 'object' && module.exports) {
+    module.exports = factory();
+  } else {
+    root.BrailleEngine = factory();
+  }
+}(typeof self !== 'undefined' ? self : this, function () {
+  'use strict';
+
+  const UNKNOWN_DIALECT_MESSAGE = '⚠️ 無此腔調配置';
+
+  // Python str.isspace() 的空白字元（JS 的 \s 少了 \x1c-\x1f、\x85，多了 ﻿）
+  const PY_SPACE = '\\t\\n\\v\\f\\r \\x1c-\\x1f\\x85\\xa0\\u1680\\u2000-\\u200a\\u2028\\u2029\\u202f\\u205f\\u3000';
+  const SPACE_CHAR_RE = new RegExp(`[${PY_SPACE}]`);
+
+  // 查表失敗時與 Python 的 dict[key] 一樣拋出 KeyError（例如 siian2 沒有子音 ⠆）
+  class KeyError extends Error {
+    constructor(key) {
+      super(JSON.stringify(key));
+      this.name = 'KeyError';
+    }
+  }
+
+  function has(map, key) {
+    return Object.prototype.hasOwnProperty.call(map, key);
+  }
+
+  function lookup(map, key) {
+    if (!has(map, key)) throw new KeyError(key);
+    return map[key];
+  }
+
+  // 不用 /[...]+$/：它在不落在結尾的長空白上會逐位置重試，是平方時間
+  function rstrip(text) {
+    let end = text.length;
+    while (end > 0 && SPACE_CHAR_RE.test(text[end - 1])) end--;
+    return text.slice(0, end);
+  }
+
+  // ---------- 前綴樹（同 converter.PrefixTrie） ----------
+
+  class PrefixTrie {
+    constructor(keys) {
+      // 依長度由長到短插入（穩定排序）：去尾空白後撞鍵時，保留先出現（較長）的原始鍵
+      const ordered = [...keys].filter(k => k).sort((a, b) => b.length - a.length);
+      this.root = PrefixTrie.build(ordered, false);
+      this.strippedRoot = ordered.some(k => k !== rstrip(k)) ? PrefixTrie.build(ordered, true) : this.root;
+    }
+
+    static build(keys, strip) {
+      const root = new Map();
+      for (const key of keys) {
+        const path = strip ? rstrip(key) : key;
+        if (!path) continue;
+        let node = root;
+        for (const ch of path.split('')) {
+          let child = node.get(ch);
+          if (child === undefined) {
+            child = new Map();
+            node.set(ch, child);
+          }
+          node = child;
+        }
+        if (!node.has('')) node.set('', key);
+      }
+      return root;
+    }
+
+    // 回傳 [匹配長度, 原始鍵]，無匹配則 [0, null]
+    match(text, start, allowTrailingSpace = false) {
+      let node = allowTrailingSpace ? this.strippedRoot : this.root;
+      let bestLen = 0;
+      let bestKey = null;
+      for (let i = start; i < text.length; i++) {
+        node = node.get(text[i]);
+        if (node === undefined) break;
+        const key = node.get('');
+        if (key !== undefined) {
+          bestLen = i + 1 - start;
+          bestKey = key;
+        }
+      }
+      return [bestLen, bestKey];
+    }
+  }
+
+  function firstChars(keys) {
+    const chars = new Set();
+    for (const k of keys) {
+      if (k) chars.add(k[0]);
+    }
+    return chars;
+  }
+
+  function eatSpaces(text, i) {
+    let count = 0;
+    while (i + count < text.length && ' ⠀\n\r'.includes(text[i + count])) count++;
+    return count;
+  }
+
+  // ---------- 腔調點字表（同 converter._build_dialect_tables） ----------
+
+  const OPENING_TARGETS = new Set(['『', '【', '（']);
+  const CLOSING_TARGETS = new Set(['】']);
+  const HARD_OPEN_MAP = { '⠠⠦': '『', '⠨⠣': '【', '⠐⠣': '（' };
+  const HARD_OPEN_TRIE = new PrefixTrie(Object.keys(HARD_OPEN_MAP));
+  const BREAK_BEFORE_OPEN = ' ⠀\n\r';
+  const II_AFTER = '⠵⠉⠎';
+
+  function rushioValue(entry, key) {
+    // 巢狀格式 { "default": "ab", "tapu": "abˋ", ... } 依腔調取值，取不到時為 null
+    if (entry !== null && typeof entry === 'object') {
+      return has(entry, key) ? entry[key] : (has(entry, 'default') ? entry.default : null);
+    }
+    return entry;
+  }
+
+  function buildTables(files, code, spec) {
+    const punctuations = files['dot_punctuation.json'];
+    const rushio = files['dot_rushio_syllables.json'];
+    const tables = {
+      dialect: code,
+      name: spec.name,
+      vowels: files['dot_vowels.json'],
+      rushio,
+      specialCases: files['dot_special.json'],
+      punctuations,
+      consonants: files[spec.consonants],
+      tones: files[spec.tones],
+      rushioValues: {},
+    };
+    const rushioKey = spec.rushio || 'default';
+    for (const [k, v] of Object.entries(rushio)) {
+      tables.rushioValues[k] = rushioValue(v, rushioKey);
+    }
+    tables.rushioKeys = Object.keys(rushio);
+    tables.tonesKeys = Object.keys(tables.tones);
+    tables.tonesKeySet = new Set(tables.tonesKeys);
+    const punctuationEntries = Object.entries(punctuations);
+    tables.openingBrailleSet = new Set(punctuationEntries.filter(([, v]) => OPENING_TARGETS.has(v)).map(([k]) => k));
+    tables.closingBrailleSet = new Set(punctuationEntries.filter(([, v]) => CLOSING_TARGETS.has(v)).map(([k]) => k));
+
+    tables.specialTrie = new PrefixTrie(Object.keys(tables.specialCases));
+    tables.consonantsTrie = new PrefixTrie(Object.keys(tables.consonants));
+    tables.vowelsTrie = new PrefixTrie(Object.keys(tables.vowels));
+    tables.rushioTrie = new PrefixTrie(tables.rushioKeys);
+    tables.tonesTrie = new PrefixTrie(tables.tonesKeys);
+    tables.punctuationTrie = new PrefixTrie(Object.keys(punctuations));
+    tables.closingTrie = new PrefixTrie(tables.closingBrailleSet);
+    return tables;
+  }
+
+  // ---------- 脈絡索引（同 converter.TextIndex，只把 ASCII 空白當空白） ----------
+
+  function keyEnds(text, keys) {
+    const ends = new Uint8Array(text.length + 1);
+    for (const key of keys) {
+      if (!key) continue;
+      for (let p = text.indexOf(key); p !== -1; p = text.indexOf(key, p + 1)) {
+        ends[p + key.length] = 1;
+      }
+    }
+    return ends;
+  }
+
+  class TextIndex {
+    constructor(text, tables) {
+      const n = text.length;
+      this.text = text;
+      // nextNs[i]：i 之後（含 i）第一個非 ' ' 的位置；prevNs[i]：i 之前最後一個非 ' ' 的位置（-1 表示沒有）
+      this.nextNs = new Int32Array(n + 1);
+      this.prevNs = new Int32Array(n + 1);
+      this.nextNs[n] = n;
+      for (let i = n - 1; i >= 0; i--) {
+        this.nextNs[i] = text[i] === ' ' ? this.nextNs[i + 1] : i;
+      }
+      this.prevNs[0] = -1;
+      for (let i = 0; i < n; i++) {
+        this.prevNs[i + 1] = text[i] === ' ' ? this.prevNs[i] : i;
+      }
+      this.rushioEnd = keyEnds(text, tables.rushioKeys);
+      this.toneEnd = keyEnds(text, tables.tonesKeys);
+    }
+
+    peekNonspace(pos) {
+      const j = pos < this.text.length ? this.nextNs[pos] : pos;
+      return j < this.text.length ? this.text[j] : '';
+    }
+
+    prevNonspace(pos) {
+      const j = this.prevNs[Math.min(pos, this.text.length)];
+      return j >= 0 ? this.text[j] : '';
+    }
+
+    endsWithRushio(pos) {
+      return this.rushioEnd[pos] === 1;
+    }
+
+    endsWithTone(pos) {
+      return this.toneEnd[pos] === 1;
+    }
+  }
+
+  // ---------- 組裝中的音節（同 converter.Syllable） ----------
+
+  class Syllable {
+    constructor() {
+      this.reset();
+    }
+
+    reset() {
+      this.initial = '';
+      this.vowel = '';
+      this.rushio = '';
+      this.tone = '';
+      this.nasal = false;
+    }
+
+    hasContent() {
+      return Boolean(this.initial || this.vowel || this.rushio || this.tone);
+    }
+
+    assemble() {
+      let text = this.initial + this.vowel + (this.nasal ? 'nn' : '') + this.rushio + this.tone;
+      if (this.rushio === '' && this.tone === '') text += '_';
+      return text;
+    }
+  }
+
+  // ---------- 單次轉換的狀態（同 converter._Run） ----------
+
+  class Run {
+    constructor(text, tables) {
+      this.text = text;
+      this.length = text.length;
+      this.tables = tables;
+      this.index = new TextIndex(text, tables);
+      this.syllable = new Syllable();
+      this.result = [];
+    }
+
+    flush() {
+      if (this.syllable.hasContent()) {
+        this.result.push(this.syllable.assemble());
+        this.syllable.reset();
+      }
+    }
+
+    finishSyllable() {
+      this.result.push(this.syllable.assemble());
+      this.syllable.reset();
+    }
+
+    emitPunctuation(key, i, keyLen, eatAfterSemicolon = true) {
+      let mark;
+      if (key === '⠦') {
+        const tones = this.tables.tones;
+        if (has(tones, this.index.prevNonspace(i))) {
+          mark = '？';
+        } else {
+          const nextChar = this.index.peekNonspace(i + keyLen);
+          mark = !nextChar || (!has(tones, nextChar) && nextChar !== ' ') ? '「' : '？';
+        }
+      } else {
+        mark = lookup(this.tables.punctuations, key);
+      }
+      this.result.push(mark);
+      i += keyLen;
+      if (eatAfterSemicolon && mark === '；') i += eatSpaces(this.text, i);
+      return i;
+    }
+
+    contextPunctuation(i) {
+      // 同 converter._match_punctuation_with_context
+      const { text, tables, index } = this;
+      const [punctLen, punctMatch] = tables.punctuationTrie.match(text, i, true);
+      if (punctLen === 0 || punctMatch === null) return [0, null];
+
+      if (punctMatch === '⠆') {
+        const nextIsBspace = i + punctLen < text.length && text[i + punctLen] === '⠀';
+        if (nextIsBspace && (index.endsWithRushio(i) || index.endsWithTone(i))) return [punctLen, punctMatch];
+        return [0, null];
+      }
+
+      if (tables.openingBrailleSet.has(punctMatch) && !this.syllable.hasContent()) {
+        const prevCh = index.prevNonspace(i);
+        if (prevCh === '' || prevCh === ' ' || has(tables.punctuations, prevCh)) {
+          const nextCh = index.peekNonspace(i + punctLen);
+          if (!nextCh || !tables.tonesKeySet.has(nextCh)) return [punctLen, punctMatch];
+        }
+      }
+
+      if (tables.closingBrailleSet.has(punctMatch)) {
+        return this.syllable.hasContent() ? [0, null] : [punctLen, punctMatch];
+      }
+
+      const prevCh = index.prevNonspace(i);
+      const prevOk = prevCh === '' || prevCh === ' ' || index.endsWithTone(i) || index.endsWithRushio(i);
+      if (!prevOk) return [0, null];
+
+      const nextCh = index.peekNonspace(i + punctLen);
+      if (nextCh && tables.tonesKeySet.has(nextCh)) return [0, null];
+
+      return [punctLen, punctMatch];
+    }
+  }
+
+  // ---------- 規則（順序與 converter._RULES 相同；不適用時回傳 null） ----------
+
+  function ruleOpenBracket(run, i) {
+    if (i && !BREAK_BEFORE_OPEN.includes(run.text[i - 1])) return null;
+    const [keyLen, key] = HARD_OPEN_TRIE.match(run.text, i);
+    if (key === null) return null;
+    run.flush();
+    run.result.push(has(run.tables.punctuations, key) ? run.tables.punctuations[key] : HARD_OPEN_MAP[key]);
+    return i + keyLen;
+  }
+
+  function ruleCloseBracket(run, i) {
+    const [keyLen, key] = run.tables.closingTrie.match(run.text, i);
+    if (key === null) return null;
+    run.flush();
+    run.result.push(lookup(run.tables.punctuations, key));
+    return i + keyLen;
+  }
+
+  function ruleSemicolonBbTone(run, i) {
+    const { text, syllable, tables } = run;
+    const nextIsBspace = i + 1 < run.length && text[i + 1] === '⠀';
+    const prevIsRushioOrTone = run.index.endsWithRushio(i) || run.index.endsWithTone(i);
+
+    // 1) 分號：前面是 rushio 或 tone，且後面是點字空格
+    if (nextIsBspace && prevIsRushioOrTone) {
+      run.flush();
+      run.result.push('；');
+      return i + 2;
+    }
+
+    // 2) 子音 bb：音節起始，且後面立刻能匹配母音鍵
+    if (!syllable.hasContent() && tables.vowelsTrie.match(text, i + 1)[0] > 0) {
+      syllable.initial = lookup(tables.consonants, '⠆');
+      return i + 1;
+    }
+
+    // 3) 調號 ˇ：音節已開、尚未有 tone
+    if (!prevIsRushioOrTone && syllable.hasContent() && !syllable.tone) {
+      syllable.tone = lookup(tables.tones, '⠆');
+      return i + 1;
+    }
+    return null;
+  }
+
+  function rulePunctuation(run, i) {
+    const [keyLen, key] = run.contextPunctuation(i);
+    if (keyLen === 0) return null;
+    run.flush();
+    return run.emitPunctuation(key, i, keyLen);
+  }
+
+  function ruleNasal(run, i) {
+    if (run.syllable.hasContent()) return null;
+    run.syllable.nasal = true;
+    return i + 1;
+  }
+
+  function ruleEr(run, i) {
+    const { text, length } = run;
+    const tones = run.tables.tones;
+    if (!(
+      (i === 0 || text[i - 1] === ' ') &&
+      (i + 1 < length && has(tones, text[i + 1])) &&
+      (i + 2 === length || text[i + 2] === ' ')
+    )) return null;
+    run.syllable.vowel = 'er';
+    run.syllable.tone = tones[text[i + 1]];
+    run.finishSyllable();
+    return i + 2;
+  }
+
+  function ruleSpecial(run, i) {
+    const { tables, text } = run;
+    const [specialLen, specialKey] = tables.specialTrie.match(text, i);
+    if (specialLen === 0) return null;
+    const syllable = run.syllable;
+    syllable.vowel = tables.specialCases[specialKey];
+    i += specialLen;
+
+    if (i < run.length) {
+      const [toneLen, toneKey] = tables.tonesTrie.match(text, i);
+      if (toneLen > 0) {
+        syllable.tone = tables.tones[toneKey];
+        i += toneLen;
+        if (i < run.length) {
+          const [pLen, pKey] = tables.punctuationTrie.match(text, i, true);
+          if (pLen > 0 && pKey !== null) {
+            run.finishSyllable();
+            return run.emitPunctuation(pKey, i, pLen);
+          }
+        }
+      }
+    }
+    run.finishSyllable();
+    return i;
+  }
+
+  function ruleRushio(run, i) {
+    const tables = run.tables;
+    const [rushioLen, rushioKey] = tables.rushioTrie.match(run.text, i);
+    if (rushioLen === 0) return null;
+    const value = tables.rushioValues[rushioKey];
+    if (!value) return null;
+    run.syllable.rushio = value;
+    i += rushioLen;
+
+    if (i < run.length) {
+      const [pLen, pKey] = run.contextPunctuation(i);
+      if (pLen > 0) {
+        run.finishSyllable();
+        return run.emitPunctuation(pKey, i, pLen, false);
+      }
+    }
+    run.finishSyllable();
+    return i;
+  }
+
+  function ruleConsonant(run, i) {
+    if (run.syllable.hasContent()) return null;
+    const tables = run.tables;
+    const [consLen, consKey] = tables.consonantsTrie.match(run.text, i);
+    if (consLen === 0) return null;
+    if (consKey === '⠆') {
+      if (i + consLen >= run.length || tables.vowelsTrie.match(run.text, i + consLen)[0] === 0) return null;
+    }
+    run.syllable.initial = tables.consonants[consKey];
+    return i + consLen;
+  }
+
+  function ruleVowel(run, i) {
+    const { tables, text, length } = run;
+    const [vowelLen, vowelKey] = tables.vowelsTrie.match(text, i);
+    if (vowelLen === 0) return null;
+    const syllable = run.syllable;
+    if (vowelKey === '⠔') {
+      syllable.vowel = i > 0 && II_AFTER.includes(text[i - 1]) ? 'ii' : 'ua';
+    } else {
+      syllable.vowel = tables.vowels[vowelKey];
+    }
+    i += vowelLen;
+
+    if (i < length) {
+      // 子音作 rushio（舊格式相容）；'⠆' 不當尾子音
+      const [finalLen, finalKey] = tables.consonantsTrie.match(text, i);
+      if (finalLen > 0 && finalKey !== '⠆' && tables.tonesKeySet.has(run.index.peekNonspace(i + finalLen))) {
+        syllable.rushio = tables.consonants[finalKey];
+        i += finalLen;
+      }
+    }
+
+    if (i < length) {
+      const [toneLen, toneKey] = tables.tonesTrie.match(text, i);
+      if (toneLen > 0) {
+        syllable.tone = tables.tones[toneKey];
+        i += toneLen;
+        if (i < length) {
+          const [pLen, pKey] = run.contextPunctuation(i);
+          if (pLen > 0) {
+            run.finishSyllable();
+            return run.emitPunctuation(pKey, i, pLen);
+          }
+        }
+      }
+    }
+    run.finishSyllable();
+    return i;
+  }
+
+  function ruleTail(run, i) {
+    const tables = run.tables;
+    const [tailLen, tailKey] = tables.tonesTrie.match(run.text, i);
+    if (tailLen === 0) return null;
+    if (has(tables.rushio, tailKey)) {
+      const value = tables.rushioValues[tailKey];
+      if (value) run.syllable.rushio = value;
+      run.finishSyllable();
+    } else {
+      run.syllable.tone = tables.tones[tailKey];
+    }
+    return i + tailLen;
+  }
+
+  function ruleFallback(run, i) {
+    if (run.syllable.hasContent()) {
+      run.finishSyllable();
+      return i;
+    }
+    const [pLen, pKey] = run.tables.punctuationTrie.match(run.text, i, true);
+    if (pLen > 0 && pKey !== null) return run.emitPunctuation(pKey, i, pLen);
+    run.result.push(run.text[i]);
+    return i + 1;
+  }
+
+  // [規則, 觸發字元]；觸發字元為 null 表示任何字元都要試
+  const RULES = [
+    [ruleOpenBracket, () => firstChars(Object.keys(HARD_OPEN_MAP))],
+    [ruleCloseBracket, t => firstChars(t.closingBrailleSet)],
+    [ruleSemicolonBbTone, () => new Set(['⠆'])],
+    [rulePunctuation, t => firstChars(Object.keys(t.punctuations).map(rstrip))],
+    [ruleNasal, () => new Set(['⠠'])],
+    [ruleEr, () => new Set(['⠗'])],
+    [ruleSpecial, t => firstChars(Object.keys(t.specialCases))],
+    [ruleRushio, t => firstChars(t.rushioKeys)],
+    [ruleConsonant, t => firstChars(Object.keys(t.consonants))],
+    [ruleVowel, t => firstChars(Object.keys(t.vowels))],
+    [ruleTail, t => firstChars(t.tonesKeys)],
+    [ruleFallback, () => null],
+  ];
+
+  function buildDispatch(tables) {
+    const triggers = RULES.map(([rule, trigger]) => [trigger(tables), rule]);
+    const dispatch = new Map();
+    for (const [chars] of triggers) {
+      for (const ch of chars || []) {
+        if (!dispatch.has(ch)) {
+          dispatch.set(ch, triggers.filter(([c]) => c === null || c.has(ch)).map(([, rule]) => rule));
+        }
+      }
+    }
+    return { dispatch, defaultRules: triggers.filter(([c]) => c === null).map(([, rule]) => rule) };
+  }
+
+  // ---------- 後處理（同 converter 原本的四道清理規則） ----------
+
+  const UNDERSCORE_TO_SPACE_RE = /(?<![，；])_(?=[a-zA-Zng])/g;
+  const SPACES_AFTER_PAUSE_RE = /([，；])(?: |⠀)+/g;
+  const SPACES_AROUND_COMMA_RE = new RegExp(`[${PY_SPACE}]*，[${PY_SPACE}]*`, 'g');
+
+  function postprocess(raw) {
+    return raw
+      .replace(UNDERSCORE_TO_SPACE_RE, ' ')
+      .replace(/_/g, '')
+      .replace(SPACES_AFTER_PAUSE_RE, '$1')
+      .replace(SPACES_AROUND_COMMA_RE, '，');
+  }
+
+  // ---------- 對外介面 ----------
+
+  function create(files) {
+    const registry = files['dialects.json'];
+    const lookupCode = {};   // 正式代碼、別名（小寫）→ 正式代碼
+    const dialects = {};     // 正式代碼 → 中文名稱
+    for (const [code, spec] of Object.entries(registry)) {
+      dialects[code] = spec.name;
+      for (const key of [code, ...(spec.aliases || [])]) lookupCode[key.toLowerCase()] = code;
+    }
+    const compiled = {};     // 正式代碼 → { tables, dispatch, defaultRules }，第一次使用時建立
+
+    function resolve(dialect) {
+      if (typeof dialect !== 'string') return null;
+      return lookupCode[dialect] || lookupCode[dialect.trim().toLowerCase()] || null;
+    }
+
+    function engineFor(code) {
+      if (!compiled[code]) {
+        const tables = buildTables(files, code, registry[code]);
+        compiled[code] = { tables, ...buildDispatch(tables) };
+      }
+      return compiled[code];
+    }
+
+    function convert(brailleText, dialect) {
+      const code = resolve(dialect);
+      if (code === null) return UNKNOWN_DIALECT_MESSAGE;
+      const { tables, dispatch, defaultRules } = engineFor(code);
+      const run = new Run(brailleText, tables);
+      let i = 0;
+      while (i < run.length) {
+        for (const rule of dispatch.get(brailleText[i]) || defaultRules) {
+          const next = rule(run, i);
+          if (next !== null) {
+            i = next;
+            break;
+          }
+        }
+      }
+      run.flush();
+      return postprocess(run.result.join(''));
+    }
+
+    return { dialects, resolve, convert };
+  }
+
+  return { create, KeyError, UNKNOWN_DIALECT_MESSAGE };
+}));
@@ -1,22 +1,18 @@
 document.addEventListener("DOMContentLoaded", async () => {
   try {
-    // 載入 JSON 檔案
-    const consonantsHpzt = await (await fetch('/braille_data/dot_consonants_hpzt.json')).json();
-    const consonantsSiian2 = await (await fetch('/braille_data/dot_consonants_siian2.json')).json();
-    const vowels = await (await fetch('/braille_data/dot_vowels.json')).json();
-    const rushio = await (await fetch('/braille_data/dot_rushio_syllables.json')).json();
-    const toneHpzt = await (await fetch('/braille_data/dot_tone_hpzt.json')).json();
-    const toneSiian2 = await (await fetch('/braille_data/dot_tone_siian2.json')).json();
-
-    // 腔調選項對應的子音+音調資料組合
-    const dialectConfigs = {
-      "siian2": { consonants: consonantsSiian2, tones: toneSiian2 },
-      "namsiian2": { consonants: consonantsSiian2, tones: toneSiian2 },
-      "hailuk": { consonants: consonantsHpzt, tones: toneHpzt },
-      "tapu": { consonants: consonantsHpzt, tones: toneHpzt },
-      "ngiophing": { consonants: consonantsHpzt, tones: toneHpzt },
-      "coan": { consonants: consonantsHpzt, tones: toneHpzt },
-    };
+    // 載入點字表打包檔（一次取得所有 JSON；網址由頁面提供，帶內容雜湊）
+    const bundleMeta = document.querySelector('meta[name="braille-bundle"]');
+    const bundleUrl = (bundleMeta && bundleMeta.content) || '/braille_data/bundle.json';
+    const { files } = await (await fetch(bundleUrl, { credentials: 'same-origin' })).json();
+    const consonantsHpzt = files['dot_consonants_hpzt.json'];
+    const consonantsSiian2 = files['dot_consonants_siian2.json'];
+    const vowels = files['dot_vowels.json'];
+    const rushio = files['dot_rushio_syllables.json'];
+    const toneHpzt = files['dot_tone_hpzt.json'];
+    const toneSiian2 = files['dot_tone_siian2.json'];
+
+    // 瀏覽器端轉換引擎（static/braille_engine.js），與伺服器共用同一份點字表與腔調登錄表
+    const engine = BrailleEngine.create(files);
 
     // 綁定畫面元素
     const inputBox = document.getElementById('inputText');
@@ -64,36 +60,53 @@ document.addEventListener("DOMContentLoaded", async () => {
       return tokens;
     }
 
-    convertBtn.onclick = () => {
-      const brailleText = inputBox.value;
-      const dialect = dialectSelect.value;
+    // 一般長度的文字直接在瀏覽器轉換；超過上限或本機轉換出錯時才送到伺服器
+    const CLIENT_MAX_CHARS = 200000;
+
+    function showResult(result) {
+      outputBox.value = result;
+
+      // 自動複製 outputBox 內容到剪貼簿
+      navigator.clipboard.writeText(result).then(() => {
+        copyStatus.textContent = '已自動複製轉換結果！';
+        setTimeout(() => {
+          copyStatus.textContent = '';
+        }, 3000);
+      }).catch(() => {
+        copyStatus.textContent = '複製失敗，請手動複製。';
+        setTimeout(() => {
+          copyStatus.textContent = '';
+        }, 3000);
+      });
+    }
 
+    function convertOnServer(brailleText, dialect) {
       fetch('/api/convert', {
         method: 'POST',
         headers: { 'Content-Type': 'application/json' },
         body: JSON.stringify({ braille: brailleText, dialect })
       })
         .then(res => res.json())
-        .then(data => {
-          outputBox.value = data.result;
-
-          // 自動複製 outputBox 內容到剪貼簿
-          navigator.clipboard.writeText(data.result).then(() => {
-            copyStatus.textContent = '已自動複製轉換結果！';
-            setTimeout(() => {
-              copyStatus.textContent = '';
-            }, 3000);
-          }).catch(() => {
-            copyStatus.textContent = '複製失敗，請手動複製。';
-            setTimeout(() => {
-              copyStatus.textContent = '';
-            }, 3000);
-          });
-        })
+        .then(data => showResult(data.result))
         .catch(err => {
           console.error('轉換錯誤：', err);
           outputBox.value = '⚠️ 轉換失敗';
         });
+    }
+
+    convertBtn.onclick = () => {
+      const brailleText = inputBox.value;
+      const dialect = dialectSelect.value;
+
+      if (brailleText.length <= CLIENT_MAX_CHARS) {
+        try {
+          showResult(engine.convert(brailleText, dialect));
+          return;
+        } catch (err) {
+          console.error('本機轉換錯誤，改由伺服器轉換：', err);
+        }
+      }
+      convertOnServer(brailleText, dialect);
     };
 
     // ✅ 複製按鈕
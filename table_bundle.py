@@ -0,0 +1,96 @@
+"""
+把 braille_data/*.json 打包成單一 JSON，供前端一次下載。
+
+網址帶內容雜湊（/braille_data/bundle.<digest>.json），內容不變網址就不變，可以設成 immutable 長期快取；
+點字表改動並 reload_tables() 後雜湊跟著改變，頁面引用新的網址。
+打包時一併預先壓縮（gzip；有安裝 brotli 套件時另外提供 br），每個請求不必重新壓縮。
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+
+from converter import BRAILLE_DATA_DIR, tables_version
+
+try:
+    import brotli
+except ImportError:  # 沒有 brotli 時只提供 gzip 與未壓縮版本
+    brotli = None
+
+
+class TableBundle:
+    """
+    一份打包結果：digest 為未壓縮內容的 SHA-256（前 16 碼），
+    bodies 為 {編碼: 內容位元組}，編碼為 'identity'、'gzip'（以及 'br'）。
+    """
+    __slots__ = ('digest', 'bodies')
+
+    def __init__(self, digest, bodies):
+        self.digest = digest
+        self.bodies = bodies
+
+    @property
+    def url(self):
+        return f'/braille_data/bundle.{self.digest}.json'
+
+    def etag(self, encoding):
+        # 不同編碼的內容位元組不同，強 ETag 也要不同
+        return self.digest if encoding == 'identity' else f'{self.digest}-{encoding}'
+
+
+def build_bundle(directory=BRAILLE_DATA_DIR):
+    files = {}
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith('.json'):
+            continue
+        with open(os.path.join(directory, filename), encoding='utf-8') as f:
+            files[filename] = json.load(f)
+    raw = json.dumps({'files': files}, ensure_ascii=False, separators=(',', ':'), sort_keys=True)
+    raw = raw.encode('utf-8')
+    bodies = {'identity': raw, 'gzip': gzip.compress(raw, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        bodies['br'] = brotli.compress(raw, quality=11)
+    return TableBundle(hashlib.sha256(raw).hexdigest()[:16], bodies)
+
+
+_bundle = None
+_bundle_version = None
+_bundle_lock = threading.Lock()
+
+
+def get_bundle():
+    """目前點字表的打包結果；tables_version() 改變（reload_tables 之後）時重新打包。"""
+    global _bundle, _bundle_version
+    version = tables_version()
+    if _bundle is not None and _bundle_version == version:
+        return _bundle
+    with _bundle_lock:
+        if _bundle is None or _bundle_version != version:
+            _bundle = build_bundle()
+            _bundle_version = version
+    return _bundle
+
+
+def choose_encoding(accept_encoding, available):
+    """
+    依 Accept-Encoding 從 available 中選一種編碼（偏好 br、gzip），都不接受時回傳 'identity'。
+    """
+    accepted = {}
+    for part in (accept_encoding or '').split(','):
+        name, _, params = part.strip().partition(';')
+        name = name.strip().lower()
+        if not name:
+            continue
+        q = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name] = q
+    for encoding in ('br', 'gzip'):
+        if encoding in available and accepted.get(encoding, accepted.get('*', 0.0)) > 0:
+            return encoding
+    return 'identity'
@@ -0,0 +1,118 @@
+import asyncio
+import json
+
+import pytest
+
+import asgi
+from converter import convert_braille_to_pinyin, convert_with_diagnostics
+
+BRAILLE = '⠅⠪⠁ ⠙⠥⠂'
+
+
+def _request(path, payload, method='POST'):
+    body = payload if isinstance(payload, bytes) else json.dumps(payload).encode('utf-8')
+    messages = [{'type': 'http.request', 'body': body, 'more_body': False}]
+    sent = []
+
+    async def receive():
+        return messages.pop(0)
+
+    async def send(message):
+        sent.append(message)
+
+    asyncio.run(asgi.app({'type': 'http', 'path': path, 'method': method}, receive, send))
+    return sent[0]['status'], json.loads(sent[1]['body'])
+
+
+@pytest.fixture(params=['inline', 'offloaded'])
+def mode(request, monkeypatch):
+    if request.param == 'offloaded':
+        monkeypatch.setattr(asgi, 'INLINE_MAX_CHARS', 0)
+    yield request.param
+    asgi.offloader.shutdown()
+
+
+def test_convert(mode):
+    status, body = _request('/api/convert', {'braille': BRAILLE, 'dialect': 'HAILUK'})
+    assert (status, body) == (200, {'result': convert_braille_to_pinyin(BRAILLE, 'hailuk')})
+
+
+def test_batch_reports_bad_items_one_by_one(mode):
+    status, body = _request('/api/convert/batch', {'dialect': 'siian2', 'items': [
+        BRAILLE,
+        {'braille': 3},
+        {'braille': BRAILLE, 'dialect': ['hailuk']},
+        {'braille': BRAILLE, 'dialect': 'tapu'},
+        None,
+    ]})
+    assert status == 200
+    assert body['results'] == [
+        {'result': convert_braille_to_pinyin(BRAILLE, 'siian2')},
+        {'error': '⚠️ braille 欄位必須是字串'},
+        {'error': '⚠️ dialect 必須是字串'},
+        {'result': convert_braille_to_pinyin(BRAILLE, 'tapu')},
+        {'error': '⚠️ braille 欄位必須是字串'},
+    ]
+
+
+@pytest.mark.parametrize('path, payload', [
+    ('/api/convert', b'not json'),
+    ('/api/convert', []),
+    ('/api/convert', {'braille': 3}),
+    ('/api/convert', {'braille': BRAILLE, 'dialect': 3}),
+    ('/api/convert/batch', {'items': 'x'}),
+    ('/api/convert/batch', {'items': [], 'dialect': {}}),
+])
+def test_invalid_requests_get_400(path, payload):
+    status, body = _request(path, payload)
+    assert status == 400
+    assert body['error'].startswith('⚠️')
+
+
+def test_oversize_input_gets_413(monkeypatch):
+    monkeypatch.setattr(asgi.service, 'max_chars', 5)
+    assert _request('/api/convert', {'braille': '⠅' * 6, 'dialect': 'siian2'})[0] == 413
+    assert _request('/api/convert/batch', {'items': ['⠅' * 3, '⠅' * 3]})[0] == 413
+
+
+def test_full_pool_gets_503(monkeypatch):
+    monkeypatch.setattr(asgi, 'INLINE_MAX_CHARS', 0)
+    monkeypatch.setattr(asgi.offloader, 'max_pending', 0)
+    status, _ = _request('/api/convert', {'braille': BRAILLE + '⠅', 'dialect': 'siian2'})
+    assert status == 503
+
+
+def test_unknown_route_and_method():
+    assert _request('/nope', {})[0] == 404
+    assert _request('/api/convert', {}, method='GET')[0] == 405
+
+
+def test_requests_are_measured():
+    _request('/api/convert', {'braille': BRAILLE, 'dialect': 'siian2'})
+    assert 'route="asgi",status="ok"' in '\n'.join(asgi.service.metrics_lines())
+
+
+def test_diagnostics(mode):
+    status, body = _request('/api/convert', {'braille': BRAILLE, 'dialect': 'HAILUK', 'diagnostics': True})
+    expected = json.loads(json.dumps(convert_with_diagnostics(BRAILLE, 'hailuk').to_dict()))
+    assert (status, body) == (200, expected)
+    assert 'route="asgi_diagnostics",status="ok"' in '\n'.join(asgi.service.metrics_lines())
+
+
+PARITY_PAYLOADS = [
+    {'braille': BRAILLE, 'dialect': 'HAILUK'},
+    {'braille': BRAILLE, 'dialect': 'siian2', 'diagnostics': True},
+    {'braille': BRAILLE, 'dialect': 'nope', 'diagnostics': True},
+    {'braille': 3, 'dialect': 'siian2', 'diagnostics': True},
+    {'braille': '⠅' * 6, 'dialect': 'siian2', 'diagnostics': True},
+]
+
+
+@pytest.mark.parametrize('payload', PARITY_PAYLOADS)
+def test_convert_matches_flask_app(payload, mode, monkeypatch):
+    pytest.importorskip('flask')
+    import app as flask_app
+    for service in (asgi.service, flask_app.service):
+        monkeypatch.setattr(service, 'max_chars', 5)
+    response = flask_app.app.test_client().post('/api/convert', json=payload)
+    assert _request('/api/convert', payload) == (response.status_code, response.get_json())
@@ -0,0 +1,54 @@
+import json
+
+from converter import convert_braille_to_pinyin, main
+
+BRAILLE = '⠅⠪⠁ ⠙⠥⠂\n'
+
+
+def test_bad_file_is_reported_and_skipped(tmp_path, capsys):
+    src = tmp_path / 'in'
+    src.mkdir()
+    (src / 'a.brl').write_text(BRAILLE, encoding='utf-8')
+    (src / 'b.brl').write_bytes(b'\xff\xfe' + BRAILLE.encode('utf-8'))
+    (src / 'c.brl').write_text(BRAILLE * 3, encoding='utf-8')
+    out = tmp_path / 'out'
+
+    status = main([str(src), '-o', str(out), '--skip-unchanged', '--max-chars', '20', '-q'])
+
+    assert status == 1
+    errors = capsys.readouterr().err
+    assert 'b.brl' in errors and 'c.brl' in errors
+    assert (out / 'a.pinyin.txt').read_text(encoding='utf-8') == convert_braille_to_pinyin(BRAILLE, 'siian2')
+    assert sorted(p.name for p in out.iterdir()) == ['.pinyin_manifest.json', 'a.pinyin.txt']
+    manifest = json.loads((out / '.pinyin_manifest.json').read_text(encoding='utf-8'))
+    assert list(manifest) == [str(out / 'a.pinyin.txt')]
+
+
+def test_failed_conversion_keeps_the_previous_output(tmp_path):
+    src = tmp_path / 'a.brl'
+    src.write_text(BRAILLE, encoding='utf-8')
+    assert main([str(src), '-q']) == 0
+    dst = tmp_path / 'a.pinyin.txt'
+    previous = dst.read_text(encoding='utf-8')
+
+    src.write_bytes(BRAILLE.encode('utf-8') + b'\xff')
+    assert main([str(src), '-q']) == 1
+    assert dst.read_text(encoding='utf-8') == previous
+    assert not (tmp_path / 'a.pinyin.txt.tmp').exists()
+
+
+def test_conversion_error_skips_only_that_file(tmp_path, capsys):
+    src = tmp_path / 'in'
+    src.mkdir()
+    (src / 'a.brl').write_text(BRAILLE, encoding='utf-8')
+    (src / 'b.brl').write_text('⠆⠁⠀', encoding='utf-8')   # 詔安腔的 ⠆ 查不到子音，基準實作拋出 KeyError
+    (src / 'c.brl').write_text(BRAILLE, encoding='utf-8')
+    out = tmp_path / 'out'
+
+    status = main([str(src), '-d', 'siian2', '-o', str(out), '--skip-unchanged', '-q'])
+
+    assert status == 1
+    assert 'b.brl' in capsys.readouterr().err
+    assert sorted(p.name for p in out.iterdir()) == ['.pinyin_manifest.json', 'a.pinyin.txt', 'c.pinyin.txt']
+    manifest = json.loads((out / '.pinyin_manifest.json').read_text(encoding='utf-8'))
+    assert sorted(manifest) == [str(out / 'a.pinyin.txt'), str(out / 'c.pinyin.txt')]
@@ -0,0 +1,73 @@
+import pytest
+
+from conversion_service import ConversionRejected, ConversionService, InputTooLarge
+from live_sessions import LiveSessions
+
+
+@pytest.fixture(scope='module')
+def service():
+    return ConversionService(max_chars=100, max_batch_items=5)
+
+
+@pytest.mark.parametrize('payload', [[], 'braille', 3, True])
+def test_non_object_payload_is_rejected(service, payload):
+    with pytest.raises(ConversionRejected) as excinfo:
+        service.check_payload(payload)
+    assert excinfo.value.status == 400
+
+
+def test_missing_payload_is_empty_object(service):
+    assert service.check_payload(None) == {}
+
+
+def test_batch_rejects_bad_item_dialect_without_failing_the_batch(service):
+    results = service.convert_batch([
+        '⠅⠪⠁',
+        {'braille': '⠅⠪⠁', 'dialect': ['hailuk']},
+        {'braille': '⠅⠪⠁', 'dialect': 'HAILUK'},
+        {'braille': '⠅⠪⠁', 'dialect': 7},
+    ], 'siian2')
+    assert results[0] == {'result': service.convert('⠅⠪⠁', 'siian2')}
+    assert results[1] == {'error': '⚠️ dialect 必須是字串'}
+    assert results[2] == {'result': service.convert('⠅⠪⠁', 'hailuk')}
+    assert results[3] == {'error': '⚠️ dialect 必須是字串'}
+
+
+def test_batch_limits(service):
+    with pytest.raises(InputTooLarge):
+        service.convert_batch(['⠅'] * 6, 'siian2')
+    with pytest.raises(InputTooLarge):
+        service.convert_batch(['⠅' * 60, {'braille': '⠅' * 60}], 'siian2')
+
+
+def test_stream_matches_convert_and_is_measured(service):
+    braille = '⠅⠪⠁ ⠙⠥⠂\n' * 5
+    pieces = service.convert_stream([braille[:7].encode('utf-8')[:-1], braille[:7].encode('utf-8')[-1:],
+                                     braille[7:]], 'siian2', entry='stream_test')
+    assert ''.join(pieces) == service.convert(braille, 'siian2')
+    assert 'route="stream_test",status="ok"' in '\n'.join(service.metrics_lines())
+
+
+def test_stream_rejects_unknown_dialect_before_starting(service):
+    with pytest.raises(ConversionRejected):
+        service.convert_stream(['⠅⠪⠁'], 'nope')
+
+
+def test_stream_stops_past_the_char_limit():
+    service = ConversionService(max_stream_chars=10)
+    pieces = service.convert_stream(['⠅⠪⠁ ⠙⠥⠂'] * 3, 'siian2')
+    with pytest.raises(InputTooLarge):
+        ''.join(pieces)
+
+
+def test_live_edit_checks_inserted_and_is_measured(service):
+    sessions = LiveSessions()
+    doc_id, document = service.open_live(sessions, '⠅⠪⠁', 'siian2')
+    with pytest.raises(InputTooLarge):
+        service.edit_live(sessions, doc_id, document.revision, 3, 0, '⠅' * 101)
+    with pytest.raises(ConversionRejected):
+        service.edit_live(sessions, doc_id, document.revision, 3, 0, None)
+    assert (document.text, document.revision) == ('⠅⠪⠁', 0)
+    service.edit_live(sessions, doc_id, document.revision, 3, 0, ' ⠙⠥⠂', entry='live_edit_test')
+    assert document.output == service.convert('⠅⠪⠁ ⠙⠥⠂', 'siian2')
+    assert 'route="live_edit_test",status="ok"' in '\n'.join(service.metrics_lines())
@@ -0,0 +1,108 @@
+import random
+import re
+import time
+import tracemalloc
+
+import pytest
+
+import converter
+from converter import (
+    _StreamingPostprocess,
+    _postprocess_pinyin,
+    convert_braille_to_pinyin,
+    convert_stream,
+)
+
+CHUNK = 64 * 1024
+
+
+def _chunked(text, size):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+@pytest.mark.parametrize('braille', [
+    '⠅⠁⠂' + '\n' * 5000 + '⠅⠁⠂',
+    '⠅⠪⠆⠀' + ' \n' * 3000 + '⠅⠁⠂',      # 「；」後的空白一路吃到下一個字
+    '⠅⠁' + ' ' * 5000 + '⠦⠅⠁',           # 長串 ' '：⠦ 要看空白之後的字
+    '⠅⠁⠂' + '⠀' * 5000,
+    '⠅⠁⠂⠂' + '\n' * 3000 + '⠂⠂⠅⠁',        # 空白前後的「，」
+])
+@pytest.mark.parametrize('size', [1, 7, 1000])
+def test_stream_matches_whole_text_across_whitespace_runs(braille, size):
+    expected = convert_braille_to_pinyin(braille, 'siian2')
+    assert ''.join(convert_stream(_chunked(braille, size), 'siian2')) == expected
+
+
+def test_stream_large_newline_run_uses_constant_memory():
+    # 1M 個換行：舊版每段都從頭重掃空白串、把整串留在緩衝區，要花上好幾十秒
+    newlines = 16 * CHUNK
+    head, tail = convert_braille_to_pinyin('⠅⠁⠂' + '\n' * 10 + '⠅⠁⠂', 'siian2').split('\n' * 10)
+
+    def chunks():
+        yield '⠅⠁⠂'
+        for _ in range(newlines // CHUNK):
+            yield '\n' * CHUNK
+        yield '⠅⠁⠂'
+
+    tracemalloc.start()
+    try:
+        pieces = convert_stream(chunks(), 'siian2')
+        first = next(pieces)
+        total = len(first)
+        last = first
+        for last in pieces:
+            total += len(last)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    assert first.startswith(head)
+    assert last.endswith(tail)
+    assert total == len(head) + newlines + len(tail)
+    assert peak < 8 * 1024 * 1024
+
+
+def test_stream_newline_run_output_is_exact():
+    braille = '⠅⠁⠂' + '\n' * (3 * CHUNK + 5) + '⠅⠁⠂'
+    expected = convert_braille_to_pinyin(braille, 'siian2')
+    assert ''.join(convert_stream(_chunked(braille, CHUNK), 'siian2')) == expected
+
+
+def test_streaming_postprocess_matches_whole_text():
+    rnd = random.Random(0)
+    alphabet = ['a', 'ng', '1', '_', '，', '；', '⠀', ' ', '\n', '\t', '　', '_a', '，_']
+    for _ in range(2000):
+        raw = ''.join(rnd.choice(alphabet) * rnd.choice([1, 1, 2, 80]) for _ in range(rnd.randint(0, 10)))
+        cuts = sorted(rnd.sample(range(len(raw) + 1), min(len(raw) + 1, rnd.randint(0, 5))))
+        post = _StreamingPostprocess()
+        pieces = []
+        for a, b in zip([0] + cuts, cuts + [len(raw)]):
+            pieces += post.feed(raw[a:b])
+        pieces += post.finish()
+        assert ''.join(pieces) == _postprocess_pinyin(raw), raw
+
+
+def _postprocess_by_rules(raw):
+    # 原本的四道規則逐條套用在整段文字上
+    text = re.sub(r'(?<![，；])_(?=[a-zA-Zng])', ' ', raw)
+    text = text.replace('_', '')
+    text = re.sub(r'([，；])(?: |⠀)+', r'\1', text)
+    return re.sub(r'\s*，\s*', '，', text)
+
+
+@pytest.mark.parametrize('raw', [
+    'ka，' + '\n' * 50000 + 'ka',
+    'ka；' + ' \n' * 30000 + '，ka',
+    'ka_' + '\t' * 40000 + '_ng',
+])
+def test_postprocess_does_not_cache_long_runs(raw, monkeypatch):
+    monkeypatch.setattr(converter, '_cleanup_cache', {})
+    assert _postprocess_pinyin(raw) == _postprocess_by_rules(raw)
+    assert all(len(run) <= converter._CLEANUP_CACHE_RUN_MAX for run, _ in converter._cleanup_cache)
+
+
+def test_postprocess_long_space_run_is_linear():
+    # 底線後接一長串不到逗號的空白：\s*，\s* 會逐位置重試
+    started = time.perf_counter()
+    assert _postprocess_pinyin('ka_' + ' ' * 200000 + 'ka') == 'ka' + ' ' * 200000 + 'ka'
+    assert time.perf_counter() - started < 1
@@ -0,0 +1,112 @@
+import random
+import time
+
+import pytest
+
+import converter
+from converter import (
+    DIAGNOSTIC_RULES,
+    SPAN_FIELDS,
+    UNKNOWN_DIALECT_MESSAGE,
+    convert_braille_to_pinyin,
+    convert_with_diagnostics,
+    dialect_map,
+)
+from regression import random_braille
+
+BRAILLE = '⠅⠪⠁ x ⠙⠥⠂'
+
+
+def test_spans_map_output_back_to_input():
+    diagnostics = convert_with_diagnostics(BRAILLE, 'siian2')
+    assert diagnostics.text == convert_braille_to_pinyin(BRAILLE, 'siian2') == 'koi a x duˊ'
+    assert [diagnostics.span(k) for k in range(len(diagnostics))] == [
+        {'input_start': 0, 'input_end': 2, 'output_start': 0, 'output_end': 3, 'rule': 'vowel'},
+        {'input_start': 2, 'input_end': 3, 'output_start': 4, 'output_end': 5, 'rule': 'vowel'},
+        {'input_start': 4, 'input_end': 5, 'output_start': 6, 'output_end': 7, 'rule': 'fallback'},
+        {'input_start': 6, 'input_end': 9, 'output_start': 8, 'output_end': 11, 'rule': 'vowel'},
+    ]
+    assert diagnostics.unmatched.tolist() == [4]
+
+
+@pytest.mark.parametrize('dialect', sorted(dialect_map))
+def test_spans_cover_everything_but_gaps(dialect):
+    rnd = random.Random(dialect)
+    for _ in range(100):
+        braille = ' '.join(random_braille(dialect, rnd, max_tokens=8) for _ in range(rnd.randint(1, 4)))
+        try:
+            expected = convert_braille_to_pinyin(braille, dialect)
+        except Exception:
+            # 基準實作對少數輸入會拋出例外（見 regression._run），與診斷無關
+            continue
+        diagnostics = convert_with_diagnostics(braille, dialect)
+        output = diagnostics.text
+        assert output == expected
+        covered = [False] * len(output)
+        for k in range(len(diagnostics)):
+            span = diagnostics.span(k)
+            start, end = span['output_start'], span['output_end']
+            assert 0 <= start <= end <= len(output)
+            assert 0 <= span['input_start'] <= span['input_end'] <= len(braille)
+            assert span['rule'] in DIAGNOSTIC_RULES
+            assert output[start:end] == output[start:end].strip(' \u2800')
+            covered[start:end] = [True] * (end - start)
+        # 不屬於任何 span 的只能是空白與點字空格
+        assert all(covered[p] or ch.isspace() or ch == '\u2800' for p, ch in enumerate(output)), braille
+
+
+def test_to_dict_is_built_once_and_matches_spans():
+    diagnostics = convert_with_diagnostics(BRAILLE * 3, 'hailuk')
+    first = diagnostics.to_dict()
+    assert diagnostics.to_dict() is first
+    assert first['span_fields'] == SPAN_FIELDS
+    assert first['spans'] == diagnostics.spans.tolist()
+    assert len(first['spans']) == len(diagnostics) * len(SPAN_FIELDS)
+
+    packed = convert_with_diagnostics(BRAILLE * 3, 'hailuk')
+    packed.spans
+    assert packed.to_dict() == first
+
+
+@pytest.mark.parametrize('dialect', ['siian2', 'hailuk'])
+def test_long_gaps_are_shortened_without_changing_spans(dialect, monkeypatch):
+    rnd = random.Random(dialect)
+    # 原樣輸出的「，；」與底線會和前後的空白一起被後處理改寫
+    gaps = [' ', '\n', '\t', '\u2800', '_', '，', '；']
+    for _ in range(100):
+        braille = ''.join(
+            random_braille(dialect, rnd, max_tokens=2) + ''.join(rnd.choice(gaps) for _ in range(rnd.randint(1, 40)))
+            for _ in range(rnd.randint(1, 4)))
+        try:
+            convert_braille_to_pinyin(braille, dialect)
+        except Exception:
+            continue
+        shortened = convert_with_diagnostics(braille, dialect).spans.tolist()
+        with monkeypatch.context() as m:
+            m.setattr(converter, '_CONTEXT_MAX', len(braille) + 1)
+            m.setattr(converter, '_piece_layouts', converter._ContextLayouts())
+            assert convert_with_diagnostics(braille, dialect).spans.tolist() == shortened, braille
+
+
+def _best_time(convert, braille, rounds=3):
+    best = float('inf')
+    for _ in range(rounds):
+        started = time.perf_counter()
+        convert(braille, 'siian2')
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+@pytest.mark.parametrize('gap', ['\n', '\u2800'])
+def test_long_whitespace_run_stays_linear(gap):
+    braille = BRAILLE + gap * 200000 + BRAILLE
+    plain = _best_time(convert_braille_to_pinyin, braille)
+    diagnosed = _best_time(lambda text, dialect: convert_with_diagnostics(text, dialect).to_dict(), braille)
+    assert diagnosed < 5 * plain
+
+
+def test_unknown_dialect():
+    diagnostics = convert_with_diagnostics(BRAILLE, 'nope')
+    assert diagnostics.text == UNKNOWN_DIALECT_MESSAGE
+    assert len(diagnostics) == 0
+    assert diagnostics.to_dict()['spans'] == []
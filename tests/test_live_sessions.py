@@ -0,0 +1,82 @@
+import pytest
+
+import live_sessions
+from converter import convert_braille_to_pinyin
+from live_sessions import DocumentTooLarge, LiveSessions, RevisionMismatch, SessionNotFound
+
+BRAILLE = '⠅⠪⠁ ⠙⠥⠂'
+
+
+def test_open_and_edit():
+    sessions = LiveSessions()
+    doc_id, document = sessions.open(BRAILLE, 'siian2')
+    assert document.output == convert_braille_to_pinyin(BRAILLE, 'siian2')
+    revision, diff = sessions.edit(doc_id, document.revision, len(BRAILLE), 0, ' ' + BRAILLE)
+    assert revision == document.revision
+    assert document.output == convert_braille_to_pinyin(BRAILLE + ' ' + BRAILLE, 'siian2')
+    with pytest.raises(RevisionMismatch):
+        sessions.edit(doc_id, revision - 1, 0, 0, BRAILLE)
+    assert sessions.close(doc_id)
+    with pytest.raises(SessionNotFound):
+        sessions.edit(doc_id, None, 0, 0, BRAILLE)
+
+
+def test_unknown_dialect_is_rejected():
+    sessions = LiveSessions()
+    with pytest.raises(ValueError):
+        sessions.open(BRAILLE, 'nope')
+    assert sessions.stats()['sessions'] == 0
+
+
+def test_oversize_document_is_rejected_without_evicting_others():
+    sessions = LiveSessions(max_chars=20)
+    doc_id, _ = sessions.open(BRAILLE, 'siian2')
+    with pytest.raises(DocumentTooLarge):
+        sessions.open('⠅' * 21, 'siian2')
+    assert sessions.stats() == {'sessions': 1, 'chars': len(BRAILLE), 'evictions': 0}
+    sessions.edit(doc_id, None, 0, 0, BRAILLE)
+
+
+def test_oversize_edit_is_rejected_and_leaves_the_document_unchanged():
+    sessions = LiveSessions(max_chars=20)
+    doc_id, document = sessions.open(BRAILLE, 'siian2')
+    revision = document.revision
+    with pytest.raises(DocumentTooLarge):
+        sessions.edit(doc_id, revision, 0, 0, '⠅' * 20)
+    assert document.revision == revision
+    assert document.output == convert_braille_to_pinyin(BRAILLE, 'siian2')
+
+
+def test_new_session_evicts_older_ones_but_not_itself():
+    sessions = LiveSessions(max_chars=20)
+    first, _ = sessions.open('⠅' * 8, 'siian2')
+    second, _ = sessions.open('⠅' * 8, 'siian2')
+    third, document = sessions.open('⠅' * 20, 'siian2')
+    assert sessions.stats() == {'sessions': 1, 'chars': 20, 'evictions': 2}
+    for doc_id in (first, second):
+        with pytest.raises(SessionNotFound):
+            sessions.edit(doc_id, None, 0, 0, '')
+    sessions.edit(third, document.revision, 0, 1, '')
+
+
+def test_least_recently_used_session_is_evicted_first():
+    sessions = LiveSessions(max_sessions=2)
+    first, _ = sessions.open(BRAILLE, 'siian2')
+    second, _ = sessions.open(BRAILLE, 'siian2')
+    sessions.edit(first, None, 0, 0, '')
+    sessions.open(BRAILLE, 'siian2')
+    sessions.edit(first, None, 0, 0, '')
+    with pytest.raises(SessionNotFound):
+        sessions.edit(second, None, 0, 0, '')
+
+
+def test_idle_sessions_expire(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(live_sessions.time, 'monotonic', lambda: now[0])
+    sessions = LiveSessions(idle_seconds=60)
+    first, _ = sessions.open(BRAILLE, 'siian2')
+    now[0] += 61
+    second, _ = sessions.open(BRAILLE, 'siian2')
+    with pytest.raises(SessionNotFound):
+        sessions.edit(first, None, 0, 0, '')
+    sessions.edit(second, None, 0, 0, '')
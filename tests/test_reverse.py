@@ -0,0 +1,37 @@
+import json
+import time
+
+import pytest
+
+from converter import convert_braille_to_pinyin, convert_pinyin_to_braille
+from regression import GOLDEN_PATH
+
+
+def _golden_pinyin():
+    with open(GOLDEN_PATH, encoding='utf-8') as f:
+        corpus = json.load(f)
+    for dialect, cases in corpus['dialects'].items():
+        for case in cases:
+            if isinstance(case['expected'], str):
+                yield dialect, case['expected']
+
+
+def test_golden_corpus_reverses_to_braille_only():
+    # 正向轉換會把不認得的字元原樣輸出，往返檢查看不出反向轉換留下的拼音或標點
+    for dialect, pinyin in _golden_pinyin():
+        braille = convert_pinyin_to_braille(pinyin, dialect)
+        assert all('⠀' <= ch <= '⣿' or ch.isspace() for ch in braille), (dialect, pinyin, braille)
+
+
+def test_question_mark():
+    braille = convert_pinyin_to_braille('ngaiˇ？', 'siian2')
+    assert braille == '⠬⠺⠆⠦'
+    assert convert_braille_to_pinyin(braille, 'siian2') == 'ngaiˇ？'
+
+
+@pytest.mark.parametrize('letters', ['k' + 'a' * 64000 + 'ˊ', 'hciim' * 10000], ids=['one-vowel', 'glued'])
+def test_long_letter_runs_are_linear(letters):
+    started = time.perf_counter()
+    braille = convert_pinyin_to_braille(letters, 'siian2')
+    assert time.perf_counter() - started < 5
+    assert all('⠀' <= ch <= '⣿' for ch in braille)